@@ -1,4 +1,5 @@
 from app.modules.dataset.models import DataSet
+from app.modules.dataset.repositories import loader_options
 from core.resources.generic_resource import create_resource
 from core.serialisers.serializer import Serializer
 
@@ -10,12 +11,18 @@ dataset_fields = {
     "created": "created_at",
     "name": "name",
     "doi": "get_steamgameshub_doi",
+    "rows": "get_row_count",
     "files": "files",
 }
 
 dataset_serializer = Serializer(dataset_fields, related_serializers={"files": file_serializer})
 
-DataSetResource = create_resource(DataSet, dataset_serializer)
+DataSetResource = create_resource(
+    DataSet,
+    dataset_serializer,
+    filterable_fields={"user_id": DataSet.user_id},
+    query_options=lambda: loader_options("summary"),
+)
 
 
 def init_blueprint_api(api):
@@ -195,12 +195,13 @@ window.onload = function () {
             }
             if (!(checked_orcid && checked_name)) return;
 
-            fetch('/dataset/upload', { method: 'POST', body: formUploadData })
-                .then(response => {
-                    if (response.ok) {
-                        response.json().then(data => { window.location.href = "/dataset/list"; });
+            fetch('/dataset/upload', { method: 'POST', body: formUploadData, headers: { 'Prefer': 'respond-async' } })
+                .then(waitForPublishJob)
+                .then(result => {
+                    if (result.ok) {
+                        window.location.href = "/dataset/list";
                     } else {
-                        response.json().then(data => { hide_loading(); write_upload_error(data.message); });
+                        hide_loading(); write_upload_error(result.message);
                     }
                 })
                 .catch(error => { console.error('Error in POST request:', error); hide_loading(); write_upload_error('Unexpected network error'); });
@@ -208,6 +209,27 @@ window.onload = function () {
     }
 };
 
+const PUBLISH_POLL_MS = 1000;
+
+// Resolves to {ok, message} for an upload response. A 202 means the publication was
+// queued: its status URL is polled until the job is done or failed.
+async function waitForPublishJob(response) {
+    const data = await response.json().catch(() => ({}));
+    if (response.status !== 202) {
+        return { ok: response.ok, message: data.message };
+    }
+    let job = data;
+    while (job.status !== 'done' && job.status !== 'failed') {
+        await new Promise(resolve => setTimeout(resolve, PUBLISH_POLL_MS));
+        const poll = await fetch(data.status_url, { headers: { 'Accept': 'application/json' } });
+        job = await poll.json().catch(() => ({ status: 'failed', message: 'Could not read the publication status' }));
+        if (!poll.ok) {
+            return { ok: false, message: job.message };
+        }
+    }
+    return { ok: job.status === 'done', message: job.message };
+}
+
 // NOTE: show_upload_dataset() is called by Dropzone success handler in template.
 
 
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from typing import BinaryIO, Iterable, List, Optional, Tuple
+
+from app.modules.dataset.pool import ordered_map
+
+SIDECAR_SUFFIX = ".sha256"
+CHUNK_SIZE = 1024 * 1024
+
+
+def sidecar_path(file_path: str) -> str:
+    return file_path + SIDECAR_SUFFIX
+
+
+def write_sidecar(file_path: str, checksum: str, size: int) -> None:
+    """Record ``checksum``/``size`` next to ``file_path``, stamped with its current mtime."""
+    stat = os.stat(file_path)
+    partial_path = f"{sidecar_path(file_path)}.{os.getpid()}.part"
+    with open(partial_path, "w", encoding="utf-8") as handler:
+        json.dump({"sha256": checksum, "size": size, "mtime_ns": stat.st_mtime_ns}, handler)
+    os.replace(partial_path, sidecar_path(file_path))
+
+
+def read_sidecar(file_path: str) -> Optional[Tuple[str, int]]:
+    """The recorded ``(checksum, size)``, or None if missing or the file changed since it was written."""
+    try:
+        with open(sidecar_path(file_path), "r", encoding="utf-8") as handler:
+            data = json.load(handler)
+        stat = os.stat(file_path)
+    except (OSError, ValueError):
+        return None
+    if data.get("size") != stat.st_size or data.get("mtime_ns") != stat.st_mtime_ns:
+        return None
+    return data.get("sha256"), stat.st_size
+
+
+def discard_sidecar(file_path: str) -> None:
+    try:
+        os.remove(sidecar_path(file_path))
+    except FileNotFoundError:
+        pass
+
+
+def save_stream(stream: BinaryIO, dest_path: str, chunk_size: int = CHUNK_SIZE) -> Tuple[str, int]:
+    """Copy ``stream`` to ``dest_path`` chunk by chunk, hashing on the way, and leave a sidecar.
+
+    The file only appears under ``dest_path`` once it is complete.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    partial_path = f"{dest_path}.{os.getpid()}.part"
+    try:
+        with open(partial_path, "wb") as dest:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                dest.write(chunk)
+                size += len(chunk)
+        os.replace(partial_path, dest_path)
+    except BaseException:
+        try:
+            os.remove(partial_path)
+        except FileNotFoundError:
+            pass
+        raise
+    checksum = digest.hexdigest()
+    write_sidecar(dest_path, checksum, size)
+    return checksum, size
+
+
+def checksum_and_size(file_path: str, chunk_size: int = CHUNK_SIZE) -> Tuple[str, int]:
+    """SHA-256 and size of ``file_path``: from its sidecar when valid, else hashed in chunks."""
+    recorded = read_sidecar(file_path)
+    if recorded is not None and recorded[0]:
+        return recorded
+    digest = hashlib.sha256()
+    size = 0
+    with open(file_path, "rb") as source:
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def _checksum_or_none(file_path: str) -> Optional[Tuple[str, int]]:
+    try:
+        return checksum_and_size(file_path)
+    except OSError:
+        return None
+
+
+def checksums_and_sizes(
+    file_paths: Iterable[str], max_workers: Optional[int] = None, skip_errors: bool = False
+) -> List[Optional[Tuple[str, int]]]:
+    """``checksum_and_size`` of each path on a bounded thread pool, in the order given.
+
+    Threads are enough here: file reads and hashlib updates release the GIL.
+    With ``skip_errors`` an unreadable file yields None instead of raising.
+    """
+    function = _checksum_or_none if skip_errors else checksum_and_size
+    return ordered_map(function, file_paths, max_workers=max_workers, processes=False)
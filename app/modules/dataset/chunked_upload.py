@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from typing import BinaryIO, Optional, Tuple
+
+from app.modules.dataset import checksums
+
+STATE_DIR = ".uploads"
+READ_SIZE = 1024 * 1024
+MAX_CHUNK_BYTES = 64 * 1024 * 1024
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# Running SHA-256 per in-flight upload, so finalizing does not re-read the file.
+# Lost on restart or when chunks hit another worker; finalize then hashes the file.
+_MAX_RUNNING = 256
+_running: "OrderedDict[str, Tuple[int, object]]" = OrderedDict()
+_running_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    status_code = 400
+
+    def __init__(self, message: str, offset: Optional[int] = None) -> None:
+        super().__init__(message)
+        self.offset = offset
+
+
+class OffsetMismatch(UploadError):
+    status_code = 409
+
+
+class ChunkTooLarge(UploadError):
+    status_code = 413
+
+
+class ChecksumMismatch(UploadError):
+    status_code = 422
+
+
+class ChunkedUpload:
+    """A resumable upload assembled in ``<temp_folder>/.uploads/<id>.part``.
+
+    Chunks must be appended in order: each one states the offset it starts at,
+    which has to be the current length of the part file. The state file keeps
+    the target filename and the declared size so any worker can resume it.
+    """
+
+    def __init__(self, temp_folder: str, upload_id: str, state: dict) -> None:
+        self.temp_folder = temp_folder
+        self.upload_id = upload_id
+        self.filename = state["filename"]
+        self.size = state.get("size")
+
+    @staticmethod
+    def _paths(temp_folder: str, upload_id: str) -> Tuple[str, str]:
+        base = os.path.join(temp_folder, STATE_DIR, upload_id)
+        return base + ".part", base + ".json"
+
+    @property
+    def part_path(self) -> str:
+        return self._paths(self.temp_folder, self.upload_id)[0]
+
+    @property
+    def state_path(self) -> str:
+        return self._paths(self.temp_folder, self.upload_id)[1]
+
+    @property
+    def offset(self) -> int:
+        return os.path.getsize(self.part_path)
+
+    @classmethod
+    def start(cls, temp_folder: str, filename: str, size: Optional[int] = None) -> "ChunkedUpload":
+        if size is not None and size < 0:
+            raise UploadError("size must be >= 0")
+        upload_id = uuid.uuid4().hex
+        part_path, state_path = cls._paths(temp_folder, upload_id)
+        os.makedirs(os.path.dirname(part_path), exist_ok=True)
+        state = {"filename": filename, "size": size}
+        with open(state_path, "w", encoding="utf-8") as handler:
+            json.dump(state, handler)
+        open(part_path, "wb").close()
+        _remember(part_path, 0, hashlib.sha256())
+        return cls(temp_folder, upload_id, state)
+
+    @classmethod
+    def load(cls, temp_folder: str, upload_id: str) -> Optional["ChunkedUpload"]:
+        if not _UPLOAD_ID.match(upload_id or ""):
+            return None
+        part_path, state_path = cls._paths(temp_folder, upload_id)
+        try:
+            with open(state_path, "r", encoding="utf-8") as handler:
+                state = json.load(handler)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(part_path):
+            return None
+        return cls(temp_folder, upload_id, state)
+
+    def append(self, stream: BinaryIO, offset: int, chunk_sha256: Optional[str] = None) -> int:
+        """Append one chunk read from ``stream`` at ``offset``; returns the new offset.
+
+        The chunk is streamed to disk in small reads. If it turns out too large,
+        exceeds the declared size or fails ``chunk_sha256``, the part file is
+        truncated back to ``offset`` so the client can simply retry it.
+
+        The offset check, the write and the truncate all happen under an
+        exclusive lock on the part file, so of two requests racing for the same
+        offset only one writes; the other gets ``OffsetMismatch`` straight away.
+        """
+        with open(self.part_path, "r+b") as part:
+            try:
+                fcntl.flock(part, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise OffsetMismatch("Another chunk is being written to this upload") from None
+            try:
+                return self._append_locked(part, stream, offset, chunk_sha256)
+            finally:
+                fcntl.flock(part, fcntl.LOCK_UN)
+
+    def _append_locked(self, part, stream: BinaryIO, offset: int, chunk_sha256: Optional[str]) -> int:
+        current = os.fstat(part.fileno()).st_size
+        if offset != current:
+            raise OffsetMismatch(f"Expected offset {current}", offset=current)
+
+        running = _recall(self.part_path, current)
+        whole = running.copy() if running is not None else None
+        chunk = hashlib.sha256()
+        written = 0
+        try:
+            part.seek(current)
+            while True:
+                block = stream.read(READ_SIZE)
+                if not block:
+                    break
+                written += len(block)
+                if written > MAX_CHUNK_BYTES:
+                    raise ChunkTooLarge(f"Chunks are limited to {MAX_CHUNK_BYTES} bytes", offset=current)
+                if self.size is not None and current + written > self.size:
+                    raise UploadError("Chunk goes past the declared size", offset=current)
+                part.write(block)
+                chunk.update(block)
+                if whole is not None:
+                    whole.update(block)
+            part.flush()
+            if chunk_sha256 and chunk.hexdigest() != chunk_sha256.lower():
+                raise ChecksumMismatch("Chunk checksum does not match", offset=current)
+        except BaseException:
+            part.seek(current)
+            part.truncate()
+            part.flush()
+            raise
+
+        if whole is not None:
+            _remember(self.part_path, current + written, whole)
+        return current + written
+
+    def finalize(self, destination: str, expected_sha256: Optional[str] = None) -> Tuple[str, int]:
+        """Verify the assembled file and move it to ``destination``; returns ``(checksum, size)``."""
+        size = self.offset
+        if self.size is not None and size != self.size:
+            raise UploadError(f"Upload incomplete: {size} of {self.size} bytes received", offset=size)
+
+        running = _recall(self.part_path, size)
+        if running is not None:
+            checksum = running.hexdigest()
+        else:
+            checksum, _ = checksums.checksum_and_size(self.part_path)
+        if expected_sha256 and checksum != expected_sha256.lower():
+            raise ChecksumMismatch("File checksum does not match", offset=size)
+
+        os.replace(self.part_path, destination)
+        checksums.write_sidecar(destination, checksum, size)
+        self.abort()
+        return checksum, size
+
+    def abort(self) -> None:
+        _forget(self.part_path)
+        for path in (self.part_path, self.state_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def _remember(part_path: str, offset: int, digest) -> None:
+    with _running_lock:
+        _running[part_path] = (offset, digest)
+        _running.move_to_end(part_path)
+        while len(_running) > _MAX_RUNNING:
+            _running.popitem(last=False)
+
+
+def _recall(part_path: str, offset: int):
+    with _running_lock:
+        entry = _running.get(part_path)
+    if entry is None or entry[0] != offset:
+        return None
+    return entry[1]
+
+
+def _forget(part_path: str) -> None:
+    with _running_lock:
+        _running.pop(part_path, None)
@@ -0,0 +1,216 @@
+"""Incremental maintenance of ``ActivityCounter`` / ``ActivityDailyCounter``.
+
+Every view and download record bumps four rows in the same transaction that
+writes it: the subject total, the global total, and the matching daily buckets.
+ORM inserts and deletes are caught through mapper events; rows written in bulk
+by the event buffer are reported through ``event_buffer.on_flush``. Bulk
+``query.delete()`` bypasses both, which is what ``rebuild_counters`` is for.
+
+The in-process trending leaderboard only sees a change once its transaction
+has committed: bumps are kept on the session (or by the event buffer flush)
+until then and dropped on rollback.
+"""
+
+from collections import Counter
+from datetime import date, datetime
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import object_session
+
+from app import db
+from app.modules.dataset.models import ActivityCounter, ActivityDailyCounter, DataSet, DSDownloadRecord, DSViewRecord
+from app.modules.dataset.trending import trending_leaderboard
+from app.modules.hubfile.models import Hubfile, HubfileDownloadRecord, HubfileViewRecord
+from core.events import event_buffer
+
+# model -> (scope, subject column, metric, timestamp column)
+COUNTED_RECORDS = {
+    DSViewRecord: ("dataset", "dataset_id", "views", "view_date"),
+    DSDownloadRecord: ("dataset", "dataset_id", "downloads", "download_date"),
+    HubfileViewRecord: ("hubfile", "file_id", "views", "view_date"),
+    HubfileDownloadRecord: ("hubfile", "file_id", "downloads", "download_date"),
+}
+
+_PENDING_BUMPS_KEY = "pending_trending_bumps"
+
+# (metric, dataset_id, day, amount)
+Bump = Tuple[str, int, date, int]
+
+
+def _day(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        # SQLite returns DATE() as text
+        return datetime.strptime(value[:10], "%Y-%m-%d").date()
+    return datetime.utcnow().date()
+
+
+def _upsert_add(connection, table, keys: dict, amount: int) -> None:
+    """``total += amount`` for the row identified by ``keys``, creating it if needed."""
+    dialect = connection.dialect.name
+    if dialect in ("mysql", "mariadb"):
+        from sqlalchemy.dialects.mysql import insert
+
+        stmt = insert(table).values(**keys, total=amount)
+        connection.execute(stmt.on_duplicate_key_update(total=table.c.total + amount))
+        return
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+
+        stmt = insert(table).values(**keys, total=amount)
+        connection.execute(
+            stmt.on_conflict_do_update(index_elements=list(keys), set_={"total": table.c.total + amount})
+        )
+        return
+
+    condition = [table.c[name] == value for name, value in keys.items()]
+    updated = connection.execute(table.update().where(*condition).values(total=table.c.total + amount))
+    if not updated.rowcount:
+        connection.execute(table.insert().values(**keys, total=amount))
+
+
+def apply_counts(connection, scope: str, metric: str, events: Iterable[tuple]) -> List[Bump]:
+    """Fold ``(subject_id, day, amount)`` events into totals and daily buckets.
+
+    Returns the trending leaderboard bumps to apply once the transaction commits.
+    """
+    totals = Counter()
+    daily = Counter()
+    for subject_id, day, amount in events:
+        if subject_id is None:
+            continue
+        for subject in (subject_id, ActivityCounter.GLOBAL):
+            totals[subject] += amount
+            daily[(subject, day)] += amount
+
+    total_table = ActivityCounter.__table__
+    daily_table = ActivityDailyCounter.__table__
+    bumps: List[Bump] = []
+    for subject, amount in totals.items():
+        if amount:
+            _upsert_add(connection, total_table, {"scope": scope, "subject_id": subject, "metric": metric}, amount)
+    for (subject, day), amount in daily.items():
+        if amount:
+            keys = {"scope": scope, "subject_id": subject, "metric": metric, "day": day}
+            _upsert_add(connection, daily_table, keys, amount)
+            if scope == "dataset" and subject != ActivityCounter.GLOBAL:
+                bumps.append((metric, subject, day, amount))
+    return bumps
+
+
+def apply_bumps(bumps: Iterable[Bump]) -> None:
+    for metric, dataset_id, day, amount in bumps:
+        trending_leaderboard.bump(metric, dataset_id, day, amount)
+
+
+def _defer_bumps(session, bumps: List[Bump]) -> None:
+    if not bumps:
+        return
+    if session is None:
+        apply_bumps(bumps)
+        return
+    session.info.setdefault(_PENDING_BUMPS_KEY, []).extend(bumps)
+
+
+def forget_subject(connection, scope: str, subject_id: Optional[int]) -> None:
+    """Drop the counters of a deleted dataset/hubfile and take them out of the global totals."""
+    if subject_id is None:
+        return
+    total_table = ActivityCounter.__table__
+    daily_table = ActivityDailyCounter.__table__
+    rows = connection.execute(
+        daily_table.select().where(daily_table.c.scope == scope, daily_table.c.subject_id == subject_id)
+    ).all()
+
+    by_metric = {}
+    for row in rows:
+        by_metric.setdefault(row.metric, []).append((row.day, row.total))
+    for metric, buckets in by_metric.items():
+        global_total = -sum(total for _, total in buckets)
+        _upsert_add(
+            connection,
+            total_table,
+            {"scope": scope, "subject_id": ActivityCounter.GLOBAL, "metric": metric},
+            global_total,
+        )
+        for day, total in buckets:
+            keys = {"scope": scope, "subject_id": ActivityCounter.GLOBAL, "metric": metric, "day": day}
+            _upsert_add(connection, daily_table, keys, -total)
+
+    connection.execute(daily_table.delete().where(daily_table.c.scope == scope, daily_table.c.subject_id == subject_id))
+    connection.execute(total_table.delete().where(total_table.c.scope == scope, total_table.c.subject_id == subject_id))
+
+
+def rebuild_counters() -> int:
+    """Recompute every counter from the raw record tables. Returns the number of records folded in."""
+    db.session.query(ActivityDailyCounter).delete(synchronize_session=False)
+    db.session.query(ActivityCounter).delete(synchronize_session=False)
+    connection = db.session.connection()
+
+    folded = 0
+    for model, (scope, subject_column, metric, date_column) in COUNTED_RECORDS.items():
+        subject = getattr(model, subject_column)
+        day = func.date(getattr(model, date_column))
+        grouped = (
+            db.session.query(subject, day, func.count(model.id))
+            .filter(subject.isnot(None))
+            .group_by(subject, day)
+            .all()
+        )
+        events = [(subject_id, _day(bucket), count) for subject_id, bucket, count in grouped]
+        apply_counts(connection, scope, metric, events)
+        folded += sum(count for _, _, count in events)
+
+    db.session.commit()
+    trending_leaderboard.invalidate()
+    return folded
+
+
+def _register_listeners() -> None:
+    for model, (scope, subject_column, metric, date_column) in COUNTED_RECORDS.items():
+
+        def after_insert(
+            mapper, connection, target, scope=scope, subject=subject_column, metric=metric, ts=date_column
+        ):
+            bumps = apply_counts(connection, scope, metric, [(getattr(target, subject), _day(getattr(target, ts)), 1)])
+            _defer_bumps(object_session(target), bumps)
+
+        def after_delete(
+            mapper, connection, target, scope=scope, subject=subject_column, metric=metric, ts=date_column
+        ):
+            bumps = apply_counts(connection, scope, metric, [(getattr(target, subject), _day(getattr(target, ts)), -1)])
+            _defer_bumps(object_session(target), bumps)
+
+        def after_bulk(connection, rows, scope=scope, subject=subject_column, metric=metric, ts=date_column):
+            bumps = apply_counts(connection, scope, metric, [(row.get(subject), _day(row.get(ts)), 1) for row in rows])
+            return lambda: apply_bumps(bumps)
+
+        event.listen(model, "after_insert", after_insert)
+        event.listen(model, "after_delete", after_delete)
+        event_buffer.on_flush(model.__table__, after_bulk)
+
+    @event.listens_for(DataSet, "after_delete")
+    def forget_dataset(mapper, connection, target):
+        forget_subject(connection, "dataset", target.id)
+
+    @event.listens_for(Hubfile, "after_delete")
+    def forget_hubfile(mapper, connection, target):
+        forget_subject(connection, "hubfile", target.id)
+
+    @event.listens_for(db.session, "after_commit")
+    def apply_pending_bumps(session):
+        apply_bumps(session.info.pop(_PENDING_BUMPS_KEY, ()))
+
+    @event.listens_for(db.session, "after_rollback")
+    def drop_pending_bumps(session):
+        session.info.pop(_PENDING_BUMPS_KEY, None)
+
+
+_register_listeners()
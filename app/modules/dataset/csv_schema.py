@@ -0,0 +1,96 @@
+import re
+from datetime import date
+from typing import Callable, List, Optional, Sequence
+
+# csv refuses NUL bytes, so it can never occur inside a parsed cell
+_SEPARATOR = "\0"
+
+
+class ColumnType:
+    """How the cells of one column must look, checked a whole batch at a time.
+
+    ``pattern`` describes a single cell. For a batch, the cells are joined
+    with a separator that csv never yields and matched against the repeated
+    pattern in one regex call, so a clean batch costs one C-level scan per
+    column. Only a failing batch is walked cell by cell to find the rows.
+    ``check_values`` can reject the distinct values that matched the pattern,
+    for rules a regex cannot express (e.g. the 30th of February).
+
+    A pattern must match any cell in only one way: an ambiguous one makes a
+    failing batch backtrack through every split of every cell before it.
+    """
+
+    def __init__(
+        self,
+        label: str,
+        pattern: str,
+        flags: int = 0,
+        check_values: Optional[Callable[[str], bool]] = None,
+    ) -> None:
+        self.label = label
+        self.pattern = pattern
+        self.flags = flags
+        self.check_values = check_values
+
+    def compile(self, nullable: bool):
+        cell = f"(?:{self.pattern})?" if nullable else f"(?:{self.pattern})"
+        return re.compile(cell, self.flags), re.compile(f"{cell}(?:{_SEPARATOR}{cell})*", self.flags)
+
+
+def _is_calendar_date(value: str) -> bool:
+    try:
+        date.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+TEXT = ColumnType("non-blank text", r"\s*[^\s\0][^\0]*")
+INTEGER = ColumnType("an integer", r"[0-9]+")
+ISO_DATE = ColumnType("an ISO date (YYYY-MM-DD)", r"[0-9]{4}-[0-9]{2}-[0-9]{2}", check_values=_is_calendar_date)
+BOOLEAN = ColumnType("true or false", r"true|false|1|0", flags=re.IGNORECASE)
+LIST = ColumnType("a ';'-separated list", r"[^;\0]+(?:;[^;\0]+)*")
+
+
+class Column:
+    def __init__(self, name: str, kind: ColumnType, required: bool = True) -> None:
+        self.name = name
+        self.kind = kind
+        self.required = required
+        self._cell, self._batch = kind.compile(nullable=not required)
+
+    def invalid_positions(self, values: Sequence[str]) -> List[int]:
+        """Positions in ``values`` (one batch of this column) whose cell breaks the rule."""
+        if self.kind is TEXT and not self.required:
+            return []
+        if self._batch.fullmatch(_SEPARATOR.join(values)):
+            bad = []
+        else:
+            cell = self._cell.fullmatch
+            bad = [position for position, value in enumerate(values) if not cell(value)]
+
+        if self.kind.check_values is not None:
+            rejected = {value for value in set(values) if value and not self.kind.check_values(value)}
+            if rejected:
+                bad = sorted(set(bad).union(i for i, value in enumerate(values) if value in rejected))
+        return bad
+
+    def describe(self) -> str:
+        return self.kind.label if self.required else f"{self.kind.label} or empty"
+
+
+class Schema:
+    """Ordered column rules for a CSV; ``check_batch`` validates rows column-wise."""
+
+    def __init__(self, columns: Sequence[Column]) -> None:
+        self.columns = list(columns)
+
+    @property
+    def headers(self) -> List[str]:
+        return [column.name for column in self.columns]
+
+    def check_batch(self, rows: Sequence[Sequence[str]]) -> List[List[int]]:
+        """For each column, the positions in ``rows`` that fail it. Rows must have the schema's width."""
+        if not rows:
+            return [[] for _ in self.columns]
+        return [column.invalid_positions(values) for column, values in zip(self.columns, zip(*rows))]
@@ -5,6 +5,14 @@ from wtforms.validators import URL, DataRequired, Optional, Regexp
 from app.modules.dataset.models import DataCategory
 
 
+def category_name(value):
+    """The DataCategory name stored for a select ``value`` (the enum value), NONE when unknown."""
+    for pt in DataCategory:
+        if pt.value == value:
+            return pt.name
+    return "NONE"
+
+
 class AuthorForm(FlaskForm):
     name = StringField("Name", validators=[DataRequired()])
     affiliation = StringField("Affiliation")
@@ -50,7 +58,7 @@ class DatasetFileForm(FlaskForm):
             "csv_filename": self.csv_filename.data,
             "title": self.title.data,
             "description": self.desc.data,
-            "data_category": self.data_category.data,
+            "data_category": category_name(self.data_category.data),
             "publication_doi": self.publication_doi.data,
             "tags": self.tags.data,
             "csv_version": self.version.data,
@@ -87,10 +95,7 @@ class DataSetForm(FlaskForm):
         }
 
     def convert_data_category(self, value):
-        for pt in DataCategory:
-            if pt.value == value:
-                return pt.name
-        return "NONE"
+        return category_name(value)
 
     def get_authors(self):
         return [author.get_author() for author in self.authors]
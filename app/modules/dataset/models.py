@@ -1,3 +1,4 @@
+import json
 import os
 from datetime import datetime
 from enum import Enum
@@ -33,6 +34,12 @@ class Author(db.Model):
 class DSMetrics(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     number_of_files = db.Column(db.String(120))
+    # filled at publish time by dataset.profiling, summed/merged over the files
+    row_count = db.Column(db.Integer)
+    column_profile = db.Column(db.Text)
+
+    def get_column_profile(self) -> dict:
+        return json.loads(self.column_profile) if self.column_profile else {}
 
     def __repr__(self):
         return f"DSMetrics<files={self.number_of_files}>"
@@ -54,6 +61,11 @@ class DSMetaData(db.Model):
     authors = db.relationship("Author", backref="ds_meta_data", lazy=True, cascade="all, delete")
 
 
+def steamgameshub_doi_url(dataset_doi) -> str:
+    domain = os.getenv("DOMAIN", "localhost")
+    return f"http://{domain}/doi/{dataset_doi}"
+
+
 class DataSet(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
@@ -102,30 +114,40 @@ class DataSet(db.Model):
         return SizeService().get_human_readable_size(self.get_file_total_size())
 
     def get_steamgameshub_doi(self):
-        from app.modules.dataset.services import DataSetService
+        return steamgameshub_doi_url(self.ds_meta_data.dataset_doi)
 
-        return DataSetService().get_steamgameshub_doi(self)
+    def get_row_count(self):
+        # None for datasets published before profiling existed
+        metrics = self.ds_meta_data.ds_metrics
+        return metrics.row_count if metrics else None
 
     def to_dict(self):
+        # one walk over the (ideally eager-loaded) graph; see dataset.repositories.loader_options
+        from app.modules.dataset.services import SizeService
+
+        metadata = self.ds_meta_data
+        files = self.files()
+        total_size = sum(file.size for file in files)
         return {
-            "title": self.ds_meta_data.title,
+            "title": metadata.title,
             "id": self.id,
             "created_at": self.created_at,
             "created_at_timestamp": int(self.created_at.timestamp()),
-            "description": self.ds_meta_data.description,
-            "authors": [author.to_dict() for author in self.ds_meta_data.authors],
+            "description": metadata.description,
+            "authors": [author.to_dict() for author in metadata.authors],
             "data_category": self.get_cleaned_data_category(),
-            "publication_doi": self.ds_meta_data.publication_doi,
-            "dataset_doi": self.ds_meta_data.dataset_doi,
-            "tags": self.ds_meta_data.tags.split(",") if self.ds_meta_data.tags else [],
-            "url": self.get_steamgameshub_doi(),
+            "publication_doi": metadata.publication_doi,
+            "dataset_doi": metadata.dataset_doi,
+            "tags": metadata.tags.split(",") if metadata.tags else [],
+            "url": steamgameshub_doi_url(metadata.dataset_doi),
             "download": f'{request.host_url.rstrip("/")}/dataset/download/{self.id}',
             # "zenodo": self.get_zenodo_url(), MOD: Fakenodo
             "zenodo": self.get_fakenodo_url(),
-            "files": [file.to_dict() for df in self.dataset_files for file in df.files],
-            "files_count": self.get_files_count(),
-            "total_size_in_bytes": self.get_file_total_size(),
-            "total_size_in_human_format": self.get_file_total_size_for_human(),
+            "files": [file.to_dict() for file in files],
+            "files_count": len(files),
+            "row_count": self.get_row_count(),
+            "total_size_in_bytes": total_size,
+            "total_size_in_human_format": SizeService().get_human_readable_size(total_size),
         }
 
     def __repr__(self):
@@ -159,6 +181,41 @@ class DSViewRecord(db.Model):
         return f"<View id={self.id} dataset_id={self.dataset_id} date={self.view_date} cookie={self.view_cookie}>"
 
 
+class ActivityCounter(db.Model):
+    """Running view/download total for one dataset or hubfile (``subject_id == 0`` holds the global total)."""
+
+    __tablename__ = "activity_counter"
+    __table_args__ = (db.UniqueConstraint("scope", "subject_id", "metric", name="uq_activity_counter"),)
+
+    GLOBAL = 0
+
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(16), nullable=False)  # "dataset" | "hubfile"
+    subject_id = db.Column(db.Integer, nullable=False, default=GLOBAL)
+    metric = db.Column(db.String(16), nullable=False)  # "views" | "downloads"
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ActivityCounter {self.scope}:{self.subject_id} {self.metric}={self.total}>"
+
+
+class ActivityDailyCounter(db.Model):
+    """Same as ``ActivityCounter`` but bucketed per calendar day."""
+
+    __tablename__ = "activity_daily_counter"
+    __table_args__ = (db.UniqueConstraint("scope", "subject_id", "metric", "day", name="uq_activity_daily_counter"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(16), nullable=False)
+    subject_id = db.Column(db.Integer, nullable=False, default=ActivityCounter.GLOBAL)
+    metric = db.Column(db.String(16), nullable=False)
+    day = db.Column(db.Date, nullable=False, index=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ActivityDailyCounter {self.scope}:{self.subject_id} {self.metric}@{self.day}={self.total}>"
+
+
 class DOIMapping(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     dataset_doi_old = db.Column(db.String(120))
@@ -176,3 +233,45 @@ class Issue(db.Model):
 
     dataset = db.relationship("DataSet", backref=db.backref("issues", lazy=True, cascade="all, delete"))
     reporter = db.relationship("User", backref=db.backref("reported_issues", lazy=True))
+
+
+class PublishJob(db.Model):
+    """A queued dataset publication; see dataset.publishing for the states it goes through."""
+
+    __tablename__ = "publish_job"
+
+    QUEUED = "queued"
+    VALIDATING = "validating"
+    STORING = "storing"
+    REGISTERING = "registering"
+    DONE = "done"
+    FAILED = "failed"
+    FINISHED = (DONE, FAILED)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
+    status = db.Column(db.String(16), nullable=False, default=QUEUED)
+    message = db.Column(db.Text)
+    # form fields captured when the job was queued, as JSON
+    payload = db.Column(db.Text, nullable=False)
+    # the user's uploads, moved out of their temp folder so they can keep working
+    folder = db.Column(db.String(255), nullable=False)
+    editing_dataset_id = db.Column(db.Integer)
+    dataset_id = db.Column(db.Integer)
+    storage_attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "message": self.message,
+            "dataset_id": self.dataset_id,
+            "storage_attempts": self.storage_attempts,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+    def __repr__(self):
+        return f"<PublishJob {self.id} {self.status}>"
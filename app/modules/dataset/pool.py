@@ -0,0 +1,50 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional, TypeVar
+
+from flask import current_app
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+DEFAULT_MAX_WORKERS = 8
+
+
+def _configured(key: str, default):
+    try:
+        return current_app.config.get(key, default)
+    except RuntimeError:
+        return default
+
+
+def worker_count(item_count: int, max_workers: Optional[int] = None) -> int:
+    """Workers for ``item_count`` items: ``max_workers``, else ``INGEST_MAX_WORKERS``, else the CPU count."""
+    limit = max_workers or _configured("INGEST_MAX_WORKERS", 0) or min(DEFAULT_MAX_WORKERS, os.cpu_count() or 1)
+    return max(1, min(item_count, limit))
+
+
+def ordered_map(
+    function: Callable[[T], R],
+    items: Iterable[T],
+    max_workers: Optional[int] = None,
+    processes: Optional[bool] = None,
+) -> List[R]:
+    """``[function(item) for item in items]`` spread over a bounded pool, results in input order.
+
+    Threads suit disk-bound work such as hashing (hashlib and file reads drop
+    the GIL); ``processes`` is for pure-Python work such as CSV parsing, and
+    then ``function`` and the items must be picklable. With ``processes`` left
+    as None, ``INGEST_USE_PROCESSES`` decides, and it defaults to processes:
+    callers doing disk-bound work ask for threads explicitly. A single worker
+    runs inline.
+    The first exception raised by ``function`` propagates.
+    """
+    items = list(items)
+    workers = worker_count(len(items), max_workers)
+    if workers == 1:
+        return [function(item) for item in items]
+    if processes is None:
+        processes = bool(_configured("INGEST_USE_PROCESSES", True))
+    executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with executor_class(max_workers=workers) as executor:
+        return list(executor.map(function, items))
@@ -0,0 +1,149 @@
+import csv
+import hashlib
+import heapq
+import json
+from itertools import islice
+from typing import Dict, Iterable, List, Optional
+
+from app.modules.dataset.csv_schema import INTEGER, ISO_DATE, Schema
+from app.modules.dataset.steamcsv_service import SteamCSVService
+
+BATCH_ROWS = 4096
+# hashes kept per column; distinct counts up to this size are exact
+SKETCH_SIZE = 256
+_HASH_SPACE = float(1 << 64)
+
+
+class DistinctSketch:
+    """K-minimum-values estimate of a column's distinct count.
+
+    Keeps the ``SKETCH_SIZE`` smallest 64-bit hashes of the values seen. Below
+    that many distinct values the count is exact; above it, the k-th smallest
+    hash tells how densely the hash space is filled. Sketches merge by union,
+    which is how per-file counts roll up to the dataset.
+    """
+
+    def __init__(self, hashes: Iterable[int] = ()) -> None:
+        self.hashes = set(hashes)
+
+    def add_many(self, values: Iterable[str]) -> None:
+        new = {int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big") for value in values}
+        self._keep(self.hashes | new)
+
+    def merge(self, other: "DistinctSketch") -> None:
+        self._keep(self.hashes | other.hashes)
+
+    def _keep(self, hashes: set) -> None:
+        self.hashes = hashes if len(hashes) <= SKETCH_SIZE else set(heapq.nsmallest(SKETCH_SIZE, hashes))
+
+    def estimate(self) -> int:
+        if len(self.hashes) < SKETCH_SIZE:
+            return len(self.hashes)
+        return int(round((SKETCH_SIZE - 1) / (max(self.hashes) / _HASH_SPACE)))
+
+
+class ColumnProfile:
+    def __init__(self, ordered: bool = False, numeric: bool = False) -> None:
+        # min/max are kept for ordered (numeric or ISO date) columns only
+        self.ordered = ordered
+        self.numeric = numeric
+        self.nulls = 0
+        self.min = None
+        self.max = None
+        self.distinct = DistinctSketch()
+
+    def update(self, values: List[str]) -> None:
+        self.nulls += values.count("")
+        present = set(values)
+        present.discard("")
+        if not present:
+            return
+        self.distinct.add_many(present)
+        if self.ordered:
+            try:
+                keys = list(map(int, present)) if self.numeric else present
+            except ValueError:
+                # not all numeric after all; keep the column profile without a range
+                self.ordered = False
+                self.min = self.max = None
+                return
+            self._extend(min(keys), max(keys))
+
+    def _extend(self, low, high) -> None:
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    def merge(self, other: "ColumnProfile") -> None:
+        self.nulls += other.nulls
+        self.distinct.merge(other.distinct)
+        if self.ordered and other.ordered and other.min is not None:
+            self._extend(other.min, other.max)
+        elif not other.ordered:
+            self.ordered = False
+            self.min = self.max = None
+
+    def to_dict(self) -> dict:
+        data = {"nulls": self.nulls, "distinct": self.distinct.estimate()}
+        if self.ordered:
+            data.update(min=self.min, max=self.max)
+        return data
+
+
+class CsvProfile:
+    """Row count and per-column statistics of one CSV file, or of several merged."""
+
+    def __init__(self, columns: Optional[Dict[str, ColumnProfile]] = None, row_count: int = 0) -> None:
+        self.columns = columns if columns is not None else {}
+        self.row_count = row_count
+
+    def merge(self, other: "CsvProfile") -> None:
+        self.row_count += other.row_count
+        for name, column in other.columns.items():
+            if name in self.columns:
+                self.columns[name].merge(column)
+            else:
+                self.columns[name] = ColumnProfile(column.ordered, column.numeric)
+                self.columns[name].merge(column)
+
+    def to_dict(self) -> dict:
+        return {name: column.to_dict() for name, column in self.columns.items()}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+
+def profile_csv(file_path: str, schema: Optional[Schema] = None) -> CsvProfile:
+    """Profile ``file_path`` in one streaming pass, ``BATCH_ROWS`` rows at a time.
+
+    Columns declared in ``schema`` as integers or ISO dates also get a min/max
+    range. Rows whose width does not match the header and blank rows are not
+    counted, mirroring what validation lets through.
+    """
+    kinds = {column.name: column.kind for column in (schema or SteamCSVService.SCHEMA).columns}
+
+    with open(file_path, "r", encoding="utf-8", newline="") as handler:
+        reader = csv.reader(handler)
+        headers = next(reader, [])
+        profile = CsvProfile(
+            {
+                name: ColumnProfile(kinds.get(name) in (INTEGER, ISO_DATE), kinds.get(name) is INTEGER)
+                for name in headers
+            }
+        )
+        columns = [profile.columns[name] for name in headers]
+        width = len(headers)
+        for rows in iter(lambda: list(islice(reader, BATCH_ROWS)), []):
+            rows = [row for row in rows if len(row) == width and "".join(row).strip()]
+            if not rows:
+                continue
+            profile.row_count += len(rows)
+            for column, values in zip(columns, zip(*rows)):
+                column.update(list(values))
+    return profile
+
+
+def merge_profiles(profiles: Iterable[CsvProfile]) -> CsvProfile:
+    merged = CsvProfile()
+    for profile in profiles:
+        merged.merge(profile)
+    return merged
@@ -0,0 +1,263 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Callable, Optional
+
+from flask import current_app
+
+from app import db
+from app.modules.dataset.models import PublishJob
+from core.configuration.configuration import uploads_folder_name
+
+logger = logging.getLogger(__name__)
+
+QUEUE_NAME = "publish"
+STAGING_DIR = "publish"
+DEFAULT_STORAGE_ATTEMPTS = 3
+DEFAULT_RETRY_DELAY = 1.0
+
+
+def _config(key: str, default):
+    try:
+        return current_app.config.get(key, default)
+    except RuntimeError:
+        return default
+
+
+class DatasetPublisher:
+    """The steps of publishing a dataset, shared by the upload route and the queued job.
+
+    ``validate`` checks the CSVs, ``store`` creates the rows and moves the
+    files into storage (retrying the move), ``register`` creates the Fakenodo
+    deposition and assigns the DOI. Services are passed in so both callers use
+    whatever instances they are configured with.
+    """
+
+    def __init__(self, dataset_service, fakenodo_service, csv_service_class, storage_attempts=None, retry_delay=None):
+        self.dataset_service = dataset_service
+        self.fakenodo_service = fakenodo_service
+        self.csv_service_class = csv_service_class
+        self.storage_attempts = storage_attempts or _config("PUBLISH_STORAGE_ATTEMPTS", DEFAULT_STORAGE_ATTEMPTS)
+        self.retry_delay = _config("PUBLISH_RETRY_DELAY", DEFAULT_RETRY_DELAY) if retry_delay is None else retry_delay
+
+    def validate(self, folder: str) -> None:
+        """Raises ValueError with the user-facing message when the CSVs are not acceptable."""
+        self.csv_service_class().validate_folder(folder)
+
+    def store(self, form, user, source_folder: Optional[str] = None, on_attempt: Optional[Callable] = None):
+        # without a source folder the services fall back to the logged-in user's temp folder
+        location = {"source_folder": source_folder} if source_folder else {}
+        dataset = self.dataset_service.create_from_form(form=form, current_user=user, draft_mode=False, **location)
+
+        move_location = {"source_dir": source_folder} if source_folder else {}
+        for attempt in range(1, self.storage_attempts + 1):
+            if on_attempt is not None:
+                on_attempt(dataset, attempt)
+            try:
+                self.dataset_service.move_dataset_files(dataset, **move_location)
+                return dataset
+            except Exception:
+                if attempt == self.storage_attempts:
+                    raise
+                delay = self.retry_delay * 2 ** (attempt - 1)
+                logger.warning(
+                    "Storing files of dataset %s failed (attempt %s), retrying in %ss", dataset, attempt, delay
+                )
+                time.sleep(delay)
+
+    def register(self, dataset, editing_dataset_id=None) -> Optional[str]:
+        """Deposit on Fakenodo and set the DOI; returns a message for the user when the DOI could not be set."""
+        try:
+            data = self.fakenodo_service.create_new_deposition(dataset) or {}
+        except Exception as exc:
+            data = {}
+            logger.exception(f"Exception while create dataset data in Fakenodo {exc}")
+
+        if not data.get("conceptrecid"):
+            return None
+
+        deposition_id = data.get("id")
+        self.dataset_service.update_dsmetadata(dataset.ds_meta_data_id, deposition_id=deposition_id)
+        try:
+            deposition_doi = self.fakenodo_service.get_doi(deposition_id)
+            self.dataset_service.update_dsmetadata(dataset.ds_meta_data_id, dataset_doi=deposition_doi)
+            # If this upload was created by editing an existing draft, delete the original draft
+            if editing_dataset_id:
+                try:
+                    orig = self.dataset_service.get_by_id(int(editing_dataset_id))
+                    if orig:
+                        self.dataset_service.delete_draft_dataset(orig)
+                except Exception:
+                    logger.exception("Could not delete original draft %s", editing_dataset_id)
+        except Exception as e:
+            return f"It has not been possible to upload files to Fakenodo and update the DOI: {e}"
+        return None
+
+    @staticmethod
+    def cleanup(folder: str) -> None:
+        if os.path.exists(folder) and os.path.isdir(folder):
+            shutil.rmtree(folder)
+
+
+def snapshot_form(form) -> dict:
+    """The parts of a validated DataSetForm that publishing reads, as plain JSON-able data."""
+    return {
+        "dsmetadata": form.get_dsmetadata(),
+        "authors": form.get_authors(),
+        "dataset_files": [
+            {"metadata": file_form.get_file_metadata(), "authors": file_form.get_authors()}
+            for file_form in form.dataset_files
+        ],
+    }
+
+
+class FormSnapshot:
+    """Replays a ``snapshot_form`` dict through the interface ``create_from_form`` expects."""
+
+    def __init__(self, data: dict) -> None:
+        self.data = data
+        self.dataset_files = [_FileFormSnapshot(entry) for entry in data["dataset_files"]]
+
+    def get_dsmetadata(self):
+        return dict(self.data["dsmetadata"])
+
+    def get_authors(self):
+        return [dict(author) for author in self.data["authors"]]
+
+
+class _FileFormSnapshot:
+    def __init__(self, data: dict) -> None:
+        self.data = data
+        self.csv_filename = SimpleNamespace(data=data["metadata"]["csv_filename"])
+
+    def get_file_metadata(self):
+        return dict(self.data["metadata"])
+
+    def get_authors(self):
+        return [dict(author) for author in self.data["authors"]]
+
+
+def staging_folder(token: str) -> str:
+    return os.path.join(uploads_folder_name(), STAGING_DIR, token)
+
+
+def queue_publication(form, user, editing_dataset_id=None) -> PublishJob:
+    """Take the user's uploads out of their temp folder, record a job for them and enqueue it."""
+    folder = staging_folder(uuid.uuid4().hex)
+    os.makedirs(os.path.dirname(folder), exist_ok=True)
+    temp_folder = user.temp_folder()
+    if os.path.isdir(temp_folder):
+        os.replace(temp_folder, folder)
+    else:
+        os.makedirs(folder)
+
+    job = PublishJob(
+        user_id=user.id,
+        status=PublishJob.QUEUED,
+        payload=json.dumps(snapshot_form(form)),
+        folder=folder,
+        editing_dataset_id=int(editing_dataset_id) if editing_dataset_id else None,
+    )
+    db.session.add(job)
+    db.session.commit()
+    try:
+        enqueue(job.id)
+    except Exception as exc:
+        # e.g. redis is unreachable: nothing will ever pick the job up
+        logger.exception("Could not queue publish job %s", job.id)
+        _give_back_uploads(job, user)
+        _set_status(job, PublishJob.FAILED, f"Could not queue the publication: {exc}")
+    return job
+
+
+def enqueue(job_id: int) -> None:
+    """Hand the job to the backend named by ``PUBLISH_QUEUE``: ``rq``, ``thread`` or ``inline``."""
+    backend = _config("PUBLISH_QUEUE", "thread")
+    if backend == "rq":
+        rq_queue().enqueue(run_publish_job, job_id, job_timeout=_config("PUBLISH_JOB_TIMEOUT", 1800))
+    elif backend == "inline":
+        run_publish_job(job_id)
+    else:
+        app = current_app._get_current_object()
+        threading.Thread(target=_run_in_app, args=(app, job_id), name=f"publish-{job_id}", daemon=True).start()
+
+
+def rq_queue():
+    from redis import Redis
+    from rq import Queue
+
+    return Queue(QUEUE_NAME, connection=Redis.from_url(_config("REDIS_URL", "redis://localhost:6379/0")))
+
+
+def _run_in_app(app, job_id: int) -> None:
+    with app.app_context():
+        run_publish_job(job_id)
+
+
+def _set_status(job: PublishJob, status: str, message: Optional[str] = None) -> None:
+    job.status = status
+    if message is not None:
+        job.message = message
+    db.session.commit()
+
+
+def run_publish_job(job_id: int) -> Optional[str]:
+    """Run a queued publication to the end; the job row records every state change. Needs an app context."""
+    from app.modules.auth.models import User
+    from app.modules.dataset.services import DataSetService
+    from app.modules.dataset.steamcsv_service import SteamCSVService
+    from app.modules.fakenodo.services import FakenodoService
+
+    job = db.session.get(PublishJob, job_id)
+    if job is None or job.status in PublishJob.FINISHED:
+        return job.status if job else None
+
+    user = db.session.get(User, job.user_id)
+    publisher = DatasetPublisher(DataSetService(), FakenodoService(), SteamCSVService)
+
+    try:
+        _set_status(job, PublishJob.VALIDATING)
+        try:
+            publisher.validate(job.folder)
+        except ValueError as verr:
+            _give_back_uploads(job, user)
+            _set_status(job, PublishJob.FAILED, str(verr))
+            return job.status
+
+        _set_status(job, PublishJob.STORING)
+
+        def record_attempt(dataset, attempt):
+            job.dataset_id = dataset.id
+            job.storage_attempts = attempt
+            db.session.commit()
+
+        dataset = publisher.store(
+            FormSnapshot(json.loads(job.payload)), user, source_folder=job.folder, on_attempt=record_attempt
+        )
+
+        _set_status(job, PublishJob.REGISTERING)
+        warning = publisher.register(dataset, job.editing_dataset_id)
+
+        publisher.cleanup(job.folder)
+        _set_status(job, PublishJob.DONE, warning or "Everything works!")
+    except Exception as exc:
+        logger.exception("Publish job %s failed", job_id)
+        db.session.rollback()
+        job = db.session.get(PublishJob, job_id)
+        _set_status(job, PublishJob.FAILED, f"Exception while create dataset data in local: {exc}")
+    return job.status
+
+
+def _give_back_uploads(job: PublishJob, user) -> None:
+    # the job will not publish these files: put them back so the user can fix them and retry
+    temp_folder = user.temp_folder()
+    if not os.path.exists(temp_folder):
+        os.makedirs(os.path.dirname(temp_folder), exist_ok=True)
+        os.replace(job.folder, temp_folder)
+    else:
+        DatasetPublisher.cleanup(job.folder)
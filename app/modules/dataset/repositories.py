@@ -4,8 +4,21 @@ from typing import Optional
 
 from flask_login import current_user
 from sqlalchemy import desc, func
-
-from app.modules.dataset.models import Author, DataSet, DOIMapping, DSDownloadRecord, DSMetaData, DSViewRecord, Issue
+from sqlalchemy.orm import selectinload
+
+from app.modules.dataset.models import (
+    ActivityCounter,
+    ActivityDailyCounter,
+    Author,
+    DataSet,
+    DOIMapping,
+    DSDownloadRecord,
+    DSMetaData,
+    DSViewRecord,
+    Issue,
+)
+from app.modules.datasetfile.models import DatasetFile, DatasetFileMetaData
+from core.events import event_buffer
 from core.repositories.BaseRepository import BaseRepository
 
 logger = logging.getLogger(__name__)
@@ -16,13 +29,60 @@ class AuthorRepository(BaseRepository):
         super().__init__(Author)
 
 
+class ActivityCounterRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(ActivityCounter)
+
+    def total(self, scope: str, metric: str, subject_id: int = ActivityCounter.GLOBAL) -> int:
+        value = (
+            self.session.query(self.model.total).filter_by(scope=scope, subject_id=subject_id, metric=metric).scalar()
+        )
+        return int(value or 0)
+
+    def totals_for(self, scope: str, metric: str, subject_ids) -> dict:
+        if not subject_ids:
+            return {}
+        rows = (
+            self.session.query(self.model.subject_id, self.model.total)
+            .filter(
+                self.model.scope == scope,
+                self.model.metric == metric,
+                self.model.subject_id.in_(list(subject_ids)),
+            )
+            .all()
+        )
+        return {subject_id: int(total) for subject_id, total in rows}
+
+    def totals_subquery(self, scope: str, metric: str):
+        """``(subject_id, total)`` rows for every subject, ready to be joined."""
+        return (
+            self.session.query(self.model.subject_id.label("subject_id"), self.model.total.label("total"))
+            .filter(self.model.scope == scope, self.model.metric == metric)
+            .subquery()
+        )
+
+    def window_totals(self, scope: str, metric: str, since_day, session=None):
+        """``(subject_id, total)`` summed over the daily buckets from ``since_day`` onwards."""
+        session = session or self.session
+        return (
+            session.query(ActivityDailyCounter.subject_id, func.sum(ActivityDailyCounter.total))
+            .filter(
+                ActivityDailyCounter.scope == scope,
+                ActivityDailyCounter.metric == metric,
+                ActivityDailyCounter.subject_id != ActivityCounter.GLOBAL,
+                ActivityDailyCounter.day >= since_day,
+            )
+            .group_by(ActivityDailyCounter.subject_id)
+            .all()
+        )
+
+
 class DSDownloadRecordRepository(BaseRepository):
     def __init__(self):
         super().__init__(DSDownloadRecord)
 
     def total_dataset_downloads(self) -> int:
-        max_id = self.model.query.with_entities(func.max(self.model.id)).scalar()
-        return max_id if max_id is not None else 0
+        return ActivityCounterRepository().total("dataset", "downloads")
 
     def count_downloads_for_user(self, user_id: int) -> int:
         """Count total dataset downloads for datasets owned by the given user.
@@ -43,6 +103,9 @@ class DSDownloadRecordRepository(BaseRepository):
             return 0
         return self.model.query.filter(self.model.user_id == user_id).count()
 
+    def record_download(self, **values) -> Optional[DSDownloadRecord]:
+        return event_buffer.record(self.model, **values)
+
 
 class DSMetaDataRepository(BaseRepository):
     def __init__(self):
@@ -73,18 +136,30 @@ class DSViewRecordRepository(BaseRepository):
         super().__init__(DSViewRecord)
 
     def total_dataset_views(self) -> int:
-        max_id = self.model.query.with_entities(func.max(self.model.id)).scalar()
-        return max_id if max_id is not None else 0
+        return ActivityCounterRepository().total("dataset", "views")
+
+    @staticmethod
+    def _dedup_key(dataset: DataSet, user_cookie: str):
+        user_id = current_user.id if current_user.is_authenticated else None
+        return ("dataset_view", user_id, dataset.id, user_cookie)
 
     def the_record_exists(self, dataset: DataSet, user_cookie: str):
-        return self.model.query.filter_by(
+        dedup_key = self._dedup_key(dataset, user_cookie)
+        if event_buffer.has_seen(dedup_key):
+            return True
+        record = self.model.query.filter_by(
             user_id=current_user.id if current_user.is_authenticated else None,
             dataset_id=dataset.id,
             view_cookie=user_cookie,
         ).first()
-
-    def create_new_record(self, dataset: DataSet, user_cookie: str) -> DSViewRecord:
-        return self.create(
+        if record:
+            event_buffer.mark_seen(dedup_key)
+        return record
+
+    def create_new_record(self, dataset: DataSet, user_cookie: str) -> Optional[DSViewRecord]:
+        return event_buffer.record(
+            self.model,
+            dedup_key=self._dedup_key(dataset, user_cookie),
             user_id=current_user.id if current_user.is_authenticated else None,
             dataset_id=dataset.id,
             view_date=datetime.now(timezone.utc),
@@ -92,13 +167,47 @@ class DSViewRecordRepository(BaseRepository):
         )
 
 
+def loader_options(profile: str) -> list:
+    """Eager-loading options for a named DataSet loader profile.
+
+    ``summary`` covers everything ``DataSet.to_dict`` reads (metadata, authors,
+    dataset metrics, files); ``full`` also loads the per-file metadata and metrics.
+    Every relationship is ``selectinload``-ed, so a page of datasets costs a
+    fixed number of queries and plays well with ``DISTINCT``/``LIMIT``.
+    """
+    if profile not in LOADER_PROFILES:
+        raise ValueError(f"Unknown loader profile: {profile}")
+    metadata = selectinload(DataSet.ds_meta_data)
+    dataset_files = selectinload(DataSet.dataset_files)
+    options = [
+        metadata.selectinload(DSMetaData.authors),
+        metadata.selectinload(DSMetaData.ds_metrics),
+        dataset_files.selectinload(DatasetFile.files),
+    ]
+    if profile == "full":
+        options += [
+            dataset_files.selectinload(DatasetFile.file_metadata).selectinload(DatasetFileMetaData.metrics),
+        ]
+    return options
+
+
+LOADER_PROFILES = ("summary", "full")
+
+
 class DataSetRepository(BaseRepository):
     def __init__(self):
         super().__init__(DataSet)
 
+    def query_with(self, profile: str):
+        return self.model.query.options(*loader_options(profile))
+
+    def get_with(self, profile: str, dataset_id: int) -> Optional[DataSet]:
+        return self.query_with(profile).filter(DataSet.id == dataset_id).first()
+
     def get_synchronized(self, current_user_id: int) -> DataSet:
         return (
-            self.model.query.join(DSMetaData)
+            self.query_with("summary")
+            .join(DSMetaData)
             .filter(
                 DataSet.user_id == current_user_id,
                 DataSet.draft_mode.is_(False),
@@ -111,7 +220,8 @@ class DataSetRepository(BaseRepository):
 
     def get_unsynchronized(self, current_user_id: int) -> DataSet:
         return (
-            self.model.query.join(DSMetaData)
+            self.query_with("summary")
+            .join(DSMetaData)
             .filter(
                 DataSet.user_id == current_user_id,
                 DataSet.draft_mode == True,
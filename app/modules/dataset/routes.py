@@ -3,30 +3,34 @@ import json
 import logging
 import os
 import shutil
-import tempfile
 import uuid
 from datetime import datetime, timezone
-from zipfile import ZipFile
 
 from flask import (
+    Response,
     abort,
     jsonify,
     make_response,
     redirect,
     render_template,
     request,
-    send_from_directory,
+    send_file,
+    stream_with_context,
     url_for,
 )
 from flask_login import current_user, login_required
+from werkzeug.utils import secure_filename
 
+from app import db
 from app.modules.auth.models import UserRole
 from app.modules.community.models import ProposalStatus
 from app.modules.community.repositories import CommunityProposalRepository
 from app.modules.community.services import CommunityService
-from app.modules.dataset import dataset_bp
+from app.modules.dataset import checksums, chunked_upload, dataset_bp
+from app.modules.dataset.chunked_upload import ChunkedUpload, UploadError
 from app.modules.dataset.forms import DataSetForm
-from app.modules.dataset.models import DataSet
+from app.modules.dataset.models import DataSet, PublishJob
+from app.modules.dataset.publishing import DatasetPublisher, queue_publication
 from app.modules.dataset.services import (
     DataSetService,
     DOIMappingService,
@@ -37,8 +41,9 @@ from app.modules.dataset.services import (
 )
 from app.modules.dataset.steamcsv_service import SteamCSVService
 from app.modules.fakenodo.services import FakenodoService
+from app.modules.hubfile.row_index import INDEX_SUFFIX
 from app.modules.hubfile.services import HubfileService
-from core.storage import storage_service
+from core.storage import archive_cache, file_cache, storage_service, stream_zip
 
 logger = logging.getLogger(__name__)
 
@@ -52,22 +57,40 @@ community_service = CommunityService()
 community_proposal_repo = CommunityProposalRepository()
 
 
-def _write_dataset_zip(dataset, zip_path: str):
+def _copy_stored_files(dataset, dest_dir):
+    """Put a copy of each of the dataset's files in ``dest_dir`` under its original name."""
+    hubfiles = dataset.files()
+    storage_service.fetch_many(
+        [hubfile.stored_path(dataset.user_id, dataset.id) for hubfile in hubfiles],
+        dest_dir=dest_dir,
+        names=[hubfile.name for hubfile in hubfiles],
+    )
+
+
+def _dataset_zip_entries(dataset):
     dataset_dir = storage_service.dataset_subdir(dataset.user_id, dataset.id)
     stored_files = storage_service.list_files(dataset_dir)
-    if not stored_files:
-        raise FileNotFoundError("Files not found")
     dataset_prefix = dataset_dir.replace("\\", "/")
-    with ZipFile(zip_path, "w") as zipf:
-        for stored_key in stored_files:
-            normalized_key = stored_key.replace("\\", "/")
-            if normalized_key.startswith(dataset_prefix):
-                inner = normalized_key[len(dataset_prefix) :].lstrip("/")
-            else:
-                inner = normalized_key
-            arcname = os.path.join(f"dataset_{dataset.id}", inner)
-            with storage_service.as_local_path(normalized_key) as local_file:
-                zipf.write(local_file, arcname=arcname)
+    # with the checksum a file can be served from the local cache
+    file_checksums = {}
+    entries = []
+    for hubfile in dataset.files():
+        if hubfile.storage_key:
+            # deduplicated content lives in the blob store, not under the dataset folder
+            entries.append((f"dataset_{dataset.id}/{hubfile.name}", hubfile.storage_key, hubfile.checksum))
+        else:
+            file_checksums[hubfile.name] = hubfile.checksum
+    for stored_key in stored_files:
+        normalized_key = stored_key.replace("\\", "/")
+        if normalized_key.endswith(INDEX_SUFFIX):
+            continue  # viewer sidecar, not part of the dataset
+        if normalized_key.startswith(dataset_prefix):
+            inner = normalized_key[len(dataset_prefix) :].lstrip("/")
+        else:
+            inner = normalized_key
+        arcname = f"dataset_{dataset.id}/{inner}"
+        entries.append((arcname, normalized_key, file_checksums.get(inner)))
+    return entries
 
 
 @dataset_bp.route("/dataset/upload", methods=["GET", "POST"])
@@ -121,6 +144,17 @@ def create_dataset():
             message_text = "; ".join(messages) if messages else "Validation error"
             return jsonify({"message": message_text}), 400
 
+        editing_id = request.form.get("editing_dataset_id")
+        if _prefers_async():
+            # validation, storage and registration happen in a publish job; the client polls its status
+            job = queue_publication(form, current_user, editing_dataset_id=editing_id)
+            status_url = url_for("dataset.publish_status", job_id=job.id)
+            response = jsonify({**job.to_dict(), "status_url": status_url})
+            response.headers["Location"] = status_url
+            response.headers["Preference-Applied"] = "respond-async"
+            return response, 202
+
+        publisher = DatasetPublisher(dataset_service, fakenodo_service, SteamCSVService)
         try:
             try:
                 temp_dir = current_user.temp_folder()
@@ -130,57 +164,23 @@ def create_dataset():
                 logger.info("[upload] temp_folder='%s', files=%s", temp_dir, dir_list)
             except Exception as diag_exc:
                 logger.warning("[upload] Could not inspect temp folder for diagnostics: %s", diag_exc)
-            service = SteamCSVService()
             try:
-                service.validate_folder(current_user.temp_folder())
+                publisher.validate(current_user.temp_folder())
             except ValueError as verr:
                 return jsonify({"message": str(verr)}), 400
 
             logger.info("Creating dataset...")
-            dataset = dataset_service.create_from_form(form=form, current_user=current_user, draft_mode=False)
+            dataset = publisher.store(form, current_user)
             logger.info(f"Created dataset: {dataset}")
-            dataset_service.move_dataset_files(dataset)
         except Exception as exc:
             logger.exception(f"Exception while create dataset data in local {exc}")
             return jsonify({"Exception while create dataset data in local: ": str(exc)}), 400
 
-        data = {}
-        try:
-            fakenodo_response_json = fakenodo_service.create_new_deposition(dataset)
-            response_data = json.dumps(fakenodo_response_json)
-            data = json.loads(response_data)
-        except Exception as exc:
-            data = {}
-            fakenodo_response_json = {}
-            logger.exception(f"Exception while create dataset data in Fakenodo {exc}")
-
-        if data.get("conceptrecid"):
-            deposition_id = data.get("id")
-
-            dataset_service.update_dsmetadata(dataset.ds_meta_data_id, deposition_id=deposition_id)
-
-            try:
-                deposition_doi = fakenodo_service.get_doi(deposition_id)
-                dataset_service.update_dsmetadata(dataset.ds_meta_data_id, dataset_doi=deposition_doi)
-                # If this upload was created by editing an existing draft, delete the original draft
-                try:
-                    editing_id = request.form.get("editing_dataset_id")
-                    if editing_id:
-                        try:
-                            orig = dataset_service.get_by_id(int(editing_id))
-                            if orig:
-                                dataset_service.delete_draft_dataset(orig)
-                        except Exception:
-                            logger.exception("Could not delete original draft %s", editing_id)
-                except Exception:
-                    pass
-            except Exception as e:
-                msg = f"It has not been possible to upload files to Fakenodo and update the DOI: {e}"
-                return jsonify({"message": msg}), 200
+        msg = publisher.register(dataset, editing_id)
+        if msg:
+            return jsonify({"message": msg}), 200
 
-        file_path = current_user.temp_folder()
-        if os.path.exists(file_path) and os.path.isdir(file_path):
-            shutil.rmtree(file_path)
+        publisher.cleanup(current_user.temp_folder())
 
         msg = "Everything works!"
         return jsonify({"message": msg}), 200
@@ -190,6 +190,20 @@ def create_dataset():
     return render_template("dataset/upload_dataset.html", form=form, save_drafts=user_preference)
 
 
+def _prefers_async() -> bool:
+    prefer = request.headers.get("Prefer", "")
+    return any(token.strip().lower() == "respond-async" for token in prefer.split(","))
+
+
+@dataset_bp.route("/dataset/publish/<int:job_id>", methods=["GET"])
+@login_required
+def publish_status(job_id):
+    job = db.session.get(PublishJob, job_id)
+    if job is None or job.user_id != current_user.id:
+        return jsonify({"message": "Publish job not found"}), 404
+    return jsonify(job.to_dict()), 200
+
+
 @dataset_bp.route("/dataset/<int:dataset_id>/edit", methods=["GET", "POST"])
 @login_required
 def update_dataset(dataset_id):
@@ -290,14 +304,7 @@ def update_dataset(dataset_id):
                     # If editing a published dataset, copy existing files to temp folder
                     if not ds.draft_mode:
                         try:
-                            temp_dir = current_user.temp_folder()
-                            if not os.path.exists(temp_dir):
-                                os.makedirs(temp_dir, exist_ok=True)
-                            for fm in ds.feature_models:
-                                filename = fm.fm_meta_data.csv_filename
-                                stored_key = storage_service.dataset_file_path(ds.user_id, ds.id, filename)
-                                with storage_service.as_local_path(stored_key) as local_file_path:
-                                    shutil.copy(local_file_path, os.path.join(temp_dir, filename))
+                            _copy_stored_files(ds, current_user.temp_folder())
                         except Exception:
                             logger.exception("Could not copy stored files to temp folder for editing published dataset")
             except Exception:
@@ -469,20 +476,11 @@ def upload():
     if not os.path.exists(temp_folder):
         os.makedirs(temp_folder)
 
-    file_path = os.path.join(temp_folder, file.filename)
-
-    if os.path.exists(file_path):
-        base_name, extension = os.path.splitext(file.filename)
-        i = 1
-        while os.path.exists(os.path.join(temp_folder, f"{base_name} ({i}){extension}")):
-            i += 1
-        new_filename = f"{base_name} ({i}){extension}"
-        file_path = os.path.join(temp_folder, new_filename)
-    else:
-        new_filename = file.filename
+    new_filename = _unique_temp_filename(temp_folder, file.filename)
+    file_path = os.path.join(temp_folder, new_filename)
 
     try:
-        file.save(file_path)
+        checksums.save_stream(file.stream, file_path)
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
@@ -492,6 +490,111 @@ def upload():
     )
 
 
+def _unique_temp_filename(temp_folder, filename):
+    if not os.path.exists(os.path.join(temp_folder, filename)):
+        return filename
+    base_name, extension = os.path.splitext(filename)
+    i = 1
+    while os.path.exists(os.path.join(temp_folder, f"{base_name} ({i}){extension}")):
+        i += 1
+    return f"{base_name} ({i}){extension}"
+
+
+def _upload_error(error):
+    body = {"message": str(error)}
+    if error.offset is not None:
+        body["offset"] = error.offset
+    return jsonify(body), error.status_code
+
+
+def _upload_not_found():
+    return jsonify({"message": "Upload not found"}), 404
+
+
+@dataset_bp.route("/dataset/file/upload/init", methods=["POST"])
+@login_required
+def upload_init():
+    """Start a resumable upload; chunks are then PUT to ``/dataset/file/upload/<upload_id>``."""
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get("filename") or "")
+    if not filename.endswith(".csv"):
+        return jsonify({"message": "No valid file"}), 400
+    size = data.get("size")
+    try:
+        size = int(size) if size is not None else None
+        upload = ChunkedUpload.start(current_user.temp_folder(), filename, size)
+    except ValueError:
+        return jsonify({"message": "size must be an integer"}), 400
+    except UploadError as e:
+        return _upload_error(e)
+    return (
+        jsonify({"upload_id": upload.upload_id, "offset": 0, "max_chunk_size": chunked_upload.MAX_CHUNK_BYTES}),
+        201,
+    )
+
+
+@dataset_bp.route("/dataset/file/upload/<upload_id>", methods=["GET"])
+@login_required
+def upload_status(upload_id):
+    upload = ChunkedUpload.load(current_user.temp_folder(), upload_id)
+    if upload is None:
+        return _upload_not_found()
+    return jsonify({"upload_id": upload_id, "filename": upload.filename, "size": upload.size, "offset": upload.offset})
+
+
+@dataset_bp.route("/dataset/file/upload/<upload_id>", methods=["PUT"])
+@login_required
+def upload_chunk(upload_id):
+    """Append the raw request body at ``?offset=``; an optional ``X-Chunk-SHA256`` header is verified."""
+    upload = ChunkedUpload.load(current_user.temp_folder(), upload_id)
+    if upload is None:
+        return _upload_not_found()
+    offset = request.args.get("offset", type=int)
+    if offset is None:
+        return jsonify({"message": "offset is required", "offset": upload.offset}), 400
+    try:
+        new_offset = upload.append(request.stream, offset, request.headers.get("X-Chunk-SHA256"))
+    except UploadError as e:
+        return _upload_error(e)
+    return jsonify({"upload_id": upload_id, "offset": new_offset}), 200
+
+
+@dataset_bp.route("/dataset/file/upload/<upload_id>/finalize", methods=["POST"])
+@login_required
+def upload_finalize(upload_id):
+    upload = ChunkedUpload.load(current_user.temp_folder(), upload_id)
+    if upload is None:
+        return _upload_not_found()
+    data = request.get_json(silent=True) or {}
+    temp_folder = current_user.temp_folder()
+    new_filename = _unique_temp_filename(temp_folder, upload.filename)
+    try:
+        checksum, size = upload.finalize(os.path.join(temp_folder, new_filename), data.get("sha256"))
+    except UploadError as e:
+        return _upload_error(e)
+    return (
+        jsonify(
+            {
+                "message": "File uploaded and validated successfully",
+                "filename": new_filename,
+                "checksum": checksum,
+                "size": size,
+            }
+        ),
+        200,
+    )
+
+
+@dataset_bp.route("/dataset/file/upload/<upload_id>", methods=["DELETE"])
+@login_required
+def upload_abort(upload_id):
+    upload = ChunkedUpload.load(current_user.temp_folder(), upload_id)
+    if upload is None:
+        return _upload_not_found()
+    upload.abort()
+    return jsonify({"message": "Upload aborted"}), 200
+
+
 @dataset_bp.route("/dataset/file/delete", methods=["POST"])
 @login_required
 def delete():
@@ -502,6 +605,7 @@ def delete():
 
     if os.path.exists(filepath):
         os.remove(filepath)
+        checksums.discard_sidecar(filepath)
         return jsonify({"message": "File deleted successfully"}), 200
 
     return jsonify({"error": "File not found"}), 404
@@ -524,23 +628,9 @@ def delete_dataset_file(dataset_id):
         return jsonify({"message": "Filename required"}), 400
 
     try:
-        # Find the feature model with this filename
-        fm_to_delete = None
-        for fm in dataset.feature_models:
-            if fm.fm_meta_data.csv_filename == filename:
-                fm_to_delete = fm
-                break
-
-        if not fm_to_delete:
+        if not dataset_service.delete_dataset_file(dataset, filename):
             return jsonify({"message": "File not found in dataset"}), 404
 
-        # Delete the file from storage
-        stored_key = storage_service.dataset_file_path(dataset.user_id, dataset.id, filename)
-        storage_service.delete_file(stored_key)
-
-        # Delete from DB
-        dataset_service.feature_model_repository.delete(fm_to_delete.id)
-
         return jsonify({"message": "File deleted successfully"})
     except Exception as exc:
         logger.exception(f"Error deleting file {filename} from dataset {dataset_id}: {exc}")
@@ -598,25 +688,37 @@ def clean_temp():
 @dataset_bp.route("/dataset/download/<int:dataset_id>", methods=["GET"])
 def download_dataset(dataset_id):
     dataset = dataset_service.get_or_404(dataset_id)
-
-    temp_dir = tempfile.mkdtemp()
-    zip_path = os.path.join(temp_dir, f"dataset_{dataset_id}.zip")
-    try:
-        _write_dataset_zip(dataset, zip_path)
-    except FileNotFoundError:
-        shutil.rmtree(temp_dir, ignore_errors=True)
-        abort(404)
+    download_name = f"dataset_{dataset_id}.zip"
+
+    # Published datasets never change, so their archive is built once and reused
+    cache_key = None
+    cached_path = None
+    if not dataset.draft_mode:
+        cache_key = dataset_service.archive_cache_key(dataset)
+        cached_path = archive_cache.lookup(cache_key)
+
+    if cached_path:
+        presigned_url = storage_service.generate_presigned_url(cached_path, download_name=download_name)
+        if presigned_url:
+            resp = redirect(presigned_url)
+        else:
+            resp = send_file(
+                storage_service.get_local_path(cached_path),
+                mimetype="application/zip",
+                as_attachment=True,
+                download_name=download_name,
+            )
+    else:
+        entries = _dataset_zip_entries(dataset)
+        if not entries:
+            abort(404)
+        chunks = stream_zip(entries, cache=file_cache)
+        if cache_key:
+            chunks = archive_cache.store_while_streaming(cache_key, chunks)
+        resp = Response(stream_with_context(chunks), mimetype="application/zip")
+        resp.headers["Content-Disposition"] = f'attachment; filename="{download_name}"'
 
     user_cookie = str(uuid.uuid4())
-
-    resp = make_response(
-        send_from_directory(
-            temp_dir,
-            f"dataset_{dataset_id}.zip",
-            as_attachment=True,
-            mimetype="application/zip",
-        )
-    )
     resp.set_cookie("download_cookie", user_cookie)
 
     DSDownloadRecordService().create(
@@ -825,8 +927,8 @@ def edit(dataset_id):
 
         # Feature models: prepare a simple representation for the template to render
         editing_files = []
-        for idx, fm in enumerate(dataset.feature_models):
-            fm_md = fm.fm_meta_data
+        for dataset_file in dataset.dataset_files:
+            fm_md = dataset_file.file_metadata
             filename = fm_md.csv_filename
             editing_files.append(
                 {
@@ -840,16 +942,11 @@ def edit(dataset_id):
                 }
             )
 
-            # Copy stored file into user's temp folder so the upload flow can find it
-            try:
-                temp_dir = current_user.temp_folder()
-                if not os.path.exists(temp_dir):
-                    os.makedirs(temp_dir, exist_ok=True)
-                stored_key = storage_service.dataset_file_path(dataset.user_id, dataset.id, filename)
-                with storage_service.as_local_path(stored_key) as local_file_path:
-                    shutil.copy(local_file_path, os.path.join(temp_dir, filename))
-            except Exception:
-                logger.exception("Could not copy stored file %s to temp folder for editing", filename)
+        # Copy stored files into user's temp folder so the upload flow can find them
+        try:
+            _copy_stored_files(dataset, current_user.temp_folder())
+        except Exception:
+            logger.exception("Could not copy stored files to temp folder for editing dataset %s", dataset_id)
 
     except Exception:
         logger.exception("Error preparing edit form for dataset %s", dataset_id)
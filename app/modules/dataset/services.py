@@ -1,18 +1,22 @@
-import hashlib
 import logging
 import os
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import List, Optional, Set
 
 from flask import request
-from sqlalchemy import desc, func, or_
+from sqlalchemy import func, or_
+from sqlalchemy.orm import joinedload
 
 from app import db
 from app.modules.auth.services import AuthenticationService
 from app.modules.community.models import CommunityDatasetProposal, ProposalStatus
-from app.modules.dataset.models import Author, DataSet, DSDownloadRecord, DSMetaData, DSViewRecord
+from app.modules.dataset import counters  # noqa: F401  (registers the counter listeners)
+from app.modules.dataset import checksums, profiling
+from app.modules.dataset.models import Author, DataSet, DSMetaData, DSMetrics, DSViewRecord, steamgameshub_doi_url
+from app.modules.dataset.pool import ordered_map
 from app.modules.dataset.repositories import (
+    ActivityCounterRepository,
     AuthorRepository,
     DataSetRepository,
     DOIMappingRepository,
@@ -21,24 +25,43 @@ from app.modules.dataset.repositories import (
     DSViewRecordRepository,
     IssueRepository,
 )
+from app.modules.dataset.trending import trending_leaderboard
+from app.modules.datasetfile.models import DatasetFileMetrics
 from app.modules.datasetfile.repositories import DatasetFileMetaDataRepository, DatasetFileRepository
 from app.modules.hubfile.repositories import (
     HubfileDownloadRecordRepository,
     HubfileRepository,
     HubfileViewRecordRepository,
 )
+from app.modules.hubfile.services import BlobService
 from core.services.BaseService import BaseService
-from core.storage import storage_service
+from core.storage import archive_cache, storage_service
 
 logger = logging.getLogger(__name__)
 
 
 def calculate_checksum_and_size(file_path):
-    file_size = os.path.getsize(file_path)
-    with open(file_path, "rb") as file:
-        content = file.read()
-        hash_sha256 = hashlib.sha256(content).hexdigest()
-        return hash_sha256, file_size
+    # reuses the sidecar written while the file was uploaded, hashing in chunks otherwise
+    return checksums.checksum_and_size(file_path)
+
+
+def calculate_checksums_and_sizes(file_paths, skip_errors=False):
+    # same as above for several files, hashed concurrently and returned in order
+    return checksums.checksums_and_sizes(file_paths, skip_errors=skip_errors)
+
+
+def profile_files(file_paths) -> List[profiling.CsvProfile]:
+    # one streaming pass per file, spread over the ingest pool like validation
+    return ordered_map(profiling.profile_csv, file_paths)
+
+
+def file_metrics(profile: profiling.CsvProfile) -> DatasetFileMetrics:
+    return DatasetFileMetrics(row_count=profile.row_count, column_profile=profile.to_json())
+
+
+def dataset_metrics(profiles: List[profiling.CsvProfile]) -> DSMetrics:
+    merged = profiling.merge_profiles(profiles)
+    return DSMetrics(number_of_files=str(len(profiles)), row_count=merged.row_count, column_profile=merged.to_json())
 
 
 class DataSetService(BaseService):
@@ -53,20 +76,66 @@ class DataSetService(BaseService):
         self.hubfilerepository = HubfileRepository()
         self.dsviewrecord_repository = DSViewRecordRepository()
         self.hubfileviewrecord_repository = HubfileViewRecordRepository()
+        self.activitycounter_repository = ActivityCounterRepository()
 
-    def move_dataset_files(self, dataset: DataSet):
-        current_user = AuthenticationService().get_authenticated_user()
-        source_dir = current_user.temp_folder()
+    def move_dataset_files(self, dataset: DataSet, source_dir: Optional[str] = None):
+        """Move the dataset's files from ``source_dir`` (default: the current user's temp folder) into storage.
 
+        Files already moved by an earlier, interrupted call are skipped, so it can be retried.
+        With ``STORAGE_DEDUP`` on, content already stored for any dataset is referenced, not copied.
+        """
+        if source_dir is None:
+            current_user = AuthenticationService().get_authenticated_user()
+            source_dir = current_user.temp_folder()
+            owner_id = current_user.id
+        else:
+            owner_id = dataset.user_id
+
+        if storage_service.uses_dedup():
+            stored = [
+                (hubfile, os.path.join(source_dir, dataset_file.file_metadata.csv_filename))
+                for dataset_file in dataset.dataset_files
+                for hubfile in dataset_file.files
+            ]
+            try:
+                BlobService().store(stored)
+            finally:
+                for _, src_path in stored:
+                    if not os.path.exists(src_path):
+                        checksums.discard_sidecar(src_path)
+            return
+
+        pending = []
         for dataset_file in dataset.dataset_files:
             csv_filename = dataset_file.file_metadata.csv_filename
             src_path = os.path.join(source_dir, csv_filename)
             dest_relative = storage_service.dataset_file_path(
-                current_user.id,
+                owner_id,
                 dataset.id,
                 csv_filename,
             )
-            storage_service.save_local_file(src_path, dest_relative)
+            if not os.path.exists(src_path) and storage_service.exists(dest_relative):
+                continue
+            pending.append((src_path, dest_relative))
+
+        try:
+            storage_service.save_many(pending)
+        finally:
+            for src_path, _ in pending:
+                if not os.path.exists(src_path):
+                    checksums.discard_sidecar(src_path)
+
+    def archive_cache_key(self, dataset: DataSet) -> str:
+        return archive_cache.key_for(
+            f"dataset_{dataset.id}",
+            [(hubfile.name, hubfile.checksum) for hubfile in dataset.files()],
+        )
+
+    def invalidate_archive(self, dataset: DataSet) -> None:
+        try:
+            archive_cache.invalidate(self.archive_cache_key(dataset))
+        except Exception:
+            logger.exception("Could not invalidate cached archive for dataset %s", dataset.id)
 
     def get_synchronized(self, current_user_id: int) -> DataSet:
         return self.repository.get_synchronized(current_user_id)
@@ -110,7 +179,9 @@ class DataSetService(BaseService):
         hubfile_files = self.hubfiledownloadrecord_repository.count_downloads_performed_by_user(user_id)
         return dataset_archives + hubfile_files
 
-    def create_from_form(self, form, current_user, draft_mode: bool = False) -> DataSet:
+    def create_from_form(
+        self, form, current_user, draft_mode: bool = False, source_folder: Optional[str] = None
+    ) -> DataSet:
         main_author = {
             "name": f"{current_user.profile.surname}, {current_user.profile.name}",
             "affiliation": current_user.profile.affiliation,
@@ -138,11 +209,17 @@ class DataSetService(BaseService):
                 draft_mode=draft_mode,
             )
 
-            for dataset_file_form in form.dataset_files:
+            temp_folder = source_folder or current_user.temp_folder()
+            file_paths = [os.path.join(temp_folder, file_form.csv_filename.data) for file_form in form.dataset_files]
+            file_stats = calculate_checksums_and_sizes(file_paths)
+            file_profiles = profile_files(file_paths)
+            dsmetadata.ds_metrics = dataset_metrics(file_profiles)
+            for dataset_file_form, (checksum, size), file_profile in zip(form.dataset_files, file_stats, file_profiles):
                 csv_filename = dataset_file_form.csv_filename.data
                 file_metadata = self.dataset_file_metadata_repository.create(
                     commit=False, **dataset_file_form.get_file_metadata()
                 )
+                file_metadata.metrics = file_metrics(file_profile)
                 for author_data in dataset_file_form.get_authors():
                     author = self.author_repository.create(
                         commit=False, fm_meta_data_id=file_metadata.id, **author_data
@@ -153,9 +230,6 @@ class DataSetService(BaseService):
                     commit=False, data_set_id=dataset.id, metadata_id=file_metadata.id
                 )
 
-                file_path = os.path.join(current_user.temp_folder(), csv_filename)
-                checksum, size = calculate_checksum_and_size(file_path)
-
                 file = self.hubfilerepository.create(
                     commit=False, name=csv_filename, checksum=checksum, size=size, dataset_file_id=dataset_file.id
                 )
@@ -249,9 +323,17 @@ class DataSetService(BaseService):
             )
 
             # create feature models and files from form for new dataset
-            for feature_model in form.feature_models:
+            temp_folder = current_user.temp_folder()
+            file_paths = [
+                os.path.join(temp_folder, feature_model.csv_filename.data) for feature_model in form.feature_models
+            ]
+            file_stats = calculate_checksums_and_sizes(file_paths)
+            file_profiles = profile_files(file_paths)
+            new_meta.ds_metrics = dataset_metrics(file_profiles)
+            for feature_model, (checksum, size), file_profile in zip(form.feature_models, file_stats, file_profiles):
                 csv_filename = feature_model.csv_filename.data
                 fmmetadata = self.fmmetadata_repository.create(commit=False, **feature_model.get_fmmetadata())
+                fmmetadata.metrics = file_metrics(file_profile)
                 fm_seen = set()
                 for author_data in feature_model.get_authors():
                     key = (author_data.get("name"), author_data.get("orcid"))
@@ -266,9 +348,6 @@ class DataSetService(BaseService):
                 )
 
                 # associated files in feature model
-                file_path = os.path.join(current_user.temp_folder(), csv_filename)
-                checksum, size = calculate_checksum_and_size(file_path)
-
                 file = self.hubfilerepository.create(
                     commit=False, name=csv_filename, checksum=checksum, size=size, feature_model_id=fm.id
                 )
@@ -280,6 +359,7 @@ class DataSetService(BaseService):
             logger.info(f"Exception creating new dataset version: {exc}")
             self.repository.session.rollback()
             raise exc
+        self.invalidate_archive(prev_dataset)
         return dataset
 
     def create_draft(self, current_user, data: dict = None) -> DataSet:
@@ -308,20 +388,21 @@ class DataSetService(BaseService):
 
             dataset = self.create(commit=False, user_id=current_user.id, ds_meta_data_id=dsmetadata.id, draft_mode=True)
 
-            # Move CSV files from user's temp folder into persistent storage and create
-            # corresponding feature model and hubfile records so the draft appears
-            # with its files in the user's local datasets view.
+            # Register the CSV files of the user's temp folder, then move them into storage
+            # so the draft appears with its files in the user's local datasets view.
             temp_dir = current_user.temp_folder()
             if os.path.isdir(temp_dir):
-                for filename in sorted(os.listdir(temp_dir)):
-                    if not filename.lower().endswith(".csv"):
-                        continue
-
+                filenames = [name for name in sorted(os.listdir(temp_dir)) if name.lower().endswith(".csv")]
+                file_stats = calculate_checksums_and_sizes(
+                    [os.path.join(temp_dir, name) for name in filenames], skip_errors=True
+                )
+                for filename, stats in zip(filenames, file_stats):
                     file_path = os.path.join(temp_dir, filename)
                     try:
-                        checksum, size = calculate_checksum_and_size(file_path)
+                        # an unreadable file raises here again so it gets logged and skipped
+                        checksum, size = stats or calculate_checksum_and_size(file_path)
 
-                        fmmetadata = self.fmmetadata_repository.create(
+                        file_metadata = self.dataset_file_metadata_repository.create(
                             commit=False,
                             csv_filename=filename,
                             title="",
@@ -332,35 +413,39 @@ class DataSetService(BaseService):
                             csv_version=None,
                         )
 
-                        # create a minimal author for the feature model
-                        fm_author = self.author_repository.create(
-                            commit=False, fm_meta_data_id=fmmetadata.id, **main_author
+                        # create a minimal author for the file
+                        file_author = self.author_repository.create(
+                            commit=False, fm_meta_data_id=file_metadata.id, **main_author
                         )
-                        fmmetadata.authors.append(fm_author)
+                        file_metadata.authors.append(file_author)
 
-                        fm = self.feature_model_repository.create(
-                            commit=False, data_set_id=dataset.id, fm_meta_data_id=fmmetadata.id
+                        dataset_file = self.dataset_file_repository.create(
+                            commit=False, data_set_id=dataset.id, metadata_id=file_metadata.id
                         )
 
                         hubfile = self.hubfilerepository.create(
-                            commit=False, name=filename, checksum=checksum, size=size, feature_model_id=fm.id
+                            commit=False, name=filename, checksum=checksum, size=size, dataset_file_id=dataset_file.id
                         )
-                        fm.files.append(hubfile)
-
-                        # save the actual file into storage
-                        dest_relative = storage_service.dataset_file_path(current_user.id, dataset.id, filename)
-                        storage_service.save_local_file(file_path, dest_relative)
+                        dataset_file.files.append(hubfile)
                     except Exception:
-                        logger.exception("Failed to move and register file %s into draft dataset", filename)
+                        logger.exception("Failed to register file %s into draft dataset", filename)
 
             self.repository.session.commit()
-            return dataset
         except Exception as exc:
             logger.exception(f"Exception creating draft dataset: {exc}")
             self.repository.session.rollback()
             raise
 
+        # the same path as a publication: blobs and reference counts under STORAGE_DEDUP, the dataset folder otherwise
+        if dataset.dataset_files:
+            try:
+                self.move_dataset_files(dataset, source_dir=temp_dir)
+            except Exception:
+                logger.exception("Failed to move the files of draft dataset %s into storage", dataset.id)
+        return dataset
+
     def delete_dataset(self, dataset):
+        blob_keys = [hubfile.storage_key for hubfile in dataset.files() if hubfile.storage_key]
         try:
             self.repository.session.delete(dataset)
             self.repository.session.commit()
@@ -368,6 +453,35 @@ class DataSetService(BaseService):
             logger.exception(f"Exception deleting dataset: {exc}")
             self.repository.session.rollback()
             raise exc
+        BlobService().release(blob_keys)
+
+    def delete_dataset_file(self, dataset, filename: str) -> bool:
+        """Remove one file from ``dataset``; returns False when the dataset has no file of that name."""
+        dataset_file = next(
+            (
+                candidate
+                for candidate in dataset.dataset_files
+                if candidate.file_metadata and candidate.file_metadata.csv_filename == filename
+            ),
+            None,
+        )
+        if dataset_file is None:
+            return False
+
+        blob_keys = [hubfile.storage_key for hubfile in dataset_file.files if hubfile.storage_key]
+        in_dataset_folder = not dataset_file.files or any(not hubfile.storage_key for hubfile in dataset_file.files)
+        try:
+            self.repository.session.delete(dataset_file)
+            BlobService().release(blob_keys, commit=False)
+            self.repository.session.commit()
+        except Exception as exc:
+            logger.exception(f"Exception deleting file {filename} of dataset {dataset.id}: {exc}")
+            self.repository.session.rollback()
+            raise exc
+
+        if in_dataset_folder:
+            storage_service.delete_file(storage_service.dataset_file_path(dataset.user_id, dataset.id, filename))
+        return True
 
     def delete_draft_dataset(self, dataset):
         if not dataset:
@@ -376,6 +490,8 @@ class DataSetService(BaseService):
         if not dataset.draft_mode:
             raise ValueError("Only draft datasets can be deleted using this endpoint")
 
+        stored_dir = storage_service.dataset_subdir(dataset.user_id, dataset.id)
+        blob_keys = [hubfile.storage_key for hubfile in dataset.files() if hubfile.storage_key]
         try:
             self.repository.session.delete(dataset)
             self.repository.session.commit()
@@ -384,12 +500,17 @@ class DataSetService(BaseService):
             self.repository.session.rollback()
             raise exc
 
+        BlobService().release(blob_keys)
+        try:
+            storage_service.delete_prefix(stored_dir)
+        except Exception:
+            logger.exception("Could not delete the stored files of draft %s", stored_dir)
+
     def update_dsmetadata(self, metadata_id, **kwargs):
         return self.dsmetadata_repository.update(metadata_id, **kwargs)
 
     def get_steamgameshub_doi(self, dataset: DataSet) -> str:
-        domain = os.getenv("DOMAIN", "localhost")
-        return f"http://{domain}/doi/{dataset.ds_meta_data.dataset_doi}"
+        return steamgameshub_doi_url(dataset.ds_meta_data.dataset_doi)
 
     def change_draft_mode(self, dataset_id: int):
         dataset = self.get_by_id(dataset_id)
@@ -410,45 +531,44 @@ class DataSetService(BaseService):
         return self._fallback_trending(limit)
 
     def _query_trending_metrics(self, period_days: int, by: str, limit: int):
-        since = datetime.now() - timedelta(days=period_days)
-        session = self.repository.session
-        metric_model = DSViewRecord if by == "views" else DSDownloadRecord if by == "downloads" else None
-        if metric_model is None:
+        if by not in ("views", "downloads"):
             return []
 
-        ts_col_name = "view_date" if metric_model is DSViewRecord else "download_date"
-        ts_col = getattr(metric_model, ts_col_name, None)
-        if ts_col is None:
-            raise AttributeError(f"{metric_model.__name__} no tiene '{ts_col_name}'")
+        session = self.repository.session
+        ranking = trending_leaderboard.top(by, period_days, limit, session=session)
+        ranked_ids = [dataset_id for dataset_id, _ in ranking]
+
+        by_id = {}
+        if ranked_ids:
+            by_id = {dataset.id: dataset for dataset in session.query(DataSet).filter(DataSet.id.in_(ranked_ids))}
+        results = [(by_id[dataset_id], score) for dataset_id, score in ranking if dataset_id in by_id]
+
+        # Pad with inactive datasets so the block keeps its size on a quiet week
+        missing = limit - len(results)
+        if missing > 0:
+            padding = session.query(DataSet).order_by(DataSet.created_at.desc())
+            if by_id:
+                padding = padding.filter(DataSet.id.notin_(list(by_id)))
+            results.extend((dataset, 0) for dataset in padding.limit(missing).all())
+        return results
 
-        subq = (
-            session.query(
-                metric_model.dataset_id.label("dataset_id"),
-                func.count(metric_model.id).label("metric"),
+    def _attach_accepted_communities(self, results):
+        session = self.repository.session
+        dataset_ids = [dataset.id for dataset, _ in results]
+        accepted = (
+            session.query(CommunityDatasetProposal)
+            .options(joinedload(CommunityDatasetProposal.community))
+            .filter(
+                CommunityDatasetProposal.dataset_id.in_(dataset_ids),
+                CommunityDatasetProposal.status == ProposalStatus.ACCEPTED,
             )
-            .filter(ts_col >= since)
-            .group_by(metric_model.dataset_id)
-            .subquery()
-        )
-
-        query = (
-            session.query(DataSet, func.coalesce(subq.c.metric, 0).label("metric"))
-            .outerjoin(subq, subq.c.dataset_id == DataSet.id)
-            .order_by(desc("metric"))
-            .limit(limit)
+            .all()
         )
-        return query.all()
+        communities = {proposal.dataset_id: proposal.community for proposal in accepted}
 
-    def _attach_accepted_communities(self, results):
-        session = self.repository.session
         enriched = []
         for dataset, metric in results:
-            accepted_proposal = (
-                session.query(CommunityDatasetProposal)
-                .filter_by(dataset_id=dataset.id, status=ProposalStatus.ACCEPTED)
-                .first()
-            )
-            dataset.accepted_community = accepted_proposal.community if accepted_proposal else None
+            dataset.accepted_community = communities.get(dataset.id)
             enriched.append((dataset, int(metric or 0)))
         return enriched
 
@@ -477,6 +597,7 @@ class DataSetService(BaseService):
             )
             previous_version.is_latest = True
 
+            self.invalidate_archive(current_dataset)
             self.delete_dataset(current_dataset)
             self.repository.session.commit()
         except Exception as exc:
@@ -578,15 +699,7 @@ class DataSetService(BaseService):
             .all()
         )
 
-        download_counts = {
-            dataset_id: count
-            for dataset_id, count in (
-                db.session.query(DSDownloadRecord.dataset_id, func.count(DSDownloadRecord.id))
-                .filter(DSDownloadRecord.dataset_id.in_(candidate_ids))
-                .group_by(DSDownloadRecord.dataset_id)
-                .all()
-            )
-        }
+        download_counts = self.activitycounter_repository.totals_for("dataset", "downloads", candidate_ids)
 
         accepted_map = {
             proposal.dataset_id: proposal.community
@@ -628,6 +741,9 @@ class DSDownloadRecordService(BaseService):
     def __init__(self):
         super().__init__(DSDownloadRecordRepository())
 
+    def create(self, **kwargs):
+        return self.repository.record_download(**kwargs)
+
 
 class DSMetaDataService(BaseService):
     def __init__(self):
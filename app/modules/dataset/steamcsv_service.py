@@ -2,67 +2,141 @@ from __future__ import annotations
 
 import csv
 import os
-from typing import List
+from functools import partial
+from itertools import islice
+from typing import Dict, List, Optional
+
+from app.modules.dataset.csv_schema import BOOLEAN, INTEGER, ISO_DATE, LIST, TEXT, Column, Schema
+from app.modules.dataset.pool import ordered_map
+
+
+def _is_blank(row: List[str]) -> bool:
+    return not "".join(row).strip()
 
 
 class SteamCSVService:
     type_key = "steamcsv"
 
-    REQUIRED_HEADERS: List[str] = [
-        "appid",
-        "name",
-        "release_date",
-        "is_free",
-        "developers",
-        "publishers",
-        "platforms",
-        "genres",
-        "tags",
-    ]
+    SCHEMA = Schema(
+        [
+            Column("appid", INTEGER),
+            Column("name", TEXT),
+            Column("release_date", ISO_DATE, required=False),
+            Column("is_free", BOOLEAN),
+            Column("developers", TEXT, required=False),
+            Column("publishers", TEXT, required=False),
+            Column("platforms", LIST),
+            Column("genres", LIST, required=False),
+            Column("tags", LIST, required=False),
+        ]
+    )
+    REQUIRED_HEADERS: List[str] = SCHEMA.headers
+
+    # row numbers reported per file before validation of that file stops
+    MAX_ROW_ERRORS = 10
+    # rows checked together against SCHEMA
+    BATCH_ROWS = 4096
+
+    def __init__(self, max_workers: Optional[int] = None, processes: Optional[bool] = None) -> None:
+        # None defers to INGEST_MAX_WORKERS / INGEST_USE_PROCESSES, see pool.ordered_map
+        self.max_workers = max_workers
+        self.processes = processes
 
     def validate_folder(self, folder_path: str) -> None:
+        """Validate every CSV in ``folder_path`` concurrently; errors are reported in filename order."""
         if not os.path.isdir(folder_path):
             return  # Nothing to validate
 
-        errors: List[str] = []
-        found_csv = False
-
-        for entry in os.listdir(folder_path):
-            if not entry.lower().endswith(".csv"):
-                continue  # Ignore non-CSV files
-            found_csv = True
-            msg = self._validate_csv_file(folder_path, entry)
-            if msg:
-                errors.append(msg)
+        # Ignore non-CSV files
+        entries = sorted(entry for entry in os.listdir(folder_path) if entry.lower().endswith(".csv"))
 
         # Require at least one CSV file for steamcsv datasets
-        if not found_csv:
+        if not entries:
             raise ValueError("No .csv files found for Steam CSV dataset type")
 
+        results = ordered_map(
+            partial(self._validate_csv_file, folder_path),
+            entries,
+            max_workers=self.max_workers,
+            processes=self.processes,
+        )
+        errors: List[str] = [msg for msg in results if msg]
         if errors:
             raise ValueError("; ".join(errors))
 
     def _validate_csv_file(self, folder_path: str, entry: str) -> str | None:
+        """Check one CSV in a single streaming pass against ``SCHEMA``.
+
+        Rows are read ``BATCH_ROWS`` at a time; row widths and then each column
+        of the batch are checked at once, so per-row Python work only happens
+        for rows that fail. At most ``MAX_ROW_ERRORS`` row numbers are kept
+        across all checks; reading stops once they are collected.
+        """
         fpath = os.path.join(folder_path, entry)
+        width = len(self.REQUIRED_HEADERS)
+        bad_rows: List[int] = []
+        bad_cells: Dict[str, List[int]] = {column.name: [] for column in self.SCHEMA.columns}
+        has_data = False
+        errors = 0
         try:
             with open(fpath, "r", encoding="utf-8", newline="") as f:
                 reader = csv.reader(f)
                 headers = next(reader, [])
-                rows = list(reader)
+                if headers != self.REQUIRED_HEADERS:
+                    return (
+                        f"{entry}: invalid headers. Expected exactly: "
+                        f"{', '.join(self.REQUIRED_HEADERS)} in this order"
+                    )
+
+                first_number = 2
+                for rows in iter(lambda: list(islice(reader, self.BATCH_ROWS)), []):
+                    if not has_data:
+                        has_data = any(not _is_blank(row) for row in rows)
+                    numbers = range(first_number, first_number + len(rows))
+                    first_number += len(rows)
+
+                    if set(map(len, rows)) != {width}:
+                        for number, row in zip(numbers, rows):
+                            if len(row) != width and errors < self.MAX_ROW_ERRORS:
+                                bad_rows.append(number)
+                                errors += 1
+                        kept = [(number, row) for number, row in zip(numbers, rows) if len(row) == width]
+                        numbers = [number for number, _ in kept]
+                        rows = [row for _, row in kept]
+
+                    for column, positions in zip(self.SCHEMA.columns, self.SCHEMA.check_batch(rows)):
+                        # rows with nothing in them are skipped, as they always were
+                        positions = [position for position in positions if not _is_blank(rows[position])]
+                        for position in positions[: max(0, self.MAX_ROW_ERRORS - errors)]:
+                            bad_cells[column.name].append(numbers[position])
+                            errors += 1
+
+                    # an empty file outranks the other errors, so only stop once data has been seen
+                    if has_data and errors >= self.MAX_ROW_ERRORS:
+                        break
         except Exception as exc:
             return f"{entry}: cannot read CSV ({exc})"
 
-        if headers != self.REQUIRED_HEADERS:
-            return f"{entry}: invalid headers. Expected exactly: " f"{', '.join(self.REQUIRED_HEADERS)} in this order"
-
-        if not rows or all(not any(cell.strip() for cell in row) for row in rows):
+        if not has_data:
             return f"{entry}: must contain at least one data row"
 
-        for i, row in enumerate(rows, start=2):
-            if len(row) != len(self.REQUIRED_HEADERS):
-                return f"{entry}: row {i} does not match header column count"
+        suffix = f" (stopped after {self.MAX_ROW_ERRORS})" if errors >= self.MAX_ROW_ERRORS else ""
+        messages = []
+        if len(bad_rows) == 1:
+            messages.append(f"{entry}: row {bad_rows[0]} does not match header column count")
+        elif bad_rows:
+            listed = ", ".join(str(number) for number in bad_rows)
+            messages.append(f"{entry}: rows {listed} do not match header column count")
+        for column in self.SCHEMA.columns:
+            numbers = sorted(bad_cells[column.name])
+            if numbers:
+                label = "row" if len(numbers) == 1 else "rows"
+                listed = ", ".join(str(number) for number in numbers)
+                messages.append(f"{entry}: column {column.name} must be {column.describe()} ({label} {listed})")
 
-        return None
+        if not messages:
+            return None
+        return "; ".join(messages) + suffix
 
     def files_block_partial(self) -> str:
         return "dataset/_files_block.html"
@@ -1,4 +1,6 @@
+import hashlib
 import io
+import os
 import tempfile
 import types
 import uuid
@@ -8,6 +10,7 @@ import pytest
 
 from app import db
 from app.modules.auth.models import User
+from app.modules.dataset import checksums
 from app.modules.dataset.models import DataCategory, DataSet, DSMetaData
 
 
@@ -153,6 +156,26 @@ def test_file_upload_renames_duplicate_csv(test_client, users):
     assert f2.endswith(".csv")
 
 
+def test_file_upload_records_checksum_sidecar(test_client, users, monkeypatch, tmp_path):
+    monkeypatch.setenv("UPLOADS_DIR", str(tmp_path))
+    owner, _ = users
+    csv_bytes = b"a,b\n1,2\n"
+
+    with force_login(test_client, owner):
+        r = test_client.post(
+            "/dataset/file/upload",
+            data={"file": (io.BytesIO(csv_bytes), "hashed.csv")},
+            content_type="multipart/form-data",
+        )
+    assert r.status_code == 200
+    path = os.path.join(owner.temp_folder(), r.get_json()["filename"])
+    assert checksums.read_sidecar(path) == (hashlib.sha256(csv_bytes).hexdigest(), len(csv_bytes))
+
+    with force_login(test_client, owner):
+        test_client.post("/dataset/file/delete", json={"file": r.get_json()["filename"]})
+    assert not os.path.exists(checksums.sidecar_path(path))
+
+
 def test_clean_temp_redirects(test_client, users):
     owner, _ = users
     with force_login(test_client, owner):
@@ -762,3 +785,232 @@ def test_create_draft_dataset_failure_returns_400(test_client, users, monkeypatc
 
     assert r.status_code == 400
     assert "boom-create-draft" in r.get_data(as_text=True)
+
+
+def test_datasets_api_pages_projects_and_filters(test_client, users):
+    owner, other = users
+    mine = [make_dataset(owner).id for _ in range(3)]
+    make_dataset(other)
+
+    resp = test_client.get(f"/api/v1/datasets/?user_id={owner.id}&per_page=2&fields=dataset_id,name")
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert body["total"] == 3
+    assert [item["dataset_id"] for item in body["items"]] == mine[:2]
+    assert set(body["items"][0]) == {"dataset_id", "name"}
+    assert body["next_cursor"] == str(mine[1])
+
+    resp = test_client.get(f"/api/v1/datasets/?user_id={owner.id}&per_page=2&cursor={body['next_cursor']}")
+    rest = resp.get_json()
+    assert [item["dataset_id"] for item in rest["items"]] == mine[2:]
+    assert rest["next_cursor"] is None
+    assert "files" in rest["items"][0]
+
+    assert test_client.get("/api/v1/datasets/?fields=nope").status_code == 400
+    assert test_client.get("/api/v1/datasets/?user_id=abc").status_code == 400
+    assert test_client.get("/api/v1/datasets/?page=0").status_code == 400
+
+
+def test_datasets_api_answers_304_until_the_collection_changes(test_client, users):
+    owner, _ = users
+    make_dataset(owner)
+
+    resp = test_client.get("/api/v1/datasets/")
+    etag = resp.headers["ETag"]
+    assert resp.headers.get("Last-Modified")
+
+    cached = test_client.get("/api/v1/datasets/", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.data == b""
+
+    since = test_client.get("/api/v1/datasets/", headers={"If-Modified-Since": resp.headers["Last-Modified"]})
+    assert since.status_code == 304
+
+    make_dataset(owner)
+    assert test_client.get("/api/v1/datasets/", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_chunked_upload_resumes_and_verifies(test_client, users, monkeypatch, tmp_path):
+    monkeypatch.setenv("UPLOADS_DIR", str(tmp_path))
+    owner, _ = users
+    payload = b"appid,name\n" + b"".join(f"{i},Game {i}\n".encode() for i in range(500))
+    first, second = payload[:1000], payload[1000:]
+
+    with force_login(test_client, owner):
+        r = test_client.post("/dataset/file/upload/init", json={"filename": "big.csv", "size": len(payload)})
+        assert r.status_code == 201
+        upload_id = r.get_json()["upload_id"]
+        url = f"/dataset/file/upload/{upload_id}"
+
+        r = test_client.put(
+            f"{url}?offset=0", data=first, headers={"X-Chunk-SHA256": hashlib.sha256(first).hexdigest()}
+        )
+        assert r.get_json()["offset"] == len(first)
+
+        # a corrupted chunk is rejected and rolled back
+        r = test_client.put(f"{url}?offset={len(first)}", data=second, headers={"X-Chunk-SHA256": "0" * 64})
+        assert r.status_code == 422
+        # resuming from the wrong place is refused with the offset to continue from
+        r = test_client.put(f"{url}?offset=0", data=second)
+        assert r.status_code == 409
+        assert r.get_json()["offset"] == len(first)
+        assert test_client.get(url).get_json()["offset"] == len(first)
+
+        r = test_client.post(f"{url}/finalize", json={})
+        assert r.status_code == 400
+
+        test_client.put(f"{url}?offset={len(first)}", data=second)
+        r = test_client.post(f"{url}/finalize", json={"sha256": hashlib.sha256(payload).hexdigest()})
+        assert r.status_code == 200
+        body = r.get_json()
+        assert test_client.get(url).status_code == 404
+
+    path = os.path.join(owner.temp_folder(), body["filename"])
+    with open(path, "rb") as handler:
+        assert handler.read() == payload
+    assert checksums.read_sidecar(path) == (hashlib.sha256(payload).hexdigest(), len(payload))
+
+    with force_login(test_client, owner):
+        assert test_client.post("/dataset/file/upload/init", json={"filename": "notes.txt"}).status_code == 400
+        assert test_client.put("/dataset/file/upload/nope?offset=0", data=b"x").status_code == 404
+
+
+STEAM_CSV = (
+    b"appid,name,release_date,is_free,developers,publishers,platforms,genres,tags\n"
+    b"570,Dota 2,2013-07-09,true,Valve,Valve,win,MOBA,Multiplayer\n"
+)
+
+
+def _publish_form(csv_filename="games.csv"):
+    return {
+        "title": "Queued dataset",
+        "desc": "Published through a job",
+        "data_category": "general",
+        "dataset_files-0-csv_filename": csv_filename,
+        "dataset_files-0-title": "Games",
+        "dataset_files-0-desc": "Some games",
+        "dataset_files-0-data_category": "general",
+    }
+
+
+def _stage_upload(owner, content=STEAM_CSV, name="games.csv"):
+    os.makedirs(owner.temp_folder(), exist_ok=True)
+    with open(os.path.join(owner.temp_folder(), name), "wb") as handler:
+        handler.write(content)
+
+
+def test_async_publish_runs_job_and_reports_status(test_client, users, monkeypatch, tmp_path):
+    from app.modules.dataset.models import PublishJob
+
+    monkeypatch.setenv("UPLOADS_DIR", str(tmp_path))
+    owner, other = users
+    _stage_upload(owner)
+
+    with force_login(test_client, owner):
+        r = test_client.post("/dataset/upload", data=_publish_form(), headers={"Prefer": "respond-async"})
+
+    assert r.status_code == 202
+    body = r.get_json()
+    assert r.headers["Location"] == body["status_url"]
+    job = db.session.get(PublishJob, body["job_id"])
+    # the test configuration runs jobs inline, so it is already finished
+    assert job.status == PublishJob.DONE, job.message
+    assert job.storage_attempts == 1
+    assert not os.path.exists(job.folder)
+    assert not os.path.exists(owner.temp_folder())
+
+    dataset = db.session.get(DataSet, job.dataset_id)
+    assert dataset.user_id == owner.id
+    assert [hubfile.name for hubfile in dataset.files()] == ["games.csv"]
+    assert dataset.ds_meta_data.dataset_doi
+
+    with force_login(test_client, owner):
+        status = test_client.get(body["status_url"])
+    assert status.status_code == 200
+    assert status.get_json()["status"] == "done"
+    assert status.get_json()["dataset_id"] == dataset.id
+
+    # other users' jobs are not visible
+    foreign = PublishJob(user_id=other.id, payload="{}", folder=str(tmp_path / "foreign"))
+    db.session.add(foreign)
+    db.session.commit()
+    with force_login(test_client, owner):
+        assert test_client.get(f"/dataset/publish/{foreign.id}").status_code == 404
+
+
+def test_async_publish_validation_failure_gives_files_back(test_client, users, monkeypatch, tmp_path):
+    from app.modules.dataset.models import PublishJob
+
+    monkeypatch.setenv("UPLOADS_DIR", str(tmp_path))
+    owner, _ = users
+    _stage_upload(owner, content=b"wrong,headers\n1,2\n")
+
+    with force_login(test_client, owner):
+        r = test_client.post("/dataset/upload", data=_publish_form(), headers={"Prefer": "respond-async"})
+
+    job = db.session.get(PublishJob, r.get_json()["job_id"])
+    assert job.status == PublishJob.FAILED
+    assert "invalid headers" in job.message
+    assert job.dataset_id is None
+    assert os.path.exists(os.path.join(owner.temp_folder(), "games.csv"))
+
+
+def test_async_publish_retries_the_storage_step(test_client, users, monkeypatch, tmp_path):
+    from app.modules.dataset.models import PublishJob
+    from app.modules.dataset.services import DataSetService
+
+    monkeypatch.setenv("UPLOADS_DIR", str(tmp_path))
+    owner, _ = users
+    _stage_upload(owner)
+
+    original = DataSetService.move_dataset_files
+    failures = {"left": 2}
+
+    def flaky_move(self, dataset, source_dir=None):
+        if failures["left"]:
+            failures["left"] -= 1
+            raise OSError("storage unavailable")
+        return original(self, dataset, source_dir=source_dir)
+
+    monkeypatch.setattr(DataSetService, "move_dataset_files", flaky_move)
+
+    with force_login(test_client, owner):
+        r = test_client.post("/dataset/upload", data=_publish_form(), headers={"Prefer": "respond-async"})
+
+    job = db.session.get(PublishJob, r.get_json()["job_id"])
+    assert job.status == PublishJob.DONE, job.message
+    assert job.storage_attempts == 3
+
+    failures["left"] = 5
+    _stage_upload(owner)
+    with force_login(test_client, owner):
+        r = test_client.post("/dataset/upload", data=_publish_form(), headers={"Prefer": "respond-async"})
+
+    job = db.session.get(PublishJob, r.get_json()["job_id"])
+    assert job.status == PublishJob.FAILED
+    assert "storage unavailable" in job.message
+    assert job.storage_attempts == 3
+
+
+def test_async_publish_fails_cleanly_when_the_queue_is_down(test_client, users, monkeypatch, tmp_path):
+    from app.modules.dataset import publishing
+    from app.modules.dataset.models import PublishJob
+
+    monkeypatch.setenv("UPLOADS_DIR", str(tmp_path))
+    monkeypatch.setitem(test_client.application.config, "PUBLISH_QUEUE", "rq")
+
+    def unreachable():
+        raise ConnectionError("redis is down")
+
+    monkeypatch.setattr(publishing, "rq_queue", unreachable)
+    owner, _ = users
+    _stage_upload(owner)
+
+    with force_login(test_client, owner):
+        r = test_client.post("/dataset/upload", data=_publish_form(), headers={"Prefer": "respond-async"})
+
+    assert r.status_code == 202
+    job = db.session.get(PublishJob, r.get_json()["job_id"])
+    assert job.status == PublishJob.FAILED
+    assert "redis is down" in job.message
+    assert os.path.exists(os.path.join(owner.temp_folder(), "games.csv"))
@@ -3,21 +3,34 @@ import io
 import json
 import os
 import shutil
+import threading
+import time
 import uuid
 from datetime import datetime, timezone
 from pathlib import Path
 from types import SimpleNamespace
 from unittest.mock import MagicMock
+from urllib.parse import parse_qs, unquote
+from zipfile import ZipFile
 
+import gevent
 import pytest
+import zstandard
+from boto3.s3.transfer import TransferConfig
 from flask import Flask
 from werkzeug.datastructures import MultiDict
 
 import app.modules.dataset.routes as routes_mod
 from app import db
 from app.modules.auth.models import User, UserRole
+from app.modules.dataset import checksums
+from app.modules.dataset.api import dataset_serializer
+from app.modules.dataset.chunked_upload import ChunkedUpload, OffsetMismatch
+from app.modules.dataset.csv_schema import TEXT, Column
 from app.modules.dataset.forms import DatasetFileForm
 from app.modules.dataset.models import DataCategory, DataSet, DSMetaData
+from app.modules.dataset.pool import ordered_map, worker_count
+from app.modules.dataset.profiling import SKETCH_SIZE, DistinctSketch, merge_profiles, profile_csv
 from app.modules.dataset.repositories import DSMetaDataRepository
 from app.modules.dataset.services import (
     AuthorService,
@@ -28,9 +41,21 @@ from app.modules.dataset.services import (
     DSViewRecordService,
     SizeService,
     calculate_checksum_and_size,
+    calculate_checksums_and_sizes,
 )
 from app.modules.dataset.steamcsv_service import SteamCSVService
 from app.modules.profile.models import UserProfile
+from core.serialisers.serializer import Serializer
+from core.storage import (
+    ArchiveCache,
+    LocalAsyncStorage,
+    LocalFileCache,
+    S3AsyncStorage,
+    StorageService,
+    get_async_storage,
+    seekable_zstd,
+    stream_zip,
+)
 
 CSV_EXAMPLES_DIR = Path(__file__).parent.parent / "csv_examples"
 CSV_FAILURE_DIR = Path(__file__).parent.parent / "csv_examples_failure"
@@ -90,6 +115,106 @@ def test_validate_folder_missing_data_rows(tmp_path):
     assert "must contain at least one data row" in str(exc.value).lower()
 
 
+def _valid_row():
+    return '570,Dota 2,2013-07-09,true,Valve,Valve,"win;mac;linux",MOBA,Multiplayer;Competitive'
+
+
+def test_validate_folder_reports_bad_row_numbers(tmp_path):
+    headers = ",".join(SteamCSVService.REQUIRED_HEADERS)
+    lines = [headers, _valid_row(), "too,short", _valid_row(), "also,short"]
+    (tmp_path / "games.csv").write_text("\n".join(lines) + "\n")
+
+    with pytest.raises(ValueError) as exc:
+        SteamCSVService().validate_folder(str(tmp_path))
+
+    assert "games.csv: rows 3, 5 do not match header column count" in str(exc.value)
+
+
+def test_validate_folder_stops_after_max_row_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(SteamCSVService, "MAX_ROW_ERRORS", 3)
+    headers = ",".join(SteamCSVService.REQUIRED_HEADERS)
+    lines = [headers, _valid_row()] + ["short"] * 50
+    (tmp_path / "games.csv").write_text("\n".join(lines) + "\n")
+
+    with pytest.raises(ValueError) as exc:
+        SteamCSVService().validate_folder(str(tmp_path))
+
+    message = str(exc.value)
+    assert "rows 3, 4, 5 do not match header column count (stopped after 3)" in message
+    assert "6" not in message.split("rows", 1)[1].split("do not")[0]
+
+
+def test_validate_folder_in_parallel_reports_errors_in_filename_order(tmp_path):
+    headers = ",".join(SteamCSVService.REQUIRED_HEADERS)
+    for index in range(6):
+        rows = [headers, _valid_row()] + (["short"] if index % 2 else [])
+        (tmp_path / f"games_{index}.csv").write_text("\n".join(rows) + "\n")
+
+    for processes in (False, True):
+        with pytest.raises(ValueError) as exc:
+            SteamCSVService(max_workers=3, processes=processes).validate_folder(str(tmp_path))
+        assert str(exc.value) == "; ".join(
+            f"games_{index}.csv: row 3 does not match header column count" for index in (1, 3, 5)
+        )
+
+
+def test_validate_folder_checks_column_types(tmp_path):
+    headers = ",".join(SteamCSVService.REQUIRED_HEADERS)
+    lines = [
+        headers,
+        _valid_row(),
+        "abc,Portal,2007-10-10,false,Valve,Valve,win,Puzzle,Singleplayer",
+        "400,Portal,2007-02-30,yes,Valve,Valve,win,Puzzle,Singleplayer",
+        "400,Portal,,FALSE,,,win;;mac,,",
+        "400,  ,2007-10-10,0,Valve,Valve,win,Puzzle,Singleplayer",
+    ]
+    (tmp_path / "games.csv").write_text("\n".join(lines) + "\n")
+
+    with pytest.raises(ValueError) as exc:
+        SteamCSVService().validate_folder(str(tmp_path))
+
+    assert str(exc.value) == "; ".join(
+        [
+            "games.csv: column appid must be an integer (row 3)",
+            "games.csv: column name must be non-blank text (row 6)",
+            "games.csv: column release_date must be an ISO date (YYYY-MM-DD) or empty (row 4)",
+            "games.csv: column is_free must be true or false (row 4)",
+            "games.csv: column platforms must be a ';'-separated list (row 5)",
+        ]
+    )
+
+
+def test_validate_folder_checks_types_across_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(SteamCSVService, "BATCH_ROWS", 4)
+    headers = ",".join(SteamCSVService.REQUIRED_HEADERS)
+    lines = [headers] + [_valid_row()] * 9 + ["1,Game,2020-01-01,maybe,Dev,Pub,win,Action,tag"]
+    (tmp_path / "games.csv").write_text("\n".join(lines) + "\n")
+
+    with pytest.raises(ValueError) as exc:
+        SteamCSVService().validate_folder(str(tmp_path))
+
+    assert str(exc.value) == "games.csv: column is_free must be true or false (row 11)"
+
+
+def test_text_column_finds_a_blank_cell_after_many_rows_quickly():
+    column = Column("name", TEXT)
+    values = ["Half-Life 2", "ab cd"] * 100 + ["   "]
+
+    started = time.perf_counter()
+    assert column.invalid_positions(values) == [200]
+    assert time.perf_counter() - started < 1
+
+
+def test_validate_folder_single_bad_row_keeps_message(tmp_path):
+    headers = ",".join(SteamCSVService.REQUIRED_HEADERS)
+    (tmp_path / "games.csv").write_text("\n".join([headers, _valid_row(), "short"]) + "\n")
+
+    with pytest.raises(ValueError) as exc:
+        SteamCSVService().validate_folder(str(tmp_path))
+
+    assert "games.csv: row 3 does not match header column count" in str(exc.value)
+
+
 def test_calculate_checksum_and_size(tmp_path):
     p = tmp_path / "sample.bin"
     data = b"hello world"
@@ -102,6 +227,105 @@ def test_calculate_checksum_and_size(tmp_path):
     assert checksum == expected
 
 
+def test_checksum_sidecar_is_reused_until_the_file_changes(tmp_path):
+    data = b"appid,name\n1,Portal\n" * 1000
+    dest = tmp_path / "games.csv"
+
+    checksum, size = checksums.save_stream(io.BytesIO(data), str(dest), chunk_size=64)
+    assert (checksum, size) == (hashlib.sha256(data).hexdigest(), len(data))
+    assert checksums.read_sidecar(str(dest)) == (checksum, size)
+    assert not list(tmp_path.glob("*.part"))
+
+    # a stale sidecar is ignored and the file is hashed again
+    dest.write_bytes(b"changed")
+    assert checksums.read_sidecar(str(dest)) is None
+    assert calculate_checksum_and_size(str(dest)) == (hashlib.sha256(b"changed").hexdigest(), 7)
+
+    checksums.discard_sidecar(str(dest))
+    assert not Path(checksums.sidecar_path(str(dest))).exists()
+
+
+def test_checksums_and_sizes_keep_input_order(tmp_path):
+    paths = []
+    for index in range(12):
+        path = tmp_path / f"file_{index}.csv"
+        path.write_bytes(b"x" * (index * 1000 + 1))
+        paths.append(str(path))
+
+    results = calculate_checksums_and_sizes(paths)
+    assert results == [calculate_checksum_and_size(path) for path in paths]
+
+    missing = str(tmp_path / "missing.csv")
+    assert checksums.checksums_and_sizes([paths[0], missing], max_workers=2, skip_errors=True)[1] is None
+    with pytest.raises(OSError):
+        checksums.checksums_and_sizes([paths[0], missing], max_workers=2)
+
+
+def test_profile_csv_collects_column_statistics(tmp_path):
+    headers = ",".join(SteamCSVService.REQUIRED_HEADERS)
+    first = tmp_path / "first.csv"
+    first.write_text(
+        "\n".join(
+            [
+                headers,
+                "570,Dota 2,2013-07-09,true,Valve,Valve,win,MOBA,Multiplayer",
+                "730,CS,,true,Valve,,win,Shooter,FPS",
+                ",,,,,,,,",
+                "too,short",
+            ]
+        )
+        + "\n"
+    )
+    second = tmp_path / "second.csv"
+    second.write_text(headers + "\n440,TF2,2007-10-10,true,Valve,Valve,win,Shooter,\n")
+
+    profile = profile_csv(str(first))
+    assert profile.row_count == 2
+    stats = profile.to_dict()
+    assert stats["appid"] == {"nulls": 0, "distinct": 2, "min": 570, "max": 730}
+    assert stats["release_date"] == {"nulls": 1, "distinct": 1, "min": "2013-07-09", "max": "2013-07-09"}
+    assert stats["publishers"] == {"nulls": 1, "distinct": 1}
+
+    merged = merge_profiles([profile, profile_csv(str(second))]).to_dict()
+    assert merged["appid"] == {"nulls": 0, "distinct": 3, "min": 440, "max": 730}
+    assert merged["release_date"]["min"] == "2007-10-10"
+    assert merged["developers"] == {"nulls": 0, "distinct": 1}
+    assert merged["genres"]["distinct"] == 2
+
+
+def test_distinct_sketch_estimates_large_counts():
+    sketch = DistinctSketch()
+    sketch.add_many(str(value) for value in range(SKETCH_SIZE - 1))
+    assert sketch.estimate() == SKETCH_SIZE - 1
+
+    halves = DistinctSketch(), DistinctSketch()
+    halves[0].add_many(str(value) for value in range(0, 30000))
+    halves[1].add_many(str(value) for value in range(20000, 50000))
+    halves[0].merge(halves[1])
+    assert abs(halves[0].estimate() - 50000) < 50000 * 0.2
+
+
+def test_ordered_map_is_bounded_and_ordered():
+    assert worker_count(3, max_workers=8) == 3
+    assert worker_count(0, max_workers=8) == 1
+    assert worker_count(50, max_workers=4) == 4
+
+    items = list(range(40))
+    assert ordered_map(abs, [-item for item in items], max_workers=4) == items
+    assert ordered_map(abs, [-item for item in items], max_workers=4, processes=True) == items
+
+
+def _worker_pid(_item):
+    return os.getpid()
+
+
+def test_ordered_map_defaults_to_processes_for_validation(test_client):
+    # CSV validation is pure Python, so by default it leaves this (GIL-bound) process
+    with test_client.application.app_context():
+        assert os.getpid() not in ordered_map(_worker_pid, range(4), max_workers=2)
+        assert set(ordered_map(_worker_pid, range(4), max_workers=2, processes=False)) == {os.getpid()}
+
+
 @pytest.mark.parametrize(
     "size,expected",
     [
@@ -149,12 +373,14 @@ def test_create_from_form_with_mocks(tmp_path):
 
     # Helpers to generate objects with ids and lists
     counter = {"v": 1}
+    created = {}
 
     def make_create(kind):
         def create(**kwargs):
             obj = SimpleNamespace(**{k: v for k, v in kwargs.items() if not k.startswith("commit")})
             obj.id = counter["v"]
             counter["v"] += 1
+            created[kind] = obj
             if kind == "dsmetadata":
                 obj.authors = []
             if kind == "datasetfilemetadata":
@@ -211,6 +437,16 @@ def test_create_from_form_with_mocks(tmp_path):
     assert hf.checksum == expected_checksum
     assert hf.size == expected_size
 
+    # the files were profiled on the way in
+    assert created["datasetfilemetadata"].metrics.row_count == 1
+    assert created["dsmetadata"].ds_metrics.number_of_files == "1"
+    assert json.loads(created["dsmetadata"].ds_metrics.column_profile)["appid"] == {
+        "nulls": 0,
+        "distinct": 1,
+        "min": 1,
+        "max": 1,
+    }
+
 
 def test_delete_dataset_success(test_client):
 
@@ -496,7 +732,9 @@ def test_download_dataset_route(test_client, tmp_path, monkeypatch):
 
     # monkeypatch dataset_service.get_or_404
     monkeypatch.setattr(
-        routes_mod, "dataset_service", SimpleNamespace(get_or_404=lambda dsid: SimpleNamespace(user_id=1, id=9))
+        routes_mod,
+        "dataset_service",
+        SimpleNamespace(get_or_404=lambda dsid: SimpleNamespace(user_id=1, id=9, draft_mode=True, files=lambda: [])),
     )
 
     # monkeypatch DSDownloadRecord and DSDownloadRecordService to avoid DB
@@ -514,6 +752,565 @@ def test_download_dataset_route(test_client, tmp_path, monkeypatch):
     assert r.headers.get("Content-Type") in ("application/zip", "application/octet-stream")
 
 
+def test_stream_zip_builds_valid_archive_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    storage = StorageService()
+    base = tmp_path / "uploads" / "user_1" / "dataset_3"
+    base.mkdir(parents=True)
+    payload = os.urandom(300_000)
+    (base / "big.csv").write_bytes(payload)
+    (base / "small.csv").write_text("appid,name\n1,Game\n")
+
+    entries = [
+        ("dataset_3/big.csv", "user_1/dataset_3/big.csv"),
+        ("dataset_3/small.csv", "user_1/dataset_3/small.csv"),
+    ]
+    chunks = list(stream_zip(entries, storage=storage, chunk_size=64 * 1024))
+
+    # The archive is emitted progressively, not as a single blob at the end
+    assert len(chunks) > 2
+    assert all(len(chunk) <= 64 * 1024 + 1024 for chunk in chunks)
+
+    with ZipFile(io.BytesIO(b"".join(chunks))) as zipf:
+        assert zipf.testzip() is None
+        assert zipf.read("dataset_3/big.csv") == payload
+        assert zipf.read("dataset_3/small.csv") == b"appid,name\n1,Game\n"
+
+
+def test_download_dataset_streams_zip_without_temp_files(test_client, tmp_path, monkeypatch):
+    uploads = tmp_path / "uploads" / "user_1" / "dataset_9"
+    uploads.mkdir(parents=True)
+    (uploads / "a.csv").write_text("appid\n1\n")
+
+    monkeypatch.setattr(
+        routes_mod,
+        "dataset_service",
+        SimpleNamespace(get_or_404=lambda dsid: SimpleNamespace(user_id=1, id=9, draft_mode=True, files=lambda: [])),
+    )
+    monkeypatch.setattr(routes_mod, "DSDownloadRecordService", lambda: SimpleNamespace(create=lambda **kw: None))
+    monkeypatch.setattr(
+        "tempfile.mkdtemp", lambda *a, **kw: (_ for _ in ()).throw(AssertionError("no temp dir expected"))
+    )
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+
+    r = test_client.get("/dataset/download/9")
+    assert r.status_code == 200
+    assert r.is_streamed
+    assert 'filename="dataset_9.zip"' in r.headers["Content-Disposition"]
+
+    with ZipFile(io.BytesIO(r.data)) as zipf:
+        assert zipf.namelist() == ["dataset_9/a.csv"]
+        assert zipf.read("dataset_9/a.csv") == b"appid\n1\n"
+
+
+def test_archive_cache_key_and_lru_eviction(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    cache = ArchiveCache(storage=StorageService(), max_bytes=10)
+
+    key_a = ArchiveCache.key_for("dataset_1", [("a.csv", "c1"), ("b.csv", "c2")])
+    assert key_a == ArchiveCache.key_for("dataset_1", [("b.csv", "c2"), ("a.csv", "c1")])
+    assert key_a != ArchiveCache.key_for("dataset_1", [("a.csv", "c1"), ("b.csv", "c3")])
+
+    key_b = ArchiveCache.key_for("dataset_2", [("a.csv", "c1")])
+    key_c = ArchiveCache.key_for("dataset_3", [("a.csv", "c1")])
+
+    assert b"".join(cache.store_while_streaming(key_a, [b"1234", b"5"])) == b"12345"
+    assert b"".join(cache.store_while_streaming(key_b, [b"12345"])) == b"12345"
+    assert cache.lookup(key_a) == f"archives/{key_a}.zip"  # a becomes most recently used
+
+    list(cache.store_while_streaming(key_c, [b"12345"]))
+    assert cache.lookup(key_b) is None
+    assert cache.lookup(key_a) is not None
+    assert cache.lookup(key_c) is not None
+    assert cache.total_bytes() == 10
+
+    cache.invalidate(key_a)
+    assert cache.lookup(key_a) is None
+    assert not (tmp_path / "uploads" / "archives" / f"{key_a}.zip").exists()
+
+
+def test_archive_cache_discards_aborted_stream(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    cache = ArchiveCache(storage=StorageService(), max_bytes=1024)
+    key = ArchiveCache.key_for("dataset_1", [("a.csv", "c1")])
+
+    stream = cache.store_while_streaming(key, [b"part1", b"part2"])
+    assert next(stream) == b"part1"
+    stream.close()
+
+    assert cache.lookup(key) is None
+    assert os.listdir(tmp_path / "uploads" / "archives") == []
+
+
+class _FakeS3Client:
+    """Keeps objects in a dict; lists them ``page_size`` keys per page like list_objects_v2."""
+
+    def __init__(self, page_size=1000, barrier=None):
+        self.objects = {}
+        self.page_size = page_size
+        self.barrier = barrier
+        self.configs = []
+        self.delete_calls = 0
+        self.fail_keys = set()
+        self.extra_args = {}
+        self.ranges = []
+        self._lock = threading.Lock()
+
+    def upload_file(self, src_path, bucket, key, ExtraArgs=None, Config=None):
+        if self.barrier is not None:
+            self.barrier.wait()
+        if key in self.fail_keys:
+            raise OSError(f"upload of {key} failed")
+        with open(src_path, "rb") as handler, self._lock:
+            self.objects[key] = handler.read()
+            self.extra_args[key] = ExtraArgs or {}
+            self.configs.append(Config)
+
+    def head_object(self, Bucket, Key):
+        extra = self.extra_args.get(Key, {})
+        return {"ContentLength": len(self.objects[Key]), **extra}
+
+    def get_object(self, Bucket, Key, Range=None):
+        data = self.objects[Key]
+        if Range:
+            self.ranges.append(Range)
+            first, last = Range[len("bytes=") :].split("-")
+            data = data[int(first) : int(last) + 1]
+        return {"Body": io.BytesIO(data), **self.extra_args.get(Key, {})}
+
+    def download_file(self, bucket, key, dest_path, Config=None):
+        if self.barrier is not None:
+            self.barrier.wait()
+        with open(dest_path, "wb") as handler:
+            handler.write(self.objects[key])
+        with self._lock:
+            self.configs.append(Config)
+
+    def get_paginator(self, name):
+        assert name == "list_objects_v2"
+        return self
+
+    def paginate(self, Bucket, Prefix):
+        keys = sorted(key for key in self.objects if key.startswith(Prefix))
+        for start in range(0, len(keys), self.page_size):
+            yield {"Contents": [{"Key": key} for key in keys[start : start + self.page_size]]}
+
+    def delete_objects(self, Bucket, Delete):
+        self.delete_calls += 1
+        for entry in Delete["Objects"]:
+            self.objects.pop(entry["Key"], None)
+        return {}
+
+
+def _s3_storage(monkeypatch, client, max_workers=4):
+    storage = StorageService()
+    monkeypatch.setattr(storage, "_use_s3", True)
+    monkeypatch.setattr(storage, "_s3_client", client)
+    monkeypatch.setattr(storage, "_bucket", "bucket")
+    monkeypatch.setattr(storage, "_max_workers", max_workers)
+    monkeypatch.setattr(storage, "_transfer_config", TransferConfig(multipart_chunksize=5 * 1024**2))
+    return storage
+
+
+def test_storage_save_many_and_fetch_many_transfer_concurrently_on_s3(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    # every transfer waits for the other two: run one after another, they would time out
+    client = _FakeS3Client(barrier=threading.Barrier(3, timeout=5))
+    storage = _s3_storage(monkeypatch, client)
+    sources = []
+    for name in ("a.csv", "b.csv", "c.csv"):
+        path = tmp_path / name
+        path.write_text(f"appid\n{name}\n")
+        sources.append((str(path), f"user_1/dataset_1/{name}"))
+
+    assert storage.save_many(sources) == [dest for _, dest in sources]
+    assert sorted(client.objects) == [storage._s3_key(dest) for _, dest in sources]
+    assert not any(os.path.exists(src) for src, _ in sources)
+
+    fetched = storage.fetch_many([dest for _, dest in sources], dest_dir=str(tmp_path / "edit"))
+    assert fetched == [str(tmp_path / "edit" / name) for name in ("a.csv", "b.csv", "c.csv")]
+    assert Path(fetched[1]).read_text() == "appid\nb.csv\n"
+    # one shared transfer configuration for every upload and download
+    assert len(client.configs) == 6 and all(config is storage._transfer_config for config in client.configs)
+
+
+def test_storage_save_many_attempts_every_file_before_raising(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    client = _FakeS3Client()
+    storage = _s3_storage(monkeypatch, client)
+    (tmp_path / "a.csv").write_text("a")
+    (tmp_path / "b.csv").write_text("b")
+    client.fail_keys.add(storage._s3_key("d/a.csv"))
+
+    with pytest.raises(OSError, match="upload of .*a.csv failed"):
+        storage.save_many([(str(tmp_path / "a.csv"), "d/a.csv"), (str(tmp_path / "b.csv"), "d/b.csv")])
+
+    assert list(client.objects) == [storage._s3_key("d/b.csv")]
+    assert (tmp_path / "a.csv").exists()
+
+
+def test_storage_delete_prefix_batches_s3_deletes_per_page(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    client = _FakeS3Client(page_size=2)
+    storage = _s3_storage(monkeypatch, client)
+    for name in ("a", "b", "c", "d", "e"):
+        client.objects[storage._s3_key(f"user_1/dataset_1/{name}.csv")] = b"x"
+    client.objects[storage._s3_key("user_1/dataset_10/a.csv")] = b"x"
+
+    assert storage.delete_prefix("user_1/dataset_1") == 5
+    assert client.delete_calls == 3
+    assert list(client.objects) == [storage._s3_key("user_1/dataset_10/a.csv")]
+    assert storage.list_files("user_1/dataset_1") == []
+
+
+def test_storage_batch_operations_on_local_disk(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    storage = StorageService()
+    (tmp_path / "a.csv").write_text("a")
+    (tmp_path / "b.csv").write_text("b")
+
+    storage.save_many(
+        [(str(tmp_path / "a.csv"), "user_1/dataset_2/a.csv"), (str(tmp_path / "b.csv"), "user_1/dataset_2/b.csv")]
+    )
+    assert sorted(storage.list_files("user_1/dataset_2")) == ["user_1/dataset_2/a.csv", "user_1/dataset_2/b.csv"]
+    assert storage.fetch_many(["user_1/dataset_2/a.csv"]) == [storage.get_local_path("user_1/dataset_2/a.csv")]
+
+    copies = storage.fetch_many(["user_1/dataset_2/b.csv"], dest_dir=str(tmp_path / "temp"))
+    assert Path(copies[0]).read_text() == "b"
+
+    assert storage.delete_prefix("user_1/dataset_2") == 2
+    assert storage.delete_prefix("user_1/dataset_2") == 0
+    with pytest.raises(ValueError):
+        storage.delete_prefix("/")
+
+
+def _file_cache(monkeypatch, tmp_path, max_bytes=1024):
+    client = _FakeS3Client()
+    storage = _s3_storage(monkeypatch, client)
+    return client, storage, LocalFileCache(storage=storage, max_bytes=max_bytes, directory=str(tmp_path / "cache"))
+
+
+def test_file_cache_reads_through_and_serves_hits_from_disk(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    client, storage, cache = _file_cache(monkeypatch, tmp_path)
+    client.objects[storage._s3_key("user_1/dataset_1/a.csv")] = b"appid\n1\n"
+    checksum = hashlib.sha256(b"appid\n1\n").hexdigest()
+
+    first = cache.path_for("user_1/dataset_1/a.csv", checksum)
+    second = cache.path_for("user_1/dataset_1/a.csv", checksum)
+
+    assert first == second and first.endswith(".csv")
+    assert Path(first).read_bytes() == b"appid\n1\n"
+    assert len(client.configs) == 1  # downloaded once
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_ratio"]) == (1, 1, 0.5)
+    assert (stats["entries"], stats["bytes"], stats["max_bytes"]) == (1, 8, 1024)
+
+
+def test_file_cache_refetches_when_the_checksum_changes(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    client, storage, cache = _file_cache(monkeypatch, tmp_path)
+    key = storage._s3_key("user_1/dataset_1/a.csv")
+    client.objects[key] = b"old"
+    path = cache.path_for("user_1/dataset_1/a.csv", hashlib.sha256(b"old").hexdigest())
+    Path(path + ".rowidx").write_bytes(b"stale index")
+
+    client.objects[key] = b"new"
+    assert cache.path_for("user_1/dataset_1/a.csv", hashlib.sha256(b"new").hexdigest()) == path
+    assert Path(path).read_bytes() == b"new"
+    assert not Path(path + ".rowidx").exists()
+
+    # content that does not match the recorded checksum is never served
+    client.objects[key] = b"corrupted"
+    with pytest.raises(ValueError, match="does not match"):
+        cache.path_for("user_1/dataset_1/a.csv", hashlib.sha256(b"newer").hexdigest())
+    assert cache.stats()["misses"] == 3
+    assert sorted(os.listdir(tmp_path / "cache")) == [os.path.basename(path)]
+
+
+def test_file_cache_evicts_least_recently_used_and_reloads_from_disk(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    client, storage, cache = _file_cache(monkeypatch, tmp_path, max_bytes=10)
+    checksums_by_name = {}
+    for name in ("a", "b", "c"):
+        client.objects[storage._s3_key(f"d/{name}.csv")] = b"12345"
+        checksums_by_name[name] = hashlib.sha256(b"12345").hexdigest()
+
+    path_a = cache.path_for("d/a.csv", checksums_by_name["a"])
+    cache.path_for("d/b.csv", checksums_by_name["b"])
+    cache.path_for("d/a.csv", checksums_by_name["a"])  # a becomes most recently used
+    path_c = cache.path_for("d/c.csv", checksums_by_name["c"])
+
+    assert cache.stats()["evictions"] == 1
+    assert sorted(os.listdir(tmp_path / "cache")) == sorted([os.path.basename(path_a), os.path.basename(path_c)])
+
+    # a new process finds the entries on disk and verifies them by hashing instead of downloading
+    downloads = len(client.configs)
+    restarted = LocalFileCache(storage=storage, max_bytes=10, directory=str(tmp_path / "cache"))
+    assert restarted.path_for("d/c.csv", checksums_by_name["c"]) == path_c
+    assert len(client.configs) == downloads
+    assert restarted.stats()["hits"] == 1
+
+
+def test_file_cache_uses_uploads_folder_with_local_storage(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    storage = StorageService()
+    cache = LocalFileCache(storage=storage, directory=str(tmp_path / "cache"))
+
+    assert cache.path_for("user_1/dataset_1/a.csv", "abc") == storage.get_local_path("user_1/dataset_1/a.csv")
+    assert cache.stats()["misses"] == 0
+    assert not (tmp_path / "cache").exists()
+
+
+def _steam_csv(rows):
+    lines = ["appid,name,price"] + [f"{index},Game number {index},{index % 50}.99" for index in range(rows)]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def test_storage_compression_stores_seekable_zstd_and_reads_back_the_original(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    monkeypatch.setenv("STORAGE_COMPRESSION", "zstd")
+    monkeypatch.setenv("STORAGE_ZSTD_FRAME_SIZE", "4096")
+    storage = StorageService()
+    content = _steam_csv(2000)
+    src = tmp_path / "games.csv"
+    src.write_bytes(content)
+    icon = tmp_path / "icon.png"
+    icon.write_bytes(b"not a csv")
+
+    storage.save_local_file(str(src), "user_1/dataset_1/games.csv")
+    storage.save_local_file(str(icon), "communities/community_1/icon.png")
+
+    stored = Path(storage.get_local_path("user_1/dataset_1/games.csv")).read_bytes()
+    assert stored[:4] == seekable_zstd.FRAME_MAGIC and len(stored) * 5 < len(content)
+    assert zstandard.ZstdDecompressor().stream_reader(io.BytesIO(stored), read_across_frames=True).read() == content
+    assert not src.exists()
+    assert not storage.is_compressed("communities/community_1/icon.png")
+
+    info = storage.stored_info("user_1/dataset_1/games.csv")
+    assert (info.size, info.stored_size, info.compressed) == (len(content), len(stored), True)
+    assert storage.get_size("user_1/dataset_1/games.csv") == len(content)
+    assert storage.read_text("user_1/dataset_1/games.csv").encode("utf-8") == content
+    with storage.open_binary("user_1/dataset_1/games.csv") as handler:
+        assert handler.read() == content
+    assert b"".join(storage.iter_range("user_1/dataset_1/games.csv", 10000, 30001)) == content[10000:30001]
+    with storage.as_local_path("user_1/dataset_1/games.csv") as local_path:
+        assert Path(local_path).read_bytes() == content
+    assert not os.path.exists(local_path)
+    # files already there keep working once compression is switched off
+    monkeypatch.delenv("STORAGE_COMPRESSION")
+    assert StorageService().read_text("user_1/dataset_1/games.csv").encode("utf-8") == content
+
+
+def test_storage_compression_on_s3_reads_only_the_frames_of_a_range(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    monkeypatch.setenv("STORAGE_COMPRESSION", "zstd")
+    monkeypatch.setenv("STORAGE_ZSTD_FRAME_SIZE", "4096")
+    client = _FakeS3Client()
+    storage = _s3_storage(monkeypatch, client)
+    content = _steam_csv(2000)
+    src = tmp_path / "games.csv"
+    src.write_bytes(content)
+
+    storage.save_local_file(str(src), "user_1/dataset_1/games.csv")
+    key = storage._s3_key("user_1/dataset_1/games.csv")
+    assert client.extra_args[key]["ContentEncoding"] == "zstd"
+    assert client.extra_args[key]["Metadata"] == {"original-size": str(len(content))}
+
+    assert storage.get_size("user_1/dataset_1/games.csv") == len(content)
+    with storage.open_binary("user_1/dataset_1/games.csv") as handler:
+        assert handler.read() == content
+    assert b"".join(storage.iter_range("user_1/dataset_1/games.csv", 10000, 12000)) == content[10000:12000]
+    # the seek table from the tail, then one span holding the frame of bytes 10000-11999
+    assert len(client.ranges) == 2
+    first, last = client.ranges[1][len("bytes=") :].split("-")
+    assert int(last) - int(first) < 4096
+
+    checksum = hashlib.sha256(content).hexdigest()
+    cache = LocalFileCache(storage=storage, directory=str(tmp_path / "cache"))
+    assert Path(cache.path_for("user_1/dataset_1/games.csv", checksum)).read_bytes() == content
+
+
+def test_file_cache_holds_decompressed_copies_of_compressed_local_files(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    monkeypatch.setenv("STORAGE_COMPRESSION", "zstd")
+    storage = StorageService()
+    content = _steam_csv(50)
+    src = tmp_path / "games.csv"
+    src.write_bytes(content)
+    storage.save_local_file(str(src), "user_1/dataset_1/games.csv")
+    cache = LocalFileCache(storage=storage, directory=str(tmp_path / "cache"))
+
+    path = cache.path_for("user_1/dataset_1/games.csv", hashlib.sha256(content).hexdigest())
+
+    assert path != storage.get_local_path("user_1/dataset_1/games.csv")
+    assert Path(path).read_bytes() == content
+
+
+def test_local_async_storage_saves_lists_and_streams_from_greenlets(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    monkeypatch.setenv("STORAGE_COMPRESSION", "zstd")
+    monkeypatch.setenv("STORAGE_ZSTD_FRAME_SIZE", "4096")
+    storage = StorageService()
+    backend = get_async_storage(storage)
+    assert isinstance(backend, LocalAsyncStorage)
+    assert get_async_storage(storage) is backend
+    content = _steam_csv(1000)
+    for name in ("a", "b"):
+        (tmp_path / f"{name}.csv").write_bytes(content)
+
+    saves = [gevent.spawn(backend.save, str(tmp_path / f"{name}.csv"), f"user_1/dataset_1/{name}.csv") for name in "ab"]
+    gevent.joinall(saves, raise_error=True)
+
+    assert sorted(backend.list("user_1/dataset_1")) == ["user_1/dataset_1/a.csv", "user_1/dataset_1/b.csv"]
+    info = backend.stat("user_1/dataset_1/a.csv")
+    assert info.compressed and info.size == len(content)
+    with backend.open("user_1/dataset_1/a.csv") as handler:
+        assert handler.read() == content
+    with backend.open("user_1/dataset_1/a.csv", decompress=False) as handler:
+        assert handler.read(4) == seekable_zstd.FRAME_MAGIC
+    reads = [gevent.spawn(lambda: b"".join(backend.read_range("user_1/dataset_1/b.csv", 5000, 9000))) for _ in range(3)]
+    gevent.joinall(reads, raise_error=True)
+    assert [greenlet.value for greenlet in reads] == [content[5000:9000]] * 3
+
+
+class _FakeHttpResponse:
+    def __init__(self, status_code, headers=None, body=b""):
+        self.status_code = status_code
+        self.headers = {name.lower(): value for name, value in (headers or {}).items()}
+        self._body = io.BytesIO(body)
+        self.released = False
+
+    def get(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+    def read(self, size=None):
+        return self._body.read(size)
+
+    def release(self):
+        self.released = True
+
+
+class _FakeS3Http:
+    """Answers geventhttpclient requests the way S3 would, for the keys in ``objects``."""
+
+    def __init__(self, page_size=1000):
+        self.objects = {}
+        self.page_size = page_size
+        self.requests = []
+
+    def request(self, method, request_uri, body=b"", headers=None):
+        assert headers["Authorization"].startswith("AWS4-HMAC-SHA256 Credential=key/")
+        assert headers["X-Amz-Content-SHA256"] == "UNSIGNED-PAYLOAD"
+        self.requests.append((method, request_uri, headers))
+        path, _, query = request_uri.partition("?")
+        key = unquote(path[1:])
+        if method == "PUT":
+            stored = {
+                name: value for name, value in headers.items() if name.lower().startswith(("x-amz-meta", "content-e"))
+            }
+            self.objects[key] = (body.read(), stored)
+            return _FakeHttpResponse(200)
+        if not key:
+            return self._list(parse_qs(query))
+        if key not in self.objects:
+            return _FakeHttpResponse(404)
+        data, stored = self.objects[key]
+        if method == "HEAD":
+            return _FakeHttpResponse(200, {"Content-Length": str(len(data)), **stored})
+        if "Range" in headers:
+            first, last = headers["Range"][len("bytes=") :].split("-")
+            return _FakeHttpResponse(206, stored, data[int(first) : int(last) + 1])
+        return _FakeHttpResponse(200, stored, data)
+
+    def _list(self, params):
+        keys = sorted(key for key in self.objects if key.startswith(params["prefix"][0]))
+        start = int(params.get("continuation-token", ["0"])[0])
+        page = keys[start : start + self.page_size]
+        truncated = start + self.page_size < len(keys)
+        body = '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+        body += f"<IsTruncated>{str(truncated).lower()}</IsTruncated>"
+        body += "".join(f"<Contents><Key>{key}</Key></Contents>" for key in page)
+        if truncated:
+            body += f"<NextContinuationToken>{start + self.page_size}</NextContinuationToken>"
+        return _FakeHttpResponse(200, body=(body + "</ListBucketResult>").encode("utf-8"))
+
+
+def test_s3_async_storage_signs_requests_and_reads_compressed_ranges(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    monkeypatch.setenv("STORAGE_COMPRESSION", "zstd")
+    monkeypatch.setenv("STORAGE_ZSTD_FRAME_SIZE", "4096")
+    storage = _s3_storage(monkeypatch, _FakeS3Client())
+    for name, value in (("_region", "eu-west-1"), ("_aws_key", "key"), ("_aws_secret", "secret")):
+        monkeypatch.setattr(storage, name, value)
+    http = _FakeS3Http(page_size=2)
+    backend = S3AsyncStorage(storage, http_client=http)
+    content = _steam_csv(2000)
+    for name in ("a b", "c", "d"):
+        (tmp_path / f"{name}.csv").write_bytes(content)
+        backend.save(str(tmp_path / f"{name}.csv"), f"user_1/dataset_1/{name}.csv")
+    (tmp_path / "e.csv").write_bytes(content)
+    backend.save(str(tmp_path / "e.csv"), "user_1/dataset_10/e.csv")
+
+    key = storage._s3_key("user_1/dataset_1/a b.csv")
+    assert http.requests[0][1] == "/" + key.replace(" ", "%20")
+    data, stored = http.objects[key]
+    assert data[:4] == seekable_zstd.FRAME_MAGIC and stored["Content-Encoding"] == "zstd"
+    assert not (tmp_path / "c.csv").exists()
+
+    # three keys over two pages, and dataset_10 is not part of dataset_1
+    assert backend.list("user_1/dataset_1") == [f"user_1/dataset_1/{name}.csv" for name in ("a b", "c", "d")]
+    assert backend.stat("user_1/dataset_1/c.csv") == (len(content), len(data), True)
+    assert backend.stat("user_1/dataset_1/missing.csv") is None
+    with backend.open("user_1/dataset_1/c.csv") as handler:
+        assert handler.read() == content
+
+    http.requests.clear()
+    info = backend.stat("user_1/dataset_1/d.csv")
+    assert b"".join(backend.read_range("user_1/dataset_1/d.csv", 20000, 21000, info=info)) == content[20000:21000]
+    ranges = [headers["Range"] for method, _, headers in http.requests if "Range" in headers]
+    assert len(ranges) == 2  # the seek table, then the frame holding the range
+    first, last = ranges[1][len("bytes=") :].split("-")
+    assert int(last) - int(first) < 4096
+
+
+def test_download_published_dataset_is_served_from_archive_cache(test_client, tmp_path, monkeypatch):
+    uploads = tmp_path / "uploads" / "user_1" / "dataset_9"
+    uploads.mkdir(parents=True)
+    (uploads / "a.csv").write_text("appid\n1\n")
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+
+    cache = ArchiveCache(storage=StorageService(), max_bytes=1024 * 1024)
+    monkeypatch.setattr(routes_mod, "archive_cache", cache)
+    dataset = SimpleNamespace(
+        user_id=1,
+        id=9,
+        draft_mode=False,
+        files=lambda: [SimpleNamespace(name="a.csv", checksum="abc", storage_key=None)],
+    )
+    monkeypatch.setattr(
+        routes_mod,
+        "dataset_service",
+        SimpleNamespace(
+            get_or_404=lambda dsid: dataset, archive_cache_key=lambda ds: DataSetService().archive_cache_key(ds)
+        ),
+    )
+    monkeypatch.setattr(routes_mod, "DSDownloadRecordService", lambda: SimpleNamespace(create=lambda **kw: None))
+
+    first = test_client.get("/dataset/download/9")
+    assert first.status_code == 200
+    assert first.is_streamed
+    first_body = first.data
+
+    listed = []
+    monkeypatch.setattr(routes_mod, "_dataset_zip_entries", lambda ds: listed.append(ds) or [])
+    second = test_client.get("/dataset/download/9")
+    assert second.status_code == 200
+    assert second.data == first_body
+    assert "dataset_9.zip" in second.headers["Content-Disposition"]
+    assert listed == []  # the archive was not rebuilt
+
+
 def test_dataset_stats_route(monkeypatch, test_client):
     fake_files = [
         SimpleNamespace(name="a.uvl", download_count=2),
@@ -1751,6 +2548,23 @@ def test_delete_draft_dataset_success(test_client):
     assert db.session.get(DataSet, ds.id) is None
 
 
+def test_delete_draft_dataset_removes_stored_files(test_client, tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    md = DSMetaData(title="draft", description="d", data_category=DataCategory.NONE)
+    db.session.add(md)
+    db.session.commit()
+    ds = DataSet(user_id=1, ds_meta_data_id=md.id, draft_mode=True)
+    db.session.add(ds)
+    db.session.commit()
+    stored = tmp_path / "uploads" / "user_1" / f"dataset_{ds.id}"
+    stored.mkdir(parents=True)
+    (stored / "a.csv").write_text("appid\n1\n")
+
+    DataSetService().delete_draft_dataset(ds)
+
+    assert not stored.exists()
+
+
 def test_delete_draft_dataset_non_draft_raises(test_client):
     """delete_draft_dataset should raise ValueError when dataset is not a draft."""
     md = DSMetaData(title="notdraft", description="d", data_category=DataCategory.NONE)
@@ -1768,3 +2582,79 @@ def test_delete_draft_dataset_non_draft_raises(test_client):
 
     with pytest.raises(ValueError):
         svc.delete_draft_dataset(ds)
+
+
+def test_api_serializer_compiles_fields_and_encodes_json(test_client):
+    from app.modules.datasetfile.models import DatasetFile
+    from app.modules.hubfile.models import Hubfile
+
+    metadata = DSMetaData(title="Bench", description="d", data_category=DataCategory.GENERAL, dataset_doi="10.1/x")
+    dataset = DataSet(id=7, user_id=1, ds_meta_data=metadata, created_at=datetime(2024, 1, 2, 3, 4, 5))
+    dataset.dataset_files.append(DatasetFile(files=[Hubfile(id=3, name="a.csv", size=2048)]))
+
+    expected = {
+        "dataset_id": 7,
+        "created": "2024-01-02T03:04:05",
+        "name": "Bench",
+        "doi": dataset.get_steamgameshub_doi(),
+        "rows": None,
+        "files": [{"file_id": 3, "file_name": "a.csv", "size": "2.0 KB"}],
+    }
+    assert dataset_serializer.serialize(dataset) == expected
+    assert dataset_serializer.serialize(dataset, fields=["name", "dataset_id"]) == {"dataset_id": 7, "name": "Bench"}
+    assert json.loads(dataset_serializer.encode(dataset)) == expected
+    assert json.loads(dataset_serializer.encode({"page": 1, "items": [dataset]}, fields=["name"])) == {
+        "page": 1,
+        "items": [{"name": "Bench"}],
+    }
+
+    # missing attributes serialize as None, like before
+    assert Serializer({"ghost": "not_there"}).serialize(dataset) == {"ghost": None}
+
+
+def test_serializer_shares_and_bounds_compiled_projections(monkeypatch):
+    from core.serialisers import serializer as serializer_module
+
+    class Row:
+        a, b, c = 1, 2, 3
+
+    serializer = Serializer({"a": "a", "b": "b", "c": "c"})
+    assert serializer.serialize(Row(), fields=["c", "a"]) == {"a": 1, "c": 3}
+    assert serializer.serialize(Row(), fields=["a", "c", "a", "c"]) == {"a": 1, "c": 3}
+    assert len(serializer._compiled) == 1
+
+    monkeypatch.setattr(serializer_module, "MAX_COMPILED_PROJECTIONS", 2)
+    for fields in (["a"], ["b"], ["c"], ["a", "b"]):
+        serializer.serialize(Row(), fields=fields)
+    assert [key[1] for key in serializer._compiled] == [("c",), ("a", "b")]
+
+
+def test_concurrent_chunks_at_the_same_offset_write_once(tmp_path):
+    upload = ChunkedUpload.start(str(tmp_path), "games.csv", size=8)
+    reading = threading.Event()
+    release = threading.Event()
+
+    class SlowStream:
+        def __init__(self, data):
+            self.data = io.BytesIO(data)
+
+        def read(self, size=-1):
+            reading.set()
+            release.wait(5)
+            return self.data.read(size)
+
+    results = {}
+    winner = threading.Thread(target=lambda: results.update(first=upload.append(SlowStream(b"abcd"), 0)))
+    winner.start()
+    assert reading.wait(5)
+
+    with pytest.raises(OffsetMismatch):
+        upload.append(io.BytesIO(b"wxyz"), 0)
+
+    release.set()
+    winner.join(5)
+    assert results["first"] == 4
+    with pytest.raises(OffsetMismatch) as excinfo:
+        upload.append(io.BytesIO(b"wxyz"), 0)
+    assert excinfo.value.offset == 4
+    assert Path(upload.part_path).read_bytes() == b"abcd"
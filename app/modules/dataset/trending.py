@@ -0,0 +1,90 @@
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app
+
+DEFAULT_REFRESH_SECONDS = 60
+
+
+class _Board:
+    def __init__(self, since_day: date, scores: Dict[int, int]) -> None:
+        self.since_day = since_day
+        self.scores = scores
+        self.built_at = time.monotonic()
+        self.ranking: List[Tuple[int, int]] = []
+        self.dirty = True
+
+    def ranked(self) -> List[Tuple[int, int]]:
+        if self.dirty:
+            self.ranking = sorted(
+                ((dataset_id, score) for dataset_id, score in self.scores.items() if score > 0),
+                key=lambda item: (-item[1], item[0]),
+            )
+            self.dirty = False
+        return self.ranking
+
+
+class TrendingLeaderboard:
+    """Per-process ranking of datasets by views/downloads over a rolling window of days.
+
+    Each ``(metric, period_days)`` board holds the summed daily buckets of
+    every dataset active in the window and a sorted view of them. Counter bumps
+    made by this process are applied to the scores as they happen; the board is
+    rebuilt from ``activity_daily_counter`` when the day rolls over or after
+    ``TRENDING_REFRESH_SECONDS`` so other workers' activity is picked up.
+    """
+
+    def __init__(self) -> None:
+        self._boards: Dict[Tuple[str, int], _Board] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _refresh_seconds() -> float:
+        try:
+            return float(current_app.config.get("TRENDING_REFRESH_SECONDS", DEFAULT_REFRESH_SECONDS))
+        except RuntimeError:
+            return DEFAULT_REFRESH_SECONDS
+
+    @staticmethod
+    def since_day(period_days: int) -> date:
+        """First daily bucket of a ``period_days`` window: today plus the ``period_days - 1`` days before it."""
+        return datetime.utcnow().date() - timedelta(days=period_days - 1)
+
+    def _is_stale(self, board: Optional[_Board], since_day: date) -> bool:
+        if board is None or board.since_day != since_day:
+            return True
+        return time.monotonic() - board.built_at >= self._refresh_seconds()
+
+    def top(self, metric: str, period_days: int, limit: int, session=None) -> List[Tuple[int, int]]:
+        """Return up to ``limit`` ``(dataset_id, score)`` pairs, best first."""
+        key = (metric, period_days)
+        since_day = self.since_day(period_days)
+        with self._lock:
+            board = self._boards.get(key)
+        if self._is_stale(board, since_day):
+            from app.modules.dataset.repositories import ActivityCounterRepository
+
+            scores = dict(ActivityCounterRepository().window_totals("dataset", metric, since_day, session=session))
+            board = _Board(since_day, scores)
+            with self._lock:
+                self._boards[key] = board
+        with self._lock:
+            return board.ranked()[:limit]
+
+    def bump(self, metric: str, dataset_id: int, day: date, amount: int = 1) -> None:
+        """Apply a counter change to every live board that covers ``day``."""
+        with self._lock:
+            for (board_metric, _), board in self._boards.items():
+                if board_metric != metric or day < board.since_day:
+                    continue
+                board.scores[dataset_id] = board.scores.get(dataset_id, 0) + amount
+                board.dirty = True
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._boards.clear()
+
+
+trending_leaderboard = TrendingLeaderboard()
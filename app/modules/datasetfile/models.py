@@ -1,3 +1,5 @@
+import json
+
 from sqlalchemy import Enum as SQLAlchemyEnum
 
 from app import db
@@ -48,6 +50,12 @@ class DatasetFileMetrics(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     solver = db.Column(db.Text)
     not_solver = db.Column(db.Text)
+    # filled at publish time by dataset.profiling
+    row_count = db.Column(db.Integer)
+    column_profile = db.Column(db.Text)
+
+    def get_column_profile(self) -> dict:
+        return json.loads(self.column_profile) if self.column_profile else {}
 
     def __repr__(self):
         return f"DatasetFileMetrics<solver={self.solver}, not_solver={self.not_solver}>"
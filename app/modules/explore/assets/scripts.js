@@ -160,8 +160,16 @@ function send_query() {
     function triggerSearch() {
         document.getElementById('results').innerHTML = '';
         document.getElementById("results_not_found").style.display = "none";
+        setLoadMore(null);
 
+        fetchPage(null);
+    }
+
+    function fetchPage(cursor) {
         const searchCriteria = collectSearchCriteria();
+        searchCriteria.limit = PAGE_SIZE;
+        if (cursor) searchCriteria.cursor = cursor;
+        else searchCriteria.facets = true;
 
         fetch('/explore', {
             method: 'POST',
@@ -171,82 +179,30 @@ function send_query() {
         .then(response => response.json())
         .then(data => {
             console.log(data);
-            document.getElementById('results').innerHTML = '';
-
-            // results counter
-            const resultCount = Array.isArray(data) ? data.length : (data?.length ?? 0);
-            const resultText = resultCount === 1 ? 'dataset' : 'datasets';
-            document.getElementById('results_number').textContent = `${resultCount} ${resultText} found`;
-
-            if (resultCount === 0) {
-                document.getElementById("results_not_found").style.display = "block";
-                return;
-            } else {
-                document.getElementById("results_not_found").style.display = "none";
+            const items = Array.isArray(data?.items) ? data.items : [];
+
+            if (!cursor) {
+                document.getElementById('results').innerHTML = '';
+
+                // results counter (the total is only sent with the first page)
+                renderFacets(data?.facets);
+                const resultCount = data?.total ?? items.length;
+                const resultText = resultCount === 1 ? 'dataset' : 'datasets';
+                document.getElementById('results_number').textContent = `${resultCount} ${resultText} found`;
+
+                if (resultCount === 0) {
+                    document.getElementById("results_not_found").style.display = "block";
+                    setLoadMore(null);
+                    return;
+                } else {
+                    document.getElementById("results_not_found").style.display = "none";
+                }
             }
 
-            (Array.isArray(data) ? data : []).forEach(dataset => {
-                let card = document.createElement('div');
-                card.className = 'col-12';
-                card.innerHTML = `
-                    <div class="card">
-                        <div class="card-body">
-                            <div class="d-flex align-items-center justify-content-between">
-                                <h3><a href="${dataset.url}">${escapeHtml(dataset.title)}</a></h3>
-                                <div>
-                                    <span class="badge bg-primary" style="cursor: pointer;"
-                                          onclick="set_data_category_as_query('${dataset.data_category}')">
-                                          ${dataset.data_category}
-                                    </span>
-                                </div>
-                            </div>
-                            <p class="text-secondary">${formatDate(dataset.created_at)}</p>
-                            <div class="row mb-2">
-                                <div class="col-md-4 col-12">
-                                    <span class=" text-secondary">Description</span>
-                                </div>
-                                <div class="col-md-8 col-12">
-                                    <p class="card-text">${dataset.description}</p>
-                                </div>
-                            </div>
-
-                            <div class="row mb-2">
-                                <div class="col-md-4 col-12">
-                                    <span class=" text-secondary">Authors</span>
-                                </div>
-                                <div class="col-md-8 col-12">
-                                    ${ (dataset.authors || []).map(a => `<p> ${escapeHtml(a.name)} </p>`).join('') }
-                                </div>
-                            </div>
-
-                            <div class="row mb-2">
-                                <div class="col-md-4 col-12">
-                                    <span class=" text-secondary">Tags</span>
-                                </div>
-                                <div class="col-md-8 col-12">
-                                    ${dataset.tags.map(tag => `
-                                        <span class="badge bg-primary me-1" style="cursor: pointer;"
-                                              onclick="set_tag_as_query('${tag}')">${tag}</span>
-                                    `).join('')}
-                                </div>
-                            </div>
-
-                            <div class="row">
-                                <div class="col-md-4 col-12"></div>
-                                <div class="col-md-8 col-12">
-                                    <a href="${dataset.url}" class="btn btn-outline-primary btn-sm" style="border-radius: 5px;">
-                                        View dataset
-                                    </a>
-                                    <a href="/dataset/download/${dataset.id}" class="btn btn-outline-primary btn-sm" style="border-radius: 5px;">
-                                        Download (${dataset.total_size_in_human_format})
-                                    </a>
-                                </div>
-                            </div>
-                        </div>
-                    </div>
-                `;
-                document.getElementById('results').appendChild(card);
+            items.forEach(dataset => {
+                document.getElementById('results').appendChild(renderDataset(dataset));
             });
+            setLoadMore(data?.next_cursor ?? null, fetchPage);
         })
         .catch(err => {
             console.error("Explore fetch failed:", err);
@@ -254,6 +210,120 @@ function send_query() {
     }
 }
 
+const PAGE_SIZE = 20;
+
+function setLoadMore(cursor, loadPage) {
+    let button = document.getElementById('load-more');
+    if (!button) {
+        button = document.createElement('button');
+        button.id = 'load-more';
+        button.type = 'button';
+        button.className = 'btn btn-outline-primary mt-3';
+        button.textContent = 'Load more';
+        document.getElementById('results').insertAdjacentElement('afterend', button);
+    }
+    button.style.display = cursor ? 'block' : 'none';
+    button.onclick = cursor ? () => {
+        button.style.display = 'none';
+        loadPage(cursor);
+    } : null;
+}
+
+function renderFacets(facets) {
+    const container = get('facets');
+    if (!container) return;
+    const group = (label, values, onclick) => values && values.length ? `
+        <div class="mb-1">
+            <span class="text-secondary me-2">${label}</span>
+            ${values.map(f => `
+                <span class="badge bg-light text-dark border me-1" style="cursor: pointer;"
+                      onclick="${onclick}('${escapeHtml(f.value)}')">${escapeHtml(f.value)} (${f.count})</span>
+            `).join('')}
+        </div>` : '';
+    container.innerHTML = facets ? [
+        group('Category', facets.data_category, 'set_data_category_value'),
+        group('Tags', facets.tags, 'set_tag_as_query'),
+        group('Communities', facets.community, 'set_community_filter'),
+    ].join('') : '';
+}
+
+function set_data_category_value(value) {
+    const DataCategorySelect = get('data_category');
+    if (!DataCategorySelect) return;
+    DataCategorySelect.value = value;
+    DataCategorySelect.dispatchEvent(new Event('input', {bubbles: true}));
+}
+
+function set_community_filter(name) {
+    const communityInput = get('community');
+    if (!communityInput) return;
+    communityInput.value = name;
+    communityInput.dispatchEvent(new Event('input', {bubbles: true}));
+}
+
+function renderDataset(dataset) {
+    let card = document.createElement('div');
+    card.className = 'col-12';
+    card.innerHTML = `
+        <div class="card">
+            <div class="card-body">
+                <div class="d-flex align-items-center justify-content-between">
+                    <h3><a href="${dataset.url}">${escapeHtml(dataset.title)}</a></h3>
+                    <div>
+                        <span class="badge bg-primary" style="cursor: pointer;"
+                              onclick="set_data_category_as_query('${dataset.data_category}')">
+                              ${dataset.data_category}
+                        </span>
+                    </div>
+                </div>
+                <p class="text-secondary">${formatDate(dataset.created_at)}</p>
+                <div class="row mb-2">
+                    <div class="col-md-4 col-12">
+                        <span class=" text-secondary">Description</span>
+                    </div>
+                    <div class="col-md-8 col-12">
+                        <p class="card-text">${dataset.description}</p>
+                    </div>
+                </div>
+
+                <div class="row mb-2">
+                    <div class="col-md-4 col-12">
+                        <span class=" text-secondary">Authors</span>
+                    </div>
+                    <div class="col-md-8 col-12">
+                        ${ (dataset.authors || []).map(a => `<p> ${escapeHtml(a.name)} </p>`).join('') }
+                    </div>
+                </div>
+
+                <div class="row mb-2">
+                    <div class="col-md-4 col-12">
+                        <span class=" text-secondary">Tags</span>
+                    </div>
+                    <div class="col-md-8 col-12">
+                        ${dataset.tags.map(tag => `
+                            <span class="badge bg-primary me-1" style="cursor: pointer;"
+                                  onclick="set_tag_as_query('${tag}')">${tag}</span>
+                        `).join('')}
+                    </div>
+                </div>
+
+                <div class="row">
+                    <div class="col-md-4 col-12"></div>
+                    <div class="col-md-8 col-12">
+                        <a href="${dataset.url}" class="btn btn-outline-primary btn-sm" style="border-radius: 5px;">
+                            View dataset
+                        </a>
+                        <a href="/dataset/download/${dataset.id}" class="btn btn-outline-primary btn-sm" style="border-radius: 5px;">
+                            Download (${dataset.total_size_in_human_format})
+                        </a>
+                    </div>
+                </div>
+            </div>
+        </div>
+    `;
+    return card;
+}
+
 function formatDate(dateString) {
     const options = {day: 'numeric', month: 'long', year: 'numeric', hour: 'numeric', minute: 'numeric'};
     const date = new Date(dateString);
@@ -0,0 +1,15 @@
+from app import db
+
+
+class SearchTerm(db.Model):
+    """One normalized token of a dataset's searchable text with its relevance weight."""
+
+    __tablename__ = "search_term"
+
+    id = db.Column(db.Integer, primary_key=True)
+    dataset_id = db.Column(db.Integer, nullable=False, index=True)
+    term = db.Column(db.String(64), nullable=False, index=True)
+    weight = db.Column(db.Integer, nullable=False, default=1)
+
+    def __repr__(self):
+        return f"<SearchTerm {self.term!r} dataset={self.dataset_id} weight={self.weight}>"
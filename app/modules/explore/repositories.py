@@ -1,24 +1,151 @@
-import re
+import base64
+import binascii
+import json
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal
 
-import unidecode
-from sqlalchemy import and_, func, or_
+from sqlalchemy import String, and_, cast, func, literal, or_, select, union_all
 
 from app import db
 from app.modules.community.models import Community, CommunityDatasetProposal, ProposalStatus
-from app.modules.dataset.models import Author, DataCategory, DataSet, DSDownloadRecord, DSMetaData, DSViewRecord
+from app.modules.dataset.models import Author, DataCategory, DataSet, DSMetaData
+from app.modules.dataset.repositories import ActivityCounterRepository, loader_options
 from app.modules.datasetfile.models import DatasetFile, DatasetFileMetaData
+from app.modules.explore.search_index import search_index
 from core.repositories.BaseRepository import BaseRepository
 
+FACET_TOP = 10
+
 
 class ExploreRepository(BaseRepository):
     def __init__(self):
         super().__init__(DataSet)
+        self.counters = ActivityCounterRepository()
+
+    def filter(self, query="", data_category="any", sorting="newest", limit=50, offset=0, profile=None, **filters):
+        filtered = self._filtered_query(query=query, data_category=data_category, **filters)
+        if filtered is None:
+            return []
+        q, score = filtered
+        if profile:
+            q = q.options(*loader_options(profile))
+
+        if sorting == "relevance" and score is not None:
+            q = q.add_columns(score).order_by(score.desc(), DataSet.created_at.desc())
+            rows = q.distinct().limit(limit).offset(offset).all()
+            return [dataset for dataset, _ in rows]
+        if sorting in ("newest", "relevance"):
+            q = q.order_by(DataSet.created_at.desc())
+        elif sorting == "oldest":
+            q = q.order_by(DataSet.created_at.asc())
+
+        return q.distinct().limit(limit).offset(offset).all()
+
+    def search_page(
+        self, query="", data_category="any", sorting="newest", cursor=None, limit=20, profile="summary", **filters
+    ):
+        """One keyset page of the filtered datasets.
+
+        Returns ``(datasets, next_cursor, total)``. ``total`` is only counted for
+        the first page (``cursor`` is None) and is None afterwards.
+        """
+        filtered = self._filtered_query(query=query, data_category=data_category, **filters)
+        if filtered is None:
+            return [], None, 0 if cursor is None else None
+        q, score = filtered
+        if score is None and sorting == "relevance":
+            sorting = "newest"
 
-    def filter(
+        keys = _sort_keys(sorting, score)
+        total = None
+        if cursor is not None:
+            q = q.filter(_after(keys, decode_cursor(cursor, sorting)))
+        else:
+            total = q.with_entities(func.count(func.distinct(DataSet.id))).order_by(None).scalar()
+
+        if score is not None and sorting == "relevance":
+            q = q.add_columns(score)
+        if profile:
+            q = q.options(*loader_options(profile))
+        q = q.order_by(*[column.desc() if descending else column.asc() for column, descending in keys])
+        rows = q.distinct().limit(limit + 1).all()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        datasets = [row[0] for row in rows] if score is not None and sorting == "relevance" else rows
+        next_cursor = None
+        if has_more and rows:
+            last = rows[-1]
+            values = [last[1]] if sorting == "relevance" else []
+            values += [datasets[-1].created_at, datasets[-1].id]
+            next_cursor = encode_cursor(sorting, values)
+        return datasets, next_cursor, total
+
+    def facet_counts(self, query="", data_category="any", top=FACET_TOP, **filters):
+        """Datasets per data category, top tags and top communities over the filtered result set.
+
+        All facets come back from a single ``UNION ALL`` of grouped selects over
+        the matching dataset ids. Tags are grouped by their raw comma-separated
+        string in SQL and split here, which keeps the row count bounded by the
+        number of distinct tag strings rather than datasets.
+        """
+        facets = {"data_category": [], "tags": [], "community": []}
+        filtered = self._filtered_query(query=query, data_category=data_category, **filters)
+        if filtered is None:
+            return facets
+        matching = filtered[0].with_entities(DataSet.id.label("dataset_id")).order_by(None).distinct().subquery()
+
+        by_category = (
+            select(literal("data_category"), cast(DSMetaData.data_category, String), func.count())
+            .select_from(matching)
+            .join(DataSet, DataSet.id == matching.c.dataset_id)
+            .join(DSMetaData, DSMetaData.id == DataSet.ds_meta_data_id)
+            .group_by(DSMetaData.data_category)
+        )
+        by_tags = (
+            select(literal("tags"), DSMetaData.tags, func.count())
+            .select_from(matching)
+            .join(DataSet, DataSet.id == matching.c.dataset_id)
+            .join(DSMetaData, DSMetaData.id == DataSet.ds_meta_data_id)
+            .where(DSMetaData.tags.isnot(None), DSMetaData.tags != "")
+            .group_by(DSMetaData.tags)
+        )
+        by_community = (
+            select(literal("community"), Community.name, func.count(func.distinct(matching.c.dataset_id)))
+            .select_from(matching)
+            .join(
+                CommunityDatasetProposal,
+                and_(
+                    CommunityDatasetProposal.dataset_id == matching.c.dataset_id,
+                    CommunityDatasetProposal.status == ProposalStatus.ACCEPTED,
+                ),
+            )
+            .join(Community, Community.id == CommunityDatasetProposal.community_id)
+            .group_by(Community.name)
+        )
+        rows = self.session.execute(union_all(by_category, by_tags, by_community)).all()
+
+        categories, tags, communities = Counter(), Counter(), Counter()
+        for facet, value, count in rows:
+            if facet == "data_category":
+                member = DataCategory.__members__.get(value)
+                categories[member.value if member else value] += count
+            elif facet == "tags":
+                for tag in {tag.strip().lower() for tag in value.split(",") if tag.strip()}:
+                    tags[tag] += count
+            else:
+                communities[value] += count
+
+        facets["data_category"] = [{"value": value, "count": count} for value, count in _ranked(categories)]
+        facets["tags"] = [{"value": value, "count": count} for value, count in _ranked(tags)[:top]]
+        facets["community"] = [{"value": value, "count": count} for value, count in _ranked(communities)[:top]]
+        return facets
+
+    def _filtered_query(
         self,
         query="",
         data_category="any",
-        sorting="newest",
         author=None,
         tags=None,
         filenames=None,
@@ -27,11 +154,9 @@ class ExploreRepository(BaseRepository):
         date_to=None,
         min_downloads=None,
         min_views=None,
-        limit=50,
-        offset=0,
         **kwargs,
     ):
-
+        """Filtered, unordered query plus the relevance column (or None), or None if ``query`` has no words."""
         q = (
             self.model.query.join(DataSet.ds_meta_data)
             .outerjoin(DSMetaData.authors)
@@ -39,25 +164,13 @@ class ExploreRepository(BaseRepository):
             .outerjoin(DatasetFile.file_metadata)
         )
 
+        score = None
         if query:
-            normalized_query = unidecode.unidecode(query).lower()
-            cleaned_query = re.sub(r'[,.":\'()\[\]^;!¡¿?]', "", normalized_query)
-            filters = []
-            for word in cleaned_query.split():
-                like = f"%{word}%"
-                filters.append(DSMetaData.title.ilike(like))
-                filters.append(DSMetaData.description.ilike(like))
-                filters.append(Author.name.ilike(like))
-                filters.append(Author.affiliation.ilike(like))
-                filters.append(Author.orcid.ilike(like))
-                filters.append(DatasetFileMetaData.csv_filename.ilike(like))
-                filters.append(DatasetFileMetaData.title.ilike(like))
-                filters.append(DatasetFileMetaData.description.ilike(like))
-                filters.append(DatasetFileMetaData.publication_doi.ilike(like))
-                filters.append(DatasetFileMetaData.tags.ilike(like))
-                filters.append(DSMetaData.tags.ilike(like))
-            if filters:
-                q = q.filter(or_(*filters))
+            matches = search_index.match_subquery(query)
+            if matches is None:
+                return None
+            q = q.join(matches, matches.c.dataset_id == DataSet.id)
+            score = matches.c.score
 
         if data_category != "any":
             matching_type = None
@@ -125,29 +238,70 @@ class ExploreRepository(BaseRepository):
         if date_to:
             q = q.filter(DataSet.created_at <= date_to)
 
-        # downloads/views aggregates
+        # downloads/views totals come from the maintained counters
         if min_downloads is not None:
-            dl_sub = (
-                db.session.query(
-                    DSDownloadRecord.dataset_id.label("dsid"), func.count(DSDownloadRecord.id).label("dlc")
-                )
-                .group_by(DSDownloadRecord.dataset_id)
-                .subquery()
+            dl_sub = self.counters.totals_subquery("dataset", "downloads")
+            q = q.outerjoin(dl_sub, dl_sub.c.subject_id == DataSet.id).filter(
+                func.coalesce(dl_sub.c.total, 0) >= int(min_downloads)
             )
-            q = q.outerjoin(dl_sub, dl_sub.c.dsid == DataSet.id).filter(dl_sub.c.dlc >= int(min_downloads))
 
         if min_views is not None:
-            v_sub = (
-                db.session.query(DSViewRecord.dataset_id.label("dsid"), func.count(DSViewRecord.id).label("vc"))
-                .group_by(DSViewRecord.dataset_id)
-                .subquery()
+            v_sub = self.counters.totals_subquery("dataset", "views")
+            q = q.outerjoin(v_sub, v_sub.c.subject_id == DataSet.id).filter(
+                func.coalesce(v_sub.c.total, 0) >= int(min_views)
             )
-            q = q.outerjoin(v_sub, v_sub.c.dsid == DataSet.id).filter(v_sub.c.vc >= int(min_views))
 
-        # sorting/pagination
-        if sorting == "newest":
-            q = q.order_by(DataSet.created_at.desc())
-        elif sorting == "oldest":
-            q = q.order_by(DataSet.created_at.asc())
+        return q, score
 
-        return q.distinct().limit(limit).offset(offset).all()
+
+def _ranked(counter):
+    return sorted(counter.items(), key=lambda item: (-item[1], item[0]))
+
+
+def _sort_keys(sorting, score):
+    """``(column, descending)`` pairs that totally order a page for ``sorting``."""
+    if sorting == "oldest":
+        return [(DataSet.created_at, False), (DataSet.id, False)]
+    keys = [(DataSet.created_at, True), (DataSet.id, True)]
+    if sorting == "relevance":
+        keys.insert(0, (score, True))
+    return keys
+
+
+def _after(keys, values):
+    """Row-value comparison ``(k1, k2, ...) > (v1, v2, ...)`` honouring each key's direction."""
+    clauses = []
+    for position, (column, descending) in enumerate(keys):
+        beyond = column < values[position] if descending else column > values[position]
+        equal = [keys[i][0] == values[i] for i in range(position)]
+        clauses.append(and_(*equal, beyond))
+    return or_(*clauses)
+
+
+def _cursor_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        # aggregates come back as Decimal from some drivers, which JSON cannot encode
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+def encode_cursor(sorting, values):
+    payload = [_cursor_value(value) for value in values]
+    raw = json.dumps({"s": sorting, "k": payload}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, sorting):
+    """Inverse of ``encode_cursor``; raises ValueError for malformed cursors or a different sorting."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        values = list(data["k"])
+        values[-2] = datetime.fromisoformat(values[-2])
+    except (TypeError, ValueError, KeyError, IndexError, binascii.Error):
+        raise ValueError("Invalid cursor")
+    if data.get("s") != sorting or len(values) != (3 if sorting == "relevance" else 2):
+        raise ValueError("Cursor does not match the requested sorting")
+    return values
@@ -8,6 +8,9 @@ from app.modules.explore.repositories import ExploreRepository
 
 repo = ExploreRepository()
 
+PAGE_DEFAULT_LIMIT = 20
+PAGE_MAX_LIMIT = 100
+
 
 def serialize_dataset(d):
     """
@@ -44,6 +47,18 @@ def serialize_dataset(d):
     return data
 
 
+def _parse_page_limit(value):
+    if value is None:
+        return PAGE_DEFAULT_LIMIT
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    if limit < 1:
+        raise ValueError("limit must be >= 1")
+    return min(limit, PAGE_MAX_LIMIT)
+
+
 @explore_bp.route("/explore", methods=["GET", "POST"])
 def index():
     if request.method == "POST":
@@ -55,9 +70,10 @@ def index():
             except Exception:
                 return None
 
-        results = repo.filter(
-            query=payload.get("query", ""),
-            sorting=payload.get("sorting", "newest"),
+        query = payload.get("query", "")
+        filters = dict(
+            query=query,
+            sorting=payload.get("sorting") or ("relevance" if query.strip() else "newest"),
             author=payload.get("author"),
             data_category=payload.get("data_category", "any"),
             tags=payload.get("tags", []),
@@ -69,6 +85,27 @@ def index():
             min_views=payload.get("min_views"),
         )
 
+        # Clients that ask for a page get an envelope; the bare list stays for older callers
+        if "cursor" in payload or "limit" in payload or payload.get("facets"):
+            cursor = payload.get("cursor") or None
+            try:
+                limit = _parse_page_limit(payload.get("limit"))
+                results, next_cursor, total = repo.search_page(cursor=cursor, limit=limit, **filters)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            page = {
+                "items": [serialize_dataset(d) for d in results],
+                "next_cursor": next_cursor,
+                "total": total,
+                "limit": limit,
+            }
+            # like the total, facets describe the whole result set and only come with the first page
+            if payload.get("facets") and cursor is None:
+                page["facets"] = repo.facet_counts(**filters)
+            return jsonify(page)
+
+        results = repo.filter(profile="summary", **filters)
+
         return jsonify([serialize_dataset(d) for d in results])
 
     form = ExploreForm()
@@ -0,0 +1,206 @@
+"""Inverted index over the searchable text of every dataset.
+
+Each dataset is tokenized into ``search_term`` rows (unidecoded, lower-cased
+alphanumeric words, weighted by the field they come from). Queries become a
+``term LIKE 'word%'`` prefix lookup on the indexed ``term`` column plus a
+``SUM(weight)`` per dataset, instead of leading-wildcard ``ILIKE`` scans over
+four joined tables.
+
+The index is kept in sync from session events: any flush touching a dataset,
+its metadata, authors or file metadata marks the dataset dirty, and it is
+re-tokenized right before the transaction commits. Bulk ``query.delete()``
+bypasses the events; ``rosemary search:reindex`` rebuilds everything.
+"""
+
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Set
+
+import unidecode
+from sqlalchemy import Integer, cast, delete, event, func, or_
+
+from app import db
+from app.modules.dataset.models import Author, DataSet, DSMetaData
+from app.modules.datasetfile.models import DatasetFile, DatasetFileMetaData
+from app.modules.explore.models import SearchTerm
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+MAX_TERM_LENGTH = 64
+REINDEX_BATCH = 500
+_PENDING_KEY = "search_index_pending"
+
+# Relevance weight per indexed field
+WEIGHTS = {
+    "title": 5,
+    "tags": 3,
+    "author": 3,
+    "filename": 3,
+    "file_title": 2,
+    "description": 1,
+    "affiliation": 1,
+    "orcid": 1,
+    "file_description": 1,
+    "publication_doi": 1,
+}
+
+
+def tokenize(text) -> List[str]:
+    """Normalize like the legacy search (unidecode + lower case) and split into words."""
+    if not text:
+        return []
+    normalized = unidecode.unidecode(str(text)).lower()
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall(normalized)]
+
+
+class SearchIndex:
+    def document_terms(self, session, dataset_ids: Iterable[int]) -> Dict[int, Counter]:
+        """Weighted term counts for every dataset in ``dataset_ids``."""
+        ids = list(dataset_ids)
+        documents: Dict[int, Counter] = {dataset_id: Counter() for dataset_id in ids}
+        if not ids:
+            return documents
+
+        def add(dataset_id, field, text):
+            for token in tokenize(text):
+                documents[dataset_id][token] += WEIGHTS[field]
+
+        metadata_rows = (
+            session.query(DataSet.id, DSMetaData.title, DSMetaData.description, DSMetaData.tags)
+            .join(DSMetaData, DataSet.ds_meta_data_id == DSMetaData.id)
+            .filter(DataSet.id.in_(ids))
+        )
+        for dataset_id, title, description, tags in metadata_rows:
+            add(dataset_id, "title", title)
+            add(dataset_id, "description", description)
+            add(dataset_id, "tags", tags)
+
+        author_rows = (
+            session.query(DataSet.id, Author.name, Author.affiliation, Author.orcid)
+            .join(Author, Author.ds_meta_data_id == DataSet.ds_meta_data_id)
+            .filter(DataSet.id.in_(ids))
+        )
+        for dataset_id, name, affiliation, orcid in author_rows:
+            add(dataset_id, "author", name)
+            add(dataset_id, "affiliation", affiliation)
+            add(dataset_id, "orcid", orcid)
+
+        file_rows = (
+            session.query(
+                DatasetFile.data_set_id,
+                DatasetFileMetaData.csv_filename,
+                DatasetFileMetaData.title,
+                DatasetFileMetaData.description,
+                DatasetFileMetaData.publication_doi,
+                DatasetFileMetaData.tags,
+            )
+            .join(DatasetFileMetaData, DatasetFile.metadata_id == DatasetFileMetaData.id)
+            .filter(DatasetFile.data_set_id.in_(ids))
+        )
+        for dataset_id, filename, title, description, publication_doi, tags in file_rows:
+            add(dataset_id, "filename", filename)
+            add(dataset_id, "file_title", title)
+            add(dataset_id, "file_description", description)
+            add(dataset_id, "publication_doi", publication_doi)
+            add(dataset_id, "tags", tags)
+
+        return documents
+
+    def reindex(self, session, dataset_ids: Iterable[int]) -> None:
+        """Replace the index rows of ``dataset_ids`` (deleted datasets simply lose theirs)."""
+        ids = sorted(set(dataset_ids))
+        table = SearchTerm.__table__
+        for start in range(0, len(ids), REINDEX_BATCH):
+            batch = ids[start : start + REINDEX_BATCH]
+            session.execute(delete(table).where(table.c.dataset_id.in_(batch)))
+            rows = [
+                {"dataset_id": dataset_id, "term": term, "weight": weight}
+                for dataset_id, terms in self.document_terms(session, batch).items()
+                for term, weight in terms.items()
+            ]
+            if rows:
+                session.execute(table.insert(), rows)
+
+    def rebuild(self) -> int:
+        db.session.execute(delete(SearchTerm.__table__))
+        dataset_ids = [dataset_id for (dataset_id,) in db.session.query(DataSet.id)]
+        self.reindex(db.session, dataset_ids)
+        db.session.commit()
+        return len(dataset_ids)
+
+    def match_subquery(self, query: str):
+        """``(dataset_id, score)`` for datasets matching any word of ``query``, or None if it has no words.
+
+        The score is cast back to an integer: MySQL sums integers into DECIMAL.
+        """
+        tokens = sorted(set(tokenize(query)))
+        if not tokens:
+            return None
+        return (
+            db.session.query(
+                SearchTerm.dataset_id.label("dataset_id"), cast(func.sum(SearchTerm.weight), Integer).label("score")
+            )
+            .filter(or_(*[SearchTerm.term.like(f"{token}%") for token in tokens]))
+            .group_by(SearchTerm.dataset_id)
+            .subquery()
+        )
+
+
+search_index = SearchIndex()
+
+
+def _pending(session) -> Dict[str, Set[int]]:
+    return session.info.setdefault(_PENDING_KEY, {"datasets": set(), "ds_meta": set(), "fm_meta": set()})
+
+
+@event.listens_for(db.session, "after_flush")
+def _collect_dirty_datasets(session, flush_context):
+    touched = list(session.new) + list(session.dirty) + list(session.deleted)
+    if not touched:
+        return
+    pending = None
+    for instance in touched:
+        if isinstance(instance, DataSet):
+            key, value = "datasets", instance.id
+        elif isinstance(instance, DSMetaData):
+            key, value = "ds_meta", instance.id
+        elif isinstance(instance, Author):
+            key, value = "ds_meta", instance.ds_meta_data_id
+        elif isinstance(instance, DatasetFile):
+            key, value = "datasets", instance.data_set_id
+        elif isinstance(instance, DatasetFileMetaData):
+            key, value = "fm_meta", instance.id
+        else:
+            continue
+        if value is not None:
+            pending = pending or _pending(session)
+            pending[key].add(value)
+
+
+@event.listens_for(db.session, "before_commit")
+def _reindex_dirty_datasets(session):
+    # before_commit runs ahead of the final flush, so flush here to see every change
+    session.flush()
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+
+    dataset_ids = set(pending["datasets"])
+    with session.no_autoflush:
+        if pending["ds_meta"]:
+            dataset_ids.update(
+                dataset_id
+                for (dataset_id,) in session.query(DataSet.id).filter(DataSet.ds_meta_data_id.in_(pending["ds_meta"]))
+            )
+        if pending["fm_meta"]:
+            dataset_ids.update(
+                dataset_id
+                for (dataset_id,) in session.query(DatasetFile.data_set_id).filter(
+                    DatasetFile.metadata_id.in_(pending["fm_meta"])
+                )
+            )
+        search_index.reindex(session, dataset_ids)
+
+
+@event.listens_for(db.session, "after_rollback")
+def _forget_dirty_datasets(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -7,4 +7,7 @@ class ExploreService(BaseService):
         super().__init__(ExploreRepository())
 
     def filter(self, query="", sorting="newest", data_category="any", tags=[], **kwargs):
-        return self.repository.filter(query, sorting, data_category, tags, **kwargs)
+        return self.repository.filter(query=query, sorting=sorting, data_category=data_category, tags=tags, **kwargs)
+
+    def search_page(self, **kwargs):
+        return self.repository.search_page(**kwargs)
@@ -1,13 +1,16 @@
 from datetime import datetime
+from decimal import Decimal
 
 import pytest
+from sqlalchemy import event
 
 from app import db
 from app.modules.auth.models import User
 from app.modules.community.models import Community, CommunityDatasetProposal, ProposalStatus
 from app.modules.dataset.models import Author, DataCategory, DataSet, DSDownloadRecord, DSMetaData, DSViewRecord
 from app.modules.datasetfile.models import DatasetFile, DatasetFileMetaData
-from app.modules.explore.repositories import ExploreRepository
+from app.modules.explore.models import SearchTerm
+from app.modules.explore.repositories import ExploreRepository, decode_cursor, encode_cursor
 
 
 @pytest.fixture(scope="module")
@@ -262,3 +265,147 @@ def test_repo_sorting_newest_oldest(repo, populated_db):
     oldest_first = oldest[0].created_at
 
     assert newest_first >= oldest_first, "Expected newest first to be same or newer than oldest first"
+
+
+def test_repo_search_ranks_by_relevance(repo, populated_db):
+    # "rpg" is a tag of Dataset Two and of its file; "indie" only matches Dataset One
+    results = repo.filter(query="rpg indie first", sorting="relevance")
+    titles = [r.ds_meta_data.title for r in results]
+    assert titles[0] == "Dataset One"
+    assert sorted(titles) == ["Dataset One", "Dataset Two"]
+
+    results = repo.filter(query="Wonderland", sorting="relevance")
+    assert [r.ds_meta_data.title for r in results] == ["Dataset One"]
+
+
+def test_repo_search_normalizes_accents_and_prefixes(repo, populated_db):
+    results = repo.filter(query="Sécond")
+    assert [r.ds_meta_data.title for r in results] == ["Dataset Two"]
+
+    results = repo.filter(query="monst")
+    assert [r.ds_meta_data.title for r in results] == ["Dataset Two"]
+
+    assert repo.filter(query="?!") == []
+
+
+def test_search_index_follows_updates_and_deletes(test_client, repo, populated_db):
+    with test_client.application.app_context():
+        metadata = DSMetaData.query.filter_by(title="Dataset Three").first()
+        metadata.description = "Strategy classics"
+        db.session.commit()
+
+        results = repo.filter(query="strategy")
+        assert [r.ds_meta_data.title for r in results] == ["Dataset Three"]
+
+        dataset = DataSet.query.filter_by(ds_meta_data_id=metadata.id).first()
+        dataset_id = dataset.id
+        db.session.delete(dataset)
+        db.session.commit()
+
+        assert repo.filter(query="strategy") == []
+        assert SearchTerm.query.filter_by(dataset_id=dataset_id).count() == 0
+
+
+def test_repo_search_page_walks_keyset_cursor(repo, populated_db):
+    seen = []
+    datasets, cursor, total = repo.search_page(sorting="oldest", limit=2)
+    assert total == 3
+    seen += [d.ds_meta_data.title for d in datasets]
+    assert cursor is not None
+
+    datasets, cursor, total = repo.search_page(sorting="oldest", limit=2, cursor=cursor)
+    assert total is None
+    assert cursor is None
+    seen += [d.ds_meta_data.title for d in datasets]
+    assert seen == ["Dataset One", "Dataset Two", "Dataset Three"]
+
+    with pytest.raises(ValueError):
+        repo.search_page(sorting="newest", cursor=encode_cursor("oldest", [datetime(2020, 1, 1), 1]))
+    with pytest.raises(ValueError):
+        repo.search_page(cursor="not-a-cursor")
+
+
+def test_relevance_cursor_encodes_decimal_scores():
+    # MySQL returns SUM() over integers as Decimal
+    created_at = datetime(2024, 5, 1, 12, 30)
+    cursor = encode_cursor("relevance", [Decimal("7"), created_at, 3])
+    assert decode_cursor(cursor, "relevance") == [7, created_at, 3]
+    assert decode_cursor(encode_cursor("relevance", [Decimal("2.5"), created_at, 3]), "relevance")[0] == 2.5
+
+
+def test_explore_route_post_returns_page_envelope(test_client, populated_db):
+    resp = test_client.post("/explore", json={"query": "dataset", "limit": 2})
+    assert resp.status_code == 200
+    page = resp.get_json()
+    assert page["total"] == 3
+    assert len(page["items"]) == 2
+    assert page["next_cursor"]
+    assert {"id", "title", "created_at", "tags"} <= set(page["items"][0])
+
+    resp = test_client.post("/explore", json={"query": "dataset", "limit": 2, "cursor": page["next_cursor"]})
+    rest = resp.get_json()
+    assert rest["next_cursor"] is None
+    ids = [item["id"] for item in page["items"] + rest["items"]]
+    assert len(ids) == len(set(ids)) == 3
+
+    resp = test_client.post("/explore", json={"limit": 0})
+    assert resp.status_code == 400
+
+
+def test_repo_facet_counts_follow_filters(repo, populated_db):
+    facets = repo.facet_counts()
+    assert facets["data_category"] == [{"value": "none", "count": 3}]
+    assert facets["tags"] == [
+        {"value": "action", "count": 1},
+        {"value": "indie", "count": 1},
+        {"value": "rpg", "count": 1},
+    ]
+    assert facets["community"] == [{"value": "Indie Lovers", "count": 1}]
+
+    facets = repo.facet_counts(query="second")
+    assert facets["tags"] == [{"value": "rpg", "count": 1}]
+    assert facets["community"] == []
+
+    assert repo.facet_counts(query="?!") == {"data_category": [], "tags": [], "community": []}
+
+
+def test_explore_route_post_returns_facets_with_first_page(test_client, populated_db):
+    resp = test_client.post("/explore", json={"query": "", "limit": 1, "facets": True})
+    page = resp.get_json()
+    assert page["facets"]["data_category"] == [{"value": "none", "count": 3}]
+
+    resp = test_client.post("/explore", json={"limit": 1, "facets": True, "cursor": page["next_cursor"]})
+    assert "facets" not in resp.get_json()
+
+
+def _count_queries(engine, action):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        action()
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return len(statements)
+
+
+def test_summary_profile_serializes_in_fixed_number_of_queries(test_client, repo, populated_db):
+    def search_and_serialize(limit):
+        def action():
+            datasets, _, _ = repo.search_page(sorting="newest", limit=limit, profile="summary")
+            assert len(datasets) == limit
+            for dataset in datasets:
+                dataset.to_dict()
+
+        return action
+
+    with test_client.application.test_request_context():
+        db.session.expire_all()
+        one = _count_queries(db.engine, search_and_serialize(1))
+        db.session.expire_all()
+        three = _count_queries(db.engine, search_and_serialize(3))
+
+    assert one == three
@@ -66,11 +66,11 @@ class FakenodoService(BaseService):
         """
         csv_filename = dataset_file.file_metadata.csv_filename
         user_id = current_user.id if user is None else user.id
-        relative_path = storage_service.dataset_file_path(
-            user_id,
-            dataset.id,
-            csv_filename,
-        )
+        hubfile = next((file for file in dataset_file.files if file.name == csv_filename), None)
+        if hubfile is not None:
+            relative_path = hubfile.stored_path(user_id, dataset.id)
+        else:
+            relative_path = storage_service.dataset_file_path(user_id, dataset.id, csv_filename)
         file_path = storage_service.ensure_local_copy(relative_path)
         return {
             "name": csv_filename,
@@ -5,6 +5,7 @@ from flask import request
 from app import db
 from app.modules.auth.models import User
 from app.modules.dataset.models import DataSet
+from core.storage import StorageService
 
 
 class Hubfile(db.Model):
@@ -15,6 +16,8 @@ class Hubfile(db.Model):
     size = db.Column(db.Integer, nullable=False)
     download_count = db.Column(db.Integer, nullable=False, default=0)
     dataset_file_id = db.Column("feature_model_id", db.Integer, db.ForeignKey("feature_model.id"), nullable=False)
+    # set when the content lives in the shared blob store rather than under the dataset's folder
+    storage_key = db.Column(db.String(255), nullable=True)
 
     def get_formatted_size(self):
         from app.modules.dataset.services import SizeService
@@ -36,6 +39,10 @@ class Hubfile(db.Model):
 
         return HubfileService().get_path_by_hubfile(self)
 
+    def stored_path(self, user_id: int, dataset_id: int) -> str:
+        """Where the content is stored: its blob, or the file under the owner's dataset folder."""
+        return self.storage_key or StorageService.dataset_file_path(user_id, dataset_id, self.name)
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -94,3 +101,16 @@ class HubfileDownloadRecord(db.Model):
             f"date={self.download_date} "
             f"cookie={self.download_cookie}>"
         )
+
+
+class Blob(db.Model):
+    """One stored copy of a file's content, shared by every Hubfile with that checksum."""
+
+    __tablename__ = "blob"
+    checksum = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"<Blob {self.checksum[:12]} refs={self.ref_count}>"
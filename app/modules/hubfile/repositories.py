@@ -1,10 +1,13 @@
-from sqlalchemy import func
+from datetime import datetime, timezone
+from typing import Iterable, Optional, Set
 
 from app import db
 from app.modules.auth.models import User
 from app.modules.dataset.models import DataSet
+from app.modules.dataset.repositories import ActivityCounterRepository
 from app.modules.datasetfile.models import DatasetFile
-from app.modules.hubfile.models import Hubfile, HubfileDownloadRecord, HubfileViewRecord
+from app.modules.hubfile.models import Blob, Hubfile, HubfileDownloadRecord, HubfileViewRecord
+from core.events import event_buffer
 from core.repositories.BaseRepository import BaseRepository
 
 
@@ -26,13 +29,47 @@ class HubfileRepository(BaseRepository):
         return db.session.query(DataSet).join(DatasetFile).join(Hubfile).filter(Hubfile.id == hubfile.id).first()
 
 
+class BlobRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(Blob)
+
+    def locked(self, checksum: str) -> Optional[Blob]:
+        """The blob row, locked until the transaction ends so reference counts change one at a time."""
+        return self.model.query.filter_by(checksum=checksum).with_for_update().first()
+
+    def existing(self, checksums: Iterable[str]) -> Set[str]:
+        checksums = set(checksums)
+        if not checksums:
+            return set()
+        rows = self.session.query(self.model.checksum).filter(self.model.checksum.in_(checksums)).all()
+        return {row.checksum for row in rows}
+
+
 class HubfileViewRecordRepository(BaseRepository):
     def __init__(self):
         super().__init__(HubfileViewRecord)
 
     def total_hubfile_views(self) -> int:
-        max_id = self.model.query.with_entities(func.max(self.model.id)).scalar()
-        return max_id if max_id is not None else 0
+        return ActivityCounterRepository().total("hubfile", "views")
+
+    def the_record_exists(self, file_id: int, user_id: Optional[int], user_cookie: str) -> bool:
+        dedup_key = ("file_view", user_id, file_id, user_cookie)
+        if event_buffer.has_seen(dedup_key):
+            return True
+        record = self.model.query.filter_by(user_id=user_id, file_id=file_id, view_cookie=user_cookie).first()
+        if record:
+            event_buffer.mark_seen(dedup_key)
+        return record is not None
+
+    def create_new_record(self, file_id: int, user_id: Optional[int], user_cookie: str) -> Optional[HubfileViewRecord]:
+        return event_buffer.record(
+            self.model,
+            dedup_key=("file_view", user_id, file_id, user_cookie),
+            user_id=user_id,
+            file_id=file_id,
+            view_date=datetime.now(timezone.utc),
+            view_cookie=user_cookie,
+        )
 
 
 class HubfileDownloadRecordRepository(BaseRepository):
@@ -40,10 +77,20 @@ class HubfileDownloadRecordRepository(BaseRepository):
         super().__init__(HubfileDownloadRecord)
 
     def total_hubfile_downloads(self) -> int:
-        max_id = self.model.query.with_entities(func.max(self.model.id)).scalar()
-        return max_id if max_id is not None else 0
+        return ActivityCounterRepository().total("hubfile", "downloads")
 
     def count_downloads_performed_by_user(self, user_id: int) -> int:
         if not user_id:
             return 0
         return self.model.query.filter(self.model.user_id == user_id).count()
+
+    def record_download(self, file_id: int, user_id: Optional[int], user_cookie: str) -> None:
+        """Queue the download record together with the ``Hubfile.download_count`` bump."""
+        event_buffer.record(
+            self.model,
+            user_id=user_id,
+            file_id=file_id,
+            download_date=datetime.now(timezone.utc),
+            download_cookie=user_cookie,
+        )
+        event_buffer.increment(Hubfile, "download_count", file_id)
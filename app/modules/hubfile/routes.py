@@ -1,57 +1,245 @@
+import json
+import mimetypes
 import os
 import uuid
-from datetime import datetime, timezone
 
-from flask import jsonify, make_response, request, send_from_directory
-from flask_login import current_user
+from flask import Response, abort, jsonify, make_response, request, send_file, stream_with_context
+from flask_login import current_user, login_required
 
-from app import db
+from app.modules.auth.models import UserRole
 from app.modules.hubfile import hubfile_bp
-from app.modules.hubfile.models import HubfileViewRecord
+from app.modules.hubfile.row_index import CSVRowIndex
 from app.modules.hubfile.services import HubfileDownloadRecordService, HubfileService
+from core.storage import file_cache, storage_service
+from core.storage.async_storage import cooperative, get_async_storage
+from core.storage.storage_service import ZSTD_ENCODING
+
+RAW_CHUNK_SIZE = 1024 * 1024
+
+
+def _file_not_found(path):
+    return (
+        jsonify(
+            {
+                "success": False,
+                "error": "File not found on disk",
+                "path": path,
+            }
+        ),
+        404,
+    )
+
+
+def _accepts_zstd():
+    # ranges of the compressed bytes are not offered: resuming clients get the original content
+    return request.range is None and request.accept_encodings[ZSTD_ENCODING] > 0
+
+
+def _iter_raw(relative_path):
+    if cooperative():
+        source = get_async_storage(storage_service).open(relative_path, decompress=False)
+    else:
+        source = storage_service.open_raw(relative_path)
+    try:
+        yield from iter(lambda: source.read(RAW_CHUNK_SIZE), b"")
+    finally:
+        source.close()
+
+
+def _zstd_download_response(relative_path, info, filename, checksum):
+    """Send a compressed file as stored, for clients that decode zstd themselves."""
+    etag = f"{checksum}-{ZSTD_ENCODING}"
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Content-Encoding": ZSTD_ENCODING,
+    }
+    if request.if_none_match.contains(etag):
+        response = Response(status=304, headers=headers)
+        response.set_etag(etag)
+        return response
+
+    headers["Content-Length"] = str(info.stored_size)
+    response = Response(
+        stream_with_context(_iter_raw(relative_path)),
+        mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+        headers=headers,
+        direct_passthrough=True,
+    )
+    response.set_etag(etag)
+    return response
+
+
+def _s3_download_response(relative_path, info, filename, etag):
+    """Answer conditional and ranged requests straight from the S3 object."""
+    size = info.size
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    }
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304, headers=headers)
+        response.set_etag(etag)
+        return response
+
+    start, stop, status = 0, size, 200
+    byte_range = request.range
+    if_range = request.if_range
+    range_applies = if_range.etag == etag if (if_range.etag or if_range.date) else True
+    if byte_range is not None and range_applies:
+        bounds = byte_range.range_for_length(size)
+        if bounds is None:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status=416, headers=headers)
+        start, stop = bounds
+        status = 206
+        headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+
+    headers["Content-Length"] = str(stop - start)
+    if cooperative():
+        # on a gevent worker the transfer waits on its greenlet instead of blocking the worker
+        chunks = get_async_storage(storage_service).read_range(relative_path, start, stop, info=info)
+    else:
+        chunks = storage_service.iter_range(relative_path, start, stop, info=info)
+    response = Response(
+        stream_with_context(chunks),
+        status=status,
+        mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+        headers=headers,
+        direct_passthrough=True,
+    )
+    response.set_etag(etag)
+    return response
+
+
+def _is_new_download(response):
+    """Revalidations and resumed ranges are not counted as separate downloads."""
+    if response.status_code == 304:
+        return False
+    if response.status_code == 206:
+        content_range = response.headers.get("Content-Range", "")
+        return content_range.startswith("bytes 0-")
+    return response.status_code == 200
 
 
 @hubfile_bp.route("/file/download/<int:file_id>", methods=["GET"])
 def download_file(file_id):
-    file = HubfileService().get_or_404(file_id)
+    hubfile_service = HubfileService()
+    file = hubfile_service.get_or_404(file_id)
     filename = file.name
 
-    abs_file_path = os.path.abspath(HubfileService().get_path_by_hubfile(file))
-    directory = os.path.dirname(abs_file_path)
-    if not os.path.exists(abs_file_path):
-        return (
-            jsonify(
-                {
-                    "success": False,
-                    "error": "File not found on disk",
-                    "path": abs_file_path,
-                }
-            ),
-            404,
+    relative_path = hubfile_service.get_relative_path_by_hubfile(file)
+    info = storage_service.stored_info(relative_path)
+
+    if info is not None and info.compressed and _accepts_zstd():
+        resp = _zstd_download_response(relative_path, info, filename, file.checksum)
+    elif storage_service.uses_s3():
+        if info is None:
+            return _file_not_found(relative_path)
+        resp = _s3_download_response(relative_path, info, filename, file.checksum)
+    else:
+        # a compressed file is served from its decompressed copy in the file cache
+        abs_file_path = os.path.abspath(hubfile_service.get_path_by_hubfile(file))
+        if not os.path.exists(abs_file_path):
+            return _file_not_found(abs_file_path)
+        resp = send_file(
+            abs_file_path,
+            as_attachment=True,
+            download_name=filename,
+            conditional=True,
+            etag=file.checksum,
         )
+        resp.headers["Accept-Ranges"] = "bytes"
 
-    user_cookie = str(uuid.uuid4())
+    if info is not None and info.compressed:
+        resp.vary.add("Accept-Encoding")
 
-    HubfileDownloadRecordService().create(
-        user_id=current_user.id if current_user.is_authenticated else None,
-        file_id=file_id,
-        download_date=datetime.now(timezone.utc),
-        download_cookie=user_cookie,
-    )
+    if _is_new_download(resp):
+        user_cookie = str(uuid.uuid4())
+
+        HubfileDownloadRecordService().record_download(
+            file_id=file_id,
+            user_id=current_user.id if current_user.is_authenticated else None,
+            user_cookie=user_cookie,
+        )
 
-    HubfileDownloadRecordService().update_download_count(file_id)
-    db.session.commit()
+        resp.set_cookie("file_download_cookie", user_cookie)
 
-    resp = make_response(
-        send_from_directory(
-            directory=directory,
-            path=filename,
-            as_attachment=True,
+    return resp
+
+
+VIEW_DEFAULT_LIMIT = 100
+VIEW_MAX_LIMIT = 1000
+
+
+def _register_view(file_id):
+    """Record one view per (user, file, cookie) and return the cookie in use."""
+    user_cookie = request.cookies.get("view_cookie")
+    if not user_cookie:
+        user_cookie = str(uuid.uuid4())
+
+    uid = current_user.id if current_user.is_authenticated else None
+    HubfileService().register_view(file_id, uid, user_cookie)
+
+    return user_cookie
+
+
+def _with_view_cookie(response, user_cookie):
+    if not request.cookies.get("view_cookie"):
+        response = make_response(response)
+        response.set_cookie(
+            "view_cookie",
+            user_cookie,
+            max_age=60 * 60 * 24 * 365 * 2,
         )
+    return response
+
+
+def _parse_page_args(jsonl=False):
+    """``offset``/``limit`` of a view request.
+
+    Pages are capped at ``VIEW_MAX_LIMIT`` rows. A jsonl stream is not held in
+    memory, so it has no cap and runs to the end of the file when ``limit``
+    is left out (returned as ``None``).
+    """
+    offset = request.args.get("offset", 0, type=int)
+    limit = request.args.get("limit", None if jsonl else VIEW_DEFAULT_LIMIT, type=int)
+    if offset < 0 or (limit is not None and limit < 1):
+        raise ValueError("offset must be >= 0 and limit must be >= 1")
+    if jsonl:
+        return offset, limit
+    return offset, min(limit, VIEW_MAX_LIMIT)
+
+
+def _paged_view(file_path, offset, limit):
+    row_index = CSVRowIndex(file_path)
+    row_index.ensure()
+    text, rows = row_index.page(offset, limit)
+    total_rows = row_index.data_row_count
+    next_offset = offset + len(rows)
+    return jsonify(
+        {
+            "success": True,
+            "content": row_index.read_rows_text(0, 1) + text,
+            "header": row_index.header(),
+            "rows": rows,
+            "offset": offset,
+            "limit": limit,
+            "total_rows": total_rows,
+            "next_offset": next_offset if next_offset < total_rows else None,
+        }
     )
-    resp.set_cookie("file_download_cookie", user_cookie)
 
-    return resp
+
+def _jsonl_view(file_path, offset, limit):
+    row_index = CSVRowIndex(file_path)
+    row_index.ensure()
+
+    def generate():
+        for record in row_index.iter_records(offset, limit):
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
 
 
 @hubfile_bp.route("/file/view/<int:file_id>", methods=["GET"])
@@ -61,42 +249,29 @@ def view_file(file_id):
     file_path = HubfileService().get_path_by_hubfile(file)
 
     try:
-        if os.path.exists(file_path):
-            with open(file_path, "r", encoding="utf-8", errors="replace") as f:
-                content = f.read()
-
-            user_cookie = request.cookies.get("view_cookie")
-            if not user_cookie:
-                user_cookie = str(uuid.uuid4())
-
-            uid = current_user.id if current_user.is_authenticated else None
-            existing_record = HubfileViewRecord.query.filter_by(
-                user_id=uid,
-                file_id=file_id,
-                view_cookie=user_cookie,
-            ).first()
-
-            if not existing_record:
-                new_view_record = HubfileViewRecord(
-                    user_id=uid,
-                    file_id=file_id,
-                    view_date=datetime.now(),
-                    view_cookie=user_cookie,
-                )
-                db.session.add(new_view_record)
-                db.session.commit()
-
-            response = jsonify({"success": True, "content": content})
-            if not request.cookies.get("view_cookie"):
-                response = make_response(response)
-                response.set_cookie(
-                    "view_cookie",
-                    user_cookie,
-                    max_age=60 * 60 * 24 * 365 * 2,
-                )
-
-            return response
-        else:
+        if not os.path.exists(file_path):
             return jsonify({"success": False, "error": "File not found"}), 404
+
+        jsonl = request.args.get("format") == "jsonl"
+        try:
+            offset, limit = _parse_page_args(jsonl=jsonl)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        if jsonl:
+            response = _jsonl_view(file_path, offset, limit)
+        else:
+            response = _paged_view(file_path, offset, limit)
+
+        user_cookie = _register_view(file_id)
+        return _with_view_cookie(response, user_cookie)
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
+
+
+@hubfile_bp.route("/file/cache/stats", methods=["GET"])
+@login_required
+def cache_stats():
+    """Hit/miss counters of this process's local copy cache of S3-backed files."""
+    if current_user.role != UserRole.ADMIN:
+        abort(403)
+    return jsonify({"uses_s3": storage_service.uses_s3(), **file_cache.stats()})
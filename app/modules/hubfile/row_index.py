@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import csv
+import io
+import os
+import struct
+from array import array
+from typing import Iterator, List, Tuple
+
+INDEX_SUFFIX = ".rowidx"
+READ_CHUNK_SIZE = 1024 * 1024
+
+_MAGIC = b"RIX1"
+_HEADER = struct.Struct("<4sQQ")
+_OFFSET = struct.Struct("<Q")
+
+
+class CSVRowIndex:
+    """Byte offsets of every row of a CSV file, persisted next to it as ``<file>.rowidx``.
+
+    The index is a fixed-width array, so locating rows ``[offset, offset + limit)``
+    costs two small reads regardless of the file size. Row boundaries honour
+    quoted fields that span several lines. Row 0 is the CSV header.
+    """
+
+    def __init__(self, csv_path: str) -> None:
+        self.csv_path = csv_path
+        self.index_path = csv_path + INDEX_SUFFIX
+        self._row_count = None
+
+    @property
+    def row_count(self) -> int:
+        """Total rows in the file, header included."""
+        if self._row_count is None:
+            self.ensure()
+        return self._row_count
+
+    @property
+    def data_row_count(self) -> int:
+        return max(self.row_count - 1, 0)
+
+    def ensure(self) -> None:
+        """Build the index unless an up-to-date one already exists."""
+        source_size = os.path.getsize(self.csv_path)
+        try:
+            with open(self.index_path, "rb") as handler:
+                magic, indexed_size, row_count = _HEADER.unpack(handler.read(_HEADER.size))
+            if magic == _MAGIC and indexed_size == source_size:
+                self._row_count = row_count
+                return
+        except (OSError, struct.error):
+            pass
+        self.build()
+
+    def build(self) -> None:
+        """Scan the file once and write the offsets of every row boundary."""
+        offsets = array("Q", [0])
+        position = 0
+        quotes = 0
+        with open(self.csv_path, "rb") as source:
+            while True:
+                chunk = source.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                start = 0
+                while True:
+                    newline = chunk.find(b"\n", start)
+                    if newline == -1:
+                        quotes += chunk.count(b'"', start)
+                        break
+                    quotes += chunk.count(b'"', start, newline)
+                    if quotes % 2 == 0:
+                        offsets.append(position + newline + 1)
+                        quotes = 0
+                    start = newline + 1
+                position += len(chunk)
+
+        if offsets[-1] != position:
+            offsets.append(position)
+        row_count = len(offsets) - 1
+
+        partial_path = f"{self.index_path}.{os.getpid()}.part"
+        with open(partial_path, "wb") as handler:
+            handler.write(_HEADER.pack(_MAGIC, position, row_count))
+            offsets.tofile(handler)
+        os.replace(partial_path, self.index_path)
+        self._row_count = row_count
+
+    def _row_span(self, first: int, last: int) -> Tuple[int, int]:
+        """Byte span covering rows ``[first, last)``."""
+        with open(self.index_path, "rb") as handler:
+            handler.seek(_HEADER.size + first * _OFFSET.size)
+            (start,) = _OFFSET.unpack(handler.read(_OFFSET.size))
+            handler.seek(_HEADER.size + last * _OFFSET.size)
+            (stop,) = _OFFSET.unpack(handler.read(_OFFSET.size))
+        return start, stop
+
+    def read_rows_text(self, first: int, last: int) -> str:
+        """Raw text of rows ``[first, last)``, clamped to the file."""
+        first = max(0, min(first, self.row_count))
+        last = max(first, min(last, self.row_count))
+        if first == last:
+            return ""
+        start, stop = self._row_span(first, last)
+        with open(self.csv_path, "rb") as source:
+            source.seek(start)
+            return source.read(stop - start).decode("utf-8", errors="replace")
+
+    def header(self) -> List[str]:
+        return next(csv.reader(io.StringIO(self.read_rows_text(0, 1))), [])
+
+    def page(self, offset: int, limit: int) -> Tuple[str, List[List[str]]]:
+        """Raw text and parsed cells of ``limit`` data rows starting at ``offset``."""
+        text = self.read_rows_text(offset + 1, offset + 1 + limit)
+        return text, list(csv.reader(io.StringIO(text)))
+
+    def iter_records(self, offset: int = 0, limit: int | None = None) -> Iterator[dict]:
+        """Stream data rows from ``offset`` as header-keyed dicts without loading the file."""
+        header = self.header()
+        first = max(0, min(offset + 1, self.row_count))
+        if first >= self.row_count:
+            return
+        start, _ = self._row_span(first, first)
+        with open(self.csv_path, "rb") as source:
+            source.seek(start)
+            text = io.TextIOWrapper(source, encoding="utf-8", errors="replace", newline="")
+            for emitted, row in enumerate(csv.reader(text)):
+                if limit is not None and emitted >= limit:
+                    break
+                yield dict(zip(header, row))
@@ -1,13 +1,22 @@
+import logging
+import os
+from typing import Iterable, List, Tuple
+
+from sqlalchemy.exc import IntegrityError, OperationalError
+
 from app.modules.auth.models import User
 from app.modules.dataset.models import DataSet
-from app.modules.hubfile.models import Hubfile
+from app.modules.hubfile.models import Blob, Hubfile
 from app.modules.hubfile.repositories import (
+    BlobRepository,
     HubfileDownloadRecordRepository,
     HubfileRepository,
     HubfileViewRecordRepository,
 )
 from core.services.BaseService import BaseService
-from core.storage import storage_service
+from core.storage import file_cache, storage_service
+
+logger = logging.getLogger(__name__)
 
 
 class HubfileService(BaseService):
@@ -23,6 +32,8 @@ class HubfileService(BaseService):
         return self.repository.get_dataset_by_hubfile(hubfile)
 
     def _relative_path(self, hubfile: Hubfile) -> str:
+        if hubfile.storage_key:
+            return hubfile.storage_key
         hubfile_user = self.get_owner_user_by_hubfile(hubfile)
         hubfile_dataset = self.get_dataset_by_hubfile(hubfile)
         return storage_service.dataset_file_path(
@@ -33,7 +44,7 @@ class HubfileService(BaseService):
 
     def get_path_by_hubfile(self, hubfile: Hubfile) -> str:
         relative_path = self._relative_path(hubfile)
-        return storage_service.ensure_local_copy(relative_path)
+        return file_cache.path_for(relative_path, hubfile.checksum)
 
     def get_relative_path_by_hubfile(self, hubfile: Hubfile) -> str:
         return self._relative_path(hubfile)
@@ -41,6 +52,10 @@ class HubfileService(BaseService):
     def total_hubfile_views(self) -> int:
         return self.hubfile_view_record_repository.total_hubfile_views()
 
+    def register_view(self, file_id: int, user_id, user_cookie: str) -> None:
+        if not self.hubfile_view_record_repository.the_record_exists(file_id, user_id, user_cookie):
+            self.hubfile_view_record_repository.create_new_record(file_id, user_id, user_cookie)
+
     def total_hubfile_downloads(self) -> int:
         hubfile_download_record_repository = HubfileDownloadRecordRepository()
         return hubfile_download_record_repository.total_hubfile_downloads()
@@ -57,3 +72,96 @@ class HubfileDownloadRecordService(BaseService):
 
         hubfile.download_count = (hubfile.download_count or 0) + 1
         return hubfile.download_count
+
+    def record_download(self, file_id: int, user_id, user_cookie: str) -> None:
+        self.repository.record_download(file_id, user_id, user_cookie)
+
+
+class BlobService(BaseService):
+    """Content-addressed storage of dataset files, used when ``STORAGE_DEDUP`` is on.
+
+    Each distinct content is stored once under ``blobs/<aa>/<sha256>``. Every
+    Hubfile with that checksum points at it through ``storage_key`` and holds
+    one reference. Counts only change under the blob's row lock. The last
+    release deletes the object before the row, so a concurrent ``store``
+    either finds the row, and with it the object, or stores the object again.
+    """
+
+    ATTEMPTS = 3
+
+    def __init__(self):
+        super().__init__(BlobRepository())
+
+    def store(self, files: Iterable[Tuple[Hubfile, str]], remove_source: bool = True) -> None:
+        """Point each ``(hubfile, src_path)`` at the blob for its content, uploading only unknown content."""
+        files = [(hubfile, src_path) for hubfile, src_path in files if not hubfile.storage_key]
+        if not files:
+            return
+
+        # new content is uploaded up front, in parallel and outside any lock; uploads are idempotent
+        known = self.repository.existing(hubfile.checksum for hubfile, _ in files)
+        missing = {}
+        for hubfile, src_path in files:
+            if hubfile.checksum not in known:
+                missing.setdefault(hubfile.checksum, src_path)
+        storage_service.save_many(
+            [(src_path, storage_service.blob_path(checksum)) for checksum, src_path in missing.items()],
+            remove_source=False,
+        )
+
+        for attempt in range(1, self.ATTEMPTS + 1):
+            try:
+                self._reference(files)
+                break
+            except (IntegrityError, OperationalError):
+                # another upload created the same blob row first, or the locks deadlocked
+                self.repository.session.rollback()
+                if attempt == self.ATTEMPTS:
+                    raise
+
+        if remove_source:
+            for _, src_path in files:
+                if os.path.exists(src_path):
+                    os.remove(src_path)
+
+    def _reference(self, files: List[Tuple[Hubfile, str]]) -> None:
+        for hubfile, src_path in files:
+            key = storage_service.blob_path(hubfile.checksum)
+            blob = self.repository.locked(hubfile.checksum)
+            if blob is None:
+                # with no row nobody can be deleting the object, so checking for it here is reliable
+                if not storage_service.exists(key):
+                    storage_service.save_local_file(src_path, key, remove_source=False)
+                blob = Blob(checksum=hubfile.checksum, size=hubfile.size, ref_count=0)
+                self.repository.session.add(blob)
+            blob.ref_count += 1
+            hubfile.storage_key = key
+            self.repository.session.flush()
+        self.repository.session.commit()
+
+    def release(self, storage_keys: Iterable[str], commit: bool = True) -> None:
+        """Drop one reference per key (once the Hubfiles are gone); unreferenced blobs are deleted.
+
+        With ``commit=False`` the counts change in the caller's transaction and
+        errors propagate, so the references go together with the rows the
+        caller deletes, or stay if it rolls back.
+        """
+        for key in storage_keys:
+            if not commit:
+                self._release(key)
+                continue
+            try:
+                self._release(key)
+                self.repository.session.commit()
+            except Exception:
+                logger.exception("Could not release blob %s", key)
+                self.repository.session.rollback()
+
+    def _release(self, key: str) -> None:
+        blob = self.repository.locked(os.path.basename(key))
+        if blob is None:
+            return
+        blob.ref_count -= 1
+        if blob.ref_count <= 0:
+            storage_service.delete_file(key)
+            self.repository.session.delete(blob)
@@ -1,16 +1,28 @@
 import hashlib
+import io
+import json
 import os
 import uuid
 from contextlib import contextmanager
+from types import SimpleNamespace
 
 import pytest
+import zstandard
+from botocore.exceptions import ClientError
+from flask import g
 
 from app import db
-from app.modules.auth.models import User
+from app.modules.auth.models import User, UserRole
+from app.modules.dataset import routes as dataset_routes
 from app.modules.dataset.models import DataCategory, DataSet, DSMetaData
-from app.modules.datasetfile.models import DatasetFile
-from app.modules.hubfile.models import Hubfile, HubfileDownloadRecord, HubfileViewRecord
+from app.modules.dataset.services import DataSetService
+from app.modules.datasetfile.models import DatasetFile, DatasetFileMetaData
+from app.modules.hubfile import routes as hubfile_routes
+from app.modules.hubfile import services as hubfile_services
+from app.modules.hubfile.models import Blob, Hubfile, HubfileDownloadRecord, HubfileViewRecord
 from app.modules.hubfile.services import HubfileService
+from core.events import EventBuffer, event_buffer
+from core.storage import LocalFileCache, StorageService, storage_service
 
 DOWNLOAD_URL = "/file/download/{id}"
 VIEW_URL = "/file/view/{id}"
@@ -22,7 +34,12 @@ def force_login(test_client, user):
     with test_client.session_transaction() as sess:
         sess["_user_id"] = str(user.id)
         sess["_fresh"] = True
+    # requests share the fixture's app context, where flask-login caches the user it resolved last
+    g.pop("_login_user", None)
     yield
+    with test_client.session_transaction() as sess:
+        sess.pop("_user_id", None)
+    g.pop("_login_user", None)
 
 
 def _patch_storage_to_tmp(monkeypatch, tmp_path):
@@ -196,6 +213,344 @@ def test_download_failure_cases(test_client, monkeypatch, tmp_path, clean_databa
     assert recs == []
 
 
+def test_download_supports_ranges_and_etag(test_client, monkeypatch, tmp_path, clean_database, feature_model):
+    _patch_storage_to_tmp(monkeypatch, tmp_path)
+
+    content = b"0123456789abcdefghij"
+    hubfile = _create_valid_hubfile(feature_model, f"{uuid.uuid4()}.csv", content)
+    _write_disk_file_for(hubfile, content)
+    url = DOWNLOAD_URL.format(id=hubfile.id)
+
+    full = test_client.get(url)
+    assert full.status_code == 200
+    assert full.headers["ETag"] == f'"{hubfile.checksum}"'
+    assert full.headers["Accept-Ranges"] == "bytes"
+
+    partial = test_client.get(url, headers={"Range": "bytes=5-9"})
+    assert partial.status_code == 206
+    assert partial.data == b"56789"
+    assert partial.headers["Content-Range"] == f"bytes 5-9/{len(content)}"
+
+    not_modified = test_client.get(url, headers={"If-None-Match": f'"{hubfile.checksum}"'})
+    assert not_modified.status_code == 304
+    assert not_modified.data == b""
+
+    # Only the full download counts; the resumed range and the revalidation do not
+    db.session.expire_all()
+    assert HubfileDownloadRecord.query.filter_by(file_id=hubfile.id).count() == 1
+
+
+class _FakeS3Body:
+    def __init__(self, data):
+        self._data = data
+
+    def read(self, size=-1):
+        if size < 0:
+            size = len(self._data)
+        chunk, self._data = self._data[:size], self._data[size:]
+        return chunk
+
+    def close(self):
+        pass
+
+
+class _FakeS3Client:
+    def __init__(self, objects):
+        self.objects = objects
+        self.ranges = []
+        self.downloads = []
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {"ContentLength": len(self.objects[Key])}
+
+    def download_file(self, Bucket, Key, Filename, Config=None):
+        self.downloads.append(Key)
+        with open(Filename, "wb") as handler:
+            handler.write(self.objects[Key])
+
+    def get_object(self, Bucket, Key, Range=None):
+        data = self.objects[Key]
+        if Range:
+            self.ranges.append(Range)
+            first, last = Range[len("bytes=") :].split("-")
+            data = data[int(first) : int(last) + 1]
+        return {"Body": _FakeS3Body(data)}
+
+
+def test_download_streams_ranges_from_s3(test_client, monkeypatch, clean_database, feature_model):
+    content = b"remote hubfile payload"
+    hubfile = _create_valid_hubfile(feature_model, f"{uuid.uuid4()}.csv", content)
+
+    storage = StorageService()
+    relative_path = HubfileService().get_relative_path_by_hubfile(hubfile)
+    client = _FakeS3Client({storage._s3_key(relative_path): content})
+    monkeypatch.setattr(storage, "_use_s3", True)
+    monkeypatch.setattr(storage, "_s3_client", client)
+    monkeypatch.setattr(hubfile_routes, "storage_service", storage)
+
+    def fail_local_copy(self, hubfile):
+        raise AssertionError("S3 downloads must not be copied to local disk")
+
+    monkeypatch.setattr(HubfileService, "get_path_by_hubfile", fail_local_copy)
+    url = DOWNLOAD_URL.format(id=hubfile.id)
+
+    r = test_client.get(url, headers={"Range": "bytes=7-"})
+    assert r.status_code == 206
+    assert r.data == content[7:]
+    assert r.headers["Content-Range"] == f"bytes 7-{len(content) - 1}/{len(content)}"
+    assert client.ranges == [f"bytes=7-{len(content) - 1}"]
+
+    assert test_client.get(url, headers={"If-None-Match": f'"{hubfile.checksum}"'}).status_code == 304
+    assert test_client.get(url, headers={"Range": "bytes=500-"}).status_code == 416
+
+    full = test_client.get(url)
+    assert full.status_code == 200
+    assert full.data == content
+
+    client.objects.clear()
+    missing = test_client.get(url)
+    assert missing.status_code == 404
+    assert missing.get_json()["error"] == "File not found on disk"
+
+
+def test_download_sends_compressed_files_as_stored_when_the_client_accepts_zstd(
+    test_client, monkeypatch, tmp_path, clean_database, feature_model
+):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    monkeypatch.setenv("STORAGE_COMPRESSION", "zstd")
+    content = b"appid,name\n" + b"".join(b"%d,Game %d\n" % (i, i) for i in range(500))
+    hubfile = _create_valid_hubfile(feature_model, f"{uuid.uuid4()}.csv", content)
+    storage = StorageService()
+    src = tmp_path / "upload.csv"
+    src.write_bytes(content)
+    storage.save_local_file(str(src), HubfileService().get_relative_path_by_hubfile(hubfile))
+    cache = LocalFileCache(storage=storage, directory=str(tmp_path / "cache"))
+    monkeypatch.setattr(hubfile_routes, "storage_service", storage)
+    monkeypatch.setattr(hubfile_services, "file_cache", cache)
+    url = DOWNLOAD_URL.format(id=hubfile.id)
+
+    raw = test_client.get(url, headers={"Accept-Encoding": "gzip, br, zstd"})
+    assert raw.status_code == 200
+    assert raw.headers["Content-Encoding"] == "zstd"
+    assert "Accept-Encoding" in raw.headers["Vary"]
+    assert len(raw.data) < len(content)
+    assert zstandard.ZstdDecompressor().stream_reader(io.BytesIO(raw.data), read_across_frames=True).read() == content
+    etag = f'"{hubfile.checksum}-zstd"'
+    assert raw.headers["ETag"] == etag
+    assert test_client.get(url, headers={"Accept-Encoding": "zstd", "If-None-Match": etag}).status_code == 304
+
+    plain = test_client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert plain.status_code == 200
+    assert "Content-Encoding" not in plain.headers
+    assert plain.data == content
+    assert "Accept-Encoding" in plain.headers["Vary"]
+
+    # ranges always address the original bytes
+    partial = test_client.get(url, headers={"Accept-Encoding": "zstd", "Range": "bytes=11-"})
+    assert partial.status_code == 206
+    assert partial.data == content[11:]
+
+
+def test_view_reads_s3_files_through_the_local_cache(
+    test_client, monkeypatch, tmp_path, clean_database, feature_model, user
+):
+    content = b"appid,name\n1,Game\n"
+    hubfile = _create_valid_hubfile(feature_model, f"{uuid.uuid4()}.csv", content)
+
+    storage = StorageService()
+    relative_path = HubfileService().get_relative_path_by_hubfile(hubfile)
+    client = _FakeS3Client({storage._s3_key(relative_path): content})
+    monkeypatch.setattr(storage, "_use_s3", True)
+    monkeypatch.setattr(storage, "_s3_client", client)
+    cache = LocalFileCache(storage=storage, max_bytes=1024, directory=str(tmp_path / "cache"))
+    monkeypatch.setattr(hubfile_services, "file_cache", cache)
+    monkeypatch.setattr(hubfile_routes, "file_cache", cache)
+
+    for _ in range(3):
+        r = test_client.get(VIEW_URL.format(id=hubfile.id))
+        assert r.status_code == 200
+        assert r.get_json()["content"] == content.decode("utf-8")
+    assert client.downloads == [storage._s3_key(relative_path)]
+
+    with force_login(test_client, user):
+        assert test_client.get("/file/cache/stats").status_code == 403
+        user.role = UserRole.ADMIN
+        db.session.commit()
+        g.pop("_login_user", None)
+        stats = test_client.get("/file/cache/stats").get_json()
+    assert stats["uses_s3"] is False  # the app's own storage service is still local
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 1, 1)
+
+
+def _draft_with_file(owner, source_dir, name: str, content: bytes) -> DataSet:
+    ds = make_dataset(owner)
+    ds.draft_mode = True
+    metadata = DatasetFileMetaData(csv_filename=name, title=name, description="d", data_category=DataCategory.GENERAL)
+    dataset_file = DatasetFile(data_set_id=ds.id, file_metadata=metadata)
+    db.session.add(dataset_file)
+    db.session.flush()
+    db.session.add(
+        Hubfile(
+            name=name,
+            checksum=hashlib.sha256(content).hexdigest(),
+            size=len(content),
+            dataset_file_id=dataset_file.id,
+        )
+    )
+    db.session.commit()
+    (source_dir / name).write_bytes(content)
+    return ds
+
+
+def test_dedup_stores_identical_content_once_and_counts_references(
+    test_client, monkeypatch, tmp_path, clean_database, user
+):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    monkeypatch.setattr(storage_service, "_dedup", True)
+    source_dir = tmp_path / "temp"
+    source_dir.mkdir()
+    content = b"appid,name\n1,Game\n"
+    checksum = hashlib.sha256(content).hexdigest()
+    service = DataSetService()
+
+    first = _draft_with_file(user, source_dir, "games.csv", content)
+    service.move_dataset_files(first, source_dir=str(source_dir))
+    second = _draft_with_file(user, source_dir, "games_v2.csv", content)
+    service.move_dataset_files(second, source_dir=str(source_dir))
+    service.move_dataset_files(second, source_dir=str(source_dir))  # a retry references nothing twice
+
+    blob_path = tmp_path / "uploads" / "blobs" / checksum[:2] / checksum
+    assert blob_path.read_bytes() == content
+    assert os.listdir(source_dir) == []
+    assert not (tmp_path / "uploads" / f"user_{user.id}").exists()
+    assert db.session.get(Blob, checksum).ref_count == 2
+
+    hubfile = second.files()[0]
+    assert hubfile.storage_key == f"blobs/{checksum[:2]}/{checksum}"
+    assert HubfileService().get_path_by_hubfile(hubfile) == str(blob_path)
+    assert [entry[1:] for entry in dataset_routes._dataset_zip_entries(second)] == [(hubfile.storage_key, checksum)]
+    # editing copies the blob back under the file's own name
+    dataset_routes._copy_stored_files(second, str(tmp_path / "edit"))
+    assert (tmp_path / "edit" / "games_v2.csv").read_bytes() == content
+
+    service.delete_draft_dataset(first)
+    assert db.session.get(Blob, checksum).ref_count == 1
+    assert blob_path.exists()
+
+    service.delete_draft_dataset(second)
+    assert db.session.get(Blob, checksum) is None
+    assert not blob_path.exists()
+
+
+def test_drafts_store_their_files_through_the_blob_store(test_client, monkeypatch, tmp_path, clean_database, user):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    monkeypatch.setattr(storage_service, "_dedup", True)
+    source_dir = tmp_path / "temp"
+    source_dir.mkdir()
+    content = b"appid,name\n3,Draft\n"
+    checksum = hashlib.sha256(content).hexdigest()
+    service = DataSetService()
+    published = _draft_with_file(user, source_dir, "a.csv", content)
+    service.move_dataset_files(published, source_dir=str(source_dir))
+
+    (source_dir / "a_copy.csv").write_bytes(content)
+    author = SimpleNamespace(id=user.id, temp_folder=lambda: str(source_dir))
+    author.profile = SimpleNamespace(surname="S", name="N", affiliation="A", orcid="O")
+    draft = service.create_draft(author, {"title": "Edited"})
+
+    hubfile = draft.files()[0]
+    assert (hubfile.name, hubfile.storage_key) == ("a_copy.csv", f"blobs/{checksum[:2]}/{checksum}")
+    assert db.session.get(Blob, checksum).ref_count == 2
+    assert os.listdir(source_dir) == []
+    assert not (tmp_path / "uploads" / f"user_{user.id}").exists()
+
+
+def test_deleting_a_deduplicated_file_releases_its_blob(test_client, monkeypatch, tmp_path, clean_database, user):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    monkeypatch.setattr(storage_service, "_dedup", True)
+    source_dir = tmp_path / "temp"
+    source_dir.mkdir()
+    content = b"appid,name\n2,Other\n"
+    checksum = hashlib.sha256(content).hexdigest()
+    service = DataSetService()
+    first = _draft_with_file(user, source_dir, "a.csv", content)
+    service.move_dataset_files(first, source_dir=str(source_dir))
+    second = _draft_with_file(user, source_dir, "b.csv", content)
+    service.move_dataset_files(second, source_dir=str(source_dir))
+    blob_path = tmp_path / "uploads" / "blobs" / checksum[:2] / checksum
+
+    assert service.delete_dataset_file(second, "missing.csv") is False
+    assert service.delete_dataset_file(second, "b.csv") is True
+    assert second.files() == []
+    assert db.session.get(Blob, checksum).ref_count == 1
+    assert blob_path.exists()
+
+    assert service.delete_dataset_file(first, "a.csv") is True
+    assert db.session.get(Blob, checksum) is None
+    assert not blob_path.exists()
+
+
+def test_download_and_view_records_are_buffered(test_client, monkeypatch, tmp_path, clean_database, feature_model):
+    _patch_storage_to_tmp(monkeypatch, tmp_path)
+    monkeypatch.setitem(test_client.application.config, "EVENT_BUFFER_ENABLED", True)
+    monkeypatch.setitem(test_client.application.config, "EVENT_BUFFER_MAX_EVENTS", 1000)
+    monkeypatch.setitem(test_client.application.config, "EVENT_BUFFER_MAX_DELAY", 3600)
+
+    content = b"appid\n1\n"
+    hubfile = _create_valid_hubfile(feature_model, f"{uuid.uuid4()}.csv", content)
+    _write_disk_file_for(hubfile, content)
+
+    assert test_client.get(DOWNLOAD_URL.format(id=hubfile.id)).status_code == 200
+    assert test_client.get(DOWNLOAD_URL.format(id=hubfile.id)).status_code == 200
+    test_client.set_cookie("view_cookie", "buffered-cookie")
+    assert test_client.get(VIEW_URL.format(id=hubfile.id)).status_code == 200
+    assert test_client.get(VIEW_URL.format(id=hubfile.id)).status_code == 200
+
+    # Nothing reaches the database until the buffer is flushed; the repeated view is deduplicated in memory
+    db.session.expire_all()
+    assert HubfileDownloadRecord.query.filter_by(file_id=hubfile.id).count() == 0
+    assert event_buffer.pending_count() == 5
+
+    with test_client.application.app_context():
+        assert event_buffer.flush() == 5
+
+    db.session.expire_all()
+    assert HubfileDownloadRecord.query.filter_by(file_id=hubfile.id).count() == 2
+    assert HubfileViewRecord.query.filter_by(file_id=hubfile.id, view_cookie="buffered-cookie").count() == 1
+    assert db.session.get(Hubfile, hubfile.id).download_count == 2
+
+    # The size threshold flushes from the request itself
+    monkeypatch.setitem(test_client.application.config, "EVENT_BUFFER_MAX_EVENTS", 2)
+    assert test_client.get(DOWNLOAD_URL.format(id=hubfile.id)).status_code == 200
+    assert event_buffer.pending_count() == 0
+    db.session.expire_all()
+    assert HubfileDownloadRecord.query.filter_by(file_id=hubfile.id).count() == 3
+    test_client.delete_cookie("view_cookie")
+
+
+def test_event_buffer_wakes_its_worker_for_each_new_batch(test_client, monkeypatch):
+    monkeypatch.setitem(test_client.application.config, "EVENT_BUFFER_ENABLED", True)
+    monkeypatch.setitem(test_client.application.config, "EVENT_BUFFER_MAX_EVENTS", 1000)
+    buffer = EventBuffer()
+    buffer._worker = SimpleNamespace()  # keep the background thread out of the test
+
+    with test_client.application.app_context():
+        buffer.increment(Hubfile, "download_count", -1)
+        assert buffer._wake.is_set()
+
+        # Later events join the batch the worker is already timing
+        buffer._wake.clear()
+        buffer.increment(Hubfile, "download_count", -1)
+        assert not buffer._wake.is_set()
+
+        monkeypatch.setitem(test_client.application.config, "EVENT_BUFFER_MAX_EVENTS", 3)
+        buffer.increment(Hubfile, "download_count", -1)
+        assert buffer.pending_count() == 0
+        assert buffer._wake.is_set()
+
+
 # ---------------------------
 # VIEW endpoint tests
 # ---------------------------
@@ -264,6 +619,50 @@ def test_view_cookie_and_records(test_client, monkeypatch, tmp_path, clean_datab
     assert len(recs_total) == 2
 
 
+def test_view_pages_and_streams_csv_rows(test_client, monkeypatch, tmp_path, clean_database, feature_model):
+    _patch_storage_to_tmp(monkeypatch, tmp_path)
+
+    text = "appid,name\n" + "".join(f"{i},game {i}\n" for i in range(25))
+    hubfile = _create_valid_hubfile(feature_model, f"{uuid.uuid4()}.csv", text.encode("utf-8"))
+    _write_disk_text_for(hubfile, text)
+    url = VIEW_URL.format(id=hubfile.id)
+
+    page = test_client.get(url, query_string={"offset": 10, "limit": 5}).get_json()
+    assert page["success"] is True
+    assert page["header"] == ["appid", "name"]
+    assert page["rows"] == [[str(i), f"game {i}"] for i in range(10, 15)]
+    assert page["content"] == "appid,name\n" + "".join(f"{i},game {i}\n" for i in range(10, 15))
+    assert page["total_rows"] == 25
+    assert page["next_offset"] == 15
+
+    last = test_client.get(url, query_string={"offset": 20, "limit": 10}).get_json()
+    assert len(last["rows"]) == 5
+    assert last["next_offset"] is None
+
+    assert test_client.get(url, query_string={"offset": -1}).status_code == 400
+
+    stream = test_client.get(url, query_string={"format": "jsonl", "offset": 23})
+    assert stream.status_code == 200
+    assert stream.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in stream.data.decode("utf-8").splitlines()]
+    assert lines == [{"appid": "23", "name": "game 23"}, {"appid": "24", "name": "game 24"}]
+
+    limited = test_client.get(url, query_string={"format": "jsonl", "offset": 3, "limit": 2})
+    assert [json.loads(line)["appid"] for line in limited.data.decode("utf-8").splitlines()] == ["3", "4"]
+    assert test_client.get(url, query_string={"format": "jsonl", "limit": -1}).status_code == 400
+    assert test_client.get(url, query_string={"format": "jsonl", "limit": 0}).status_code == 400
+
+    # Without paging arguments only the first page is read
+    monkeypatch.setattr(hubfile_routes, "VIEW_DEFAULT_LIMIT", 4)
+    first = test_client.get(url).get_json()
+    assert first["rows"] == [[str(i), f"game {i}"] for i in range(4)]
+    assert first["next_offset"] == 4
+
+    # All requests above share the same cookie, so only one view is recorded
+    db.session.expire_all()
+    assert HubfileViewRecord.query.filter_by(file_id=hubfile.id).count() == 1
+
+
 def test_view_failure_cases(test_client, monkeypatch, tmp_path, clean_database, feature_model):
     _patch_storage_to_tmp(monkeypatch, tmp_path)
 
@@ -4,6 +4,7 @@ from app import db
 from app.modules.dataset.models import DataCategory, DataSet, DSMetaData
 from app.modules.datasetfile.models import DatasetFile, DatasetFileMetaData
 from app.modules.hubfile.models import Hubfile
+from app.modules.hubfile.row_index import CSVRowIndex
 from app.modules.hubfile.services import HubfileDownloadRecordService
 
 
@@ -98,3 +99,41 @@ def test_download_count_increments(test_client):
             db.session.query(DataSet).delete()
             db.session.query(DSMetaData).delete()
             db.session.commit()
+
+
+def test_csv_row_index_pages_rows_with_multiline_fields(tmp_path):
+    csv_path = tmp_path / "games.csv"
+    csv_path.write_bytes(b'appid,name\r\n1,"Half\nLife"\r\n2,"Portal ""2"""\r\n3,Dota\r\n4,Celeste')
+
+    index = CSVRowIndex(str(csv_path))
+    index.ensure()
+
+    assert index.data_row_count == 4
+    assert index.header() == ["appid", "name"]
+    text, rows = index.page(0, 2)
+    assert rows == [["1", "Half\nLife"], ["2", 'Portal "2"']]
+    assert text.startswith("1,")
+    assert index.page(3, 10)[1] == [["4", "Celeste"]]
+    assert index.page(10, 10)[1] == []
+    assert list(index.iter_records(2)) == [{"appid": "3", "name": "Dota"}, {"appid": "4", "name": "Celeste"}]
+
+
+def test_csv_row_index_is_reused_until_the_file_changes(tmp_path, monkeypatch):
+    csv_path = tmp_path / "games.csv"
+    csv_path.write_text("appid\n1\n2\n")
+
+    CSVRowIndex(str(csv_path)).ensure()
+    assert (tmp_path / "games.csv.rowidx").exists()
+
+    builds = []
+    original_build = CSVRowIndex.build
+    monkeypatch.setattr(CSVRowIndex, "build", lambda self: builds.append(1) or original_build(self))
+
+    CSVRowIndex(str(csv_path)).ensure()
+    assert builds == []
+
+    csv_path.write_text("appid\n1\n2\n3\n")
+    index = CSVRowIndex(str(csv_path))
+    index.ensure()
+    assert builds == [1]
+    assert index.data_row_count == 3
@@ -6,7 +6,10 @@ from typing import Optional
 from app import db
 from app.modules.auth.models import User
 from app.modules.community.models import Community, CommunityDatasetProposal, ProposalStatus
+from app.modules.dataset.counters import rebuild_counters
 from app.modules.dataset.models import (
+    ActivityCounter,
+    ActivityDailyCounter,
     Author,
     DataCategory,
     DataSet,
@@ -14,7 +17,9 @@ from app.modules.dataset.models import (
     DSMetaData,
     DSViewRecord,
 )
+from app.modules.dataset.repositories import ActivityCounterRepository
 from app.modules.dataset.services import DataSetService
+from app.modules.dataset.trending import trending_leaderboard
 
 
 class _FakeSendGridAPIClient:
@@ -240,3 +245,149 @@ def test_trending_datasets_api_returns_expected_payload(test_client, clean_datab
     assert second["first_author"] == ds_second_author
     assert second["community_name"] == ""
     assert second["metric"] == 1
+
+
+def test_counters_follow_record_inserts_deletes_and_rebuild(test_client, clean_database):
+    with test_client.application.app_context():
+        owner = _create_user("counters-owner@example.com")
+        ds_one = _create_dataset(owner, "Counter One")
+        ds_two = _create_dataset(owner, "Counter Two")
+
+        now = datetime.utcnow()
+        _add_views(ds_one, 3, base_time=now)
+        _add_views(ds_two, 1, base_time=now)
+        _add_downloads(ds_one, 2, base_time=now)
+        db.session.commit()
+
+        svc = DataSetService()
+        assert svc.total_dataset_views() == 4
+        assert svc.total_dataset_downloads() == 2
+        counters = svc.activitycounter_repository
+        assert counters.totals_for("dataset", "views", [ds_one.id, ds_two.id]) == {ds_one.id: 3, ds_two.id: 1}
+        daily_total = (
+            db.session.query(db.func.sum(ActivityDailyCounter.total))
+            .filter_by(scope="dataset", subject_id=ds_one.id, metric="views")
+            .scalar()
+        )
+        assert daily_total == 3
+
+        # ORM deletes are subtracted right away
+        db.session.delete(DSViewRecord.query.filter_by(dataset_id=ds_one.id).first())
+        db.session.commit()
+        assert svc.total_dataset_views() == 3
+        assert counters.total("dataset", "views", ds_one.id) == 2
+
+        # Bulk deletes bypass the listeners until the counters are rebuilt
+        DSViewRecord.query.filter_by(dataset_id=ds_two.id).delete(synchronize_session=False)
+        db.session.commit()
+        assert svc.total_dataset_views() == 3
+        assert rebuild_counters() == 4
+        assert svc.total_dataset_views() == 2
+        assert counters.total("dataset", "views", ds_two.id) == 0
+        assert (
+            ActivityCounter.query.filter_by(scope="dataset", subject_id=ds_one.id, metric="downloads").one().total == 2
+        )
+
+
+def test_counters_are_updated_by_buffered_flush(test_client, clean_database, monkeypatch):
+    from core.events import event_buffer
+
+    with test_client.application.app_context():
+        owner = _create_user("buffered-owner@example.com")
+        dataset = _create_dataset(owner, "Buffered Counter")
+        db.session.commit()
+
+        monkeypatch.setitem(test_client.application.config, "EVENT_BUFFER_ENABLED", True)
+        monkeypatch.setitem(test_client.application.config, "EVENT_BUFFER_MAX_EVENTS", 1000)
+        monkeypatch.setitem(test_client.application.config, "EVENT_BUFFER_MAX_DELAY", 3600)
+        for idx in range(3):
+            event_buffer.record(DSDownloadRecord, dataset_id=dataset.id, download_cookie=f"buffered-{idx}")
+        assert event_buffer.flush() == 3
+
+        svc = DataSetService()
+        assert svc.total_dataset_downloads() == 3
+        assert svc.activitycounter_repository.total("dataset", "downloads", dataset.id) == 3
+        assert svc.trending_datasets(period_days=7, by="downloads", limit=1)[0][1] == 3
+
+
+def test_trending_leaderboard_is_updated_incrementally(test_client, clean_database, monkeypatch):
+    with test_client.application.app_context():
+        monkeypatch.setitem(test_client.application.config, "TRENDING_REFRESH_SECONDS", 3600)
+        trending_leaderboard.invalidate()
+        try:
+            owner = _create_user("leaderboard-owner@example.com")
+            ds_first = _create_dataset(owner, "Board First")
+            ds_second = _create_dataset(owner, "Board Second")
+            community = _create_community(owner, "Board Community")
+            _accept_dataset(ds_second, community, owner)
+            now = datetime.utcnow()
+            _add_views(ds_first, 2, base_time=now)
+            _add_views(ds_second, 1, base_time=now)
+            db.session.commit()
+
+            svc = DataSetService()
+            assert [(ds.id, metric) for ds, metric in svc.trending_datasets(7, "views", 2)] == [
+                (ds_first.id, 2),
+                (ds_second.id, 1),
+            ]
+
+            # Later views are folded into the cached board without re-reading the buckets
+            def no_rebuild(*args, **kwargs):
+                raise AssertionError("leaderboard should not be rebuilt")
+
+            monkeypatch.setattr(ActivityCounterRepository, "window_totals", no_rebuild)
+            _add_views(ds_second, 3, base_time=now, offset_hours=10)
+            db.session.commit()
+
+            results = svc.trending_datasets(7, "views", 2)
+            assert [(ds.id, metric) for ds, metric in results] == [(ds_second.id, 4), (ds_first.id, 2)]
+            assert results[0][0].accepted_community.id == community.id
+            assert results[1][0].accepted_community is None
+        finally:
+            trending_leaderboard.invalidate()
+
+
+def test_trending_leaderboard_only_sees_committed_counts(test_client, clean_database, monkeypatch):
+    with test_client.application.app_context():
+        monkeypatch.setitem(test_client.application.config, "TRENDING_REFRESH_SECONDS", 3600)
+        trending_leaderboard.invalidate()
+        try:
+            owner = _create_user("committed-owner@example.com")
+            dataset = _create_dataset(owner, "Board Committed")
+            now = datetime.utcnow()
+            _add_views(dataset, 1, base_time=now)
+            db.session.commit()
+            assert trending_leaderboard.top("views", 7, 1) == [(dataset.id, 1)]
+
+            # Flushed but rolled back: the board never sees the views
+            _add_views(dataset, 2, base_time=now, offset_hours=1)
+            db.session.flush()
+            assert trending_leaderboard.top("views", 7, 1) == [(dataset.id, 1)]
+            db.session.rollback()
+            assert trending_leaderboard.top("views", 7, 1) == [(dataset.id, 1)]
+
+            _add_views(dataset, 3, base_time=now, offset_hours=2)
+            db.session.commit()
+            assert trending_leaderboard.top("views", 7, 1) == [(dataset.id, 4)]
+        finally:
+            trending_leaderboard.invalidate()
+
+
+def test_trending_window_covers_exactly_period_days(test_client, clean_database):
+    with test_client.application.app_context():
+        trending_leaderboard.invalidate()
+        try:
+            owner = _create_user("window-owner@example.com")
+            inside = _create_dataset(owner, "Window Inside")
+            outside = _create_dataset(owner, "Window Outside")
+            today = datetime.utcnow().date()
+            for dataset, days_ago in ((inside, 6), (outside, 7)):
+                day = datetime.combine(today - timedelta(days=days_ago), datetime.min.time()) + timedelta(hours=12)
+                db.session.add(DSViewRecord(dataset_id=dataset.id, view_cookie=f"window-{days_ago}", view_date=day))
+            db.session.commit()
+
+            assert trending_leaderboard.since_day(7) == today - timedelta(days=6)
+            assert trending_leaderboard.top("views", 7, 5) == [(inside.id, 1)]
+            assert trending_leaderboard.top("views", 1, 5) == []
+        finally:
+            trending_leaderboard.invalidate()
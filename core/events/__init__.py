@@ -0,0 +1,3 @@
+from .event_buffer import EventBuffer, event_buffer
+
+__all__ = ["EventBuffer", "event_buffer"]
@@ -0,0 +1,193 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from typing import Hashable, Optional
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_EVENTS = 500
+DEFAULT_MAX_DELAY = 2.0
+SEEN_KEYS_LIMIT = 50_000
+
+
+class EventBuffer:
+    """In-process write-behind buffer for high-volume analytics rows.
+
+    View and download records are queued in memory and written with one
+    multi-row ``INSERT`` per table once ``EVENT_BUFFER_MAX_EVENTS`` rows are
+    pending or the oldest one is ``EVENT_BUFFER_MAX_DELAY`` seconds old.
+    Counter columns (``Hubfile.download_count``) are aggregated and applied as a
+    single ``UPDATE ... SET col = col + n`` per row.
+
+    Deduplication keys of buffered rows are remembered in a bounded LRU set, so
+    a repeated view is rejected before touching the database, including while
+    the first one is still pending. With ``EVENT_BUFFER_ENABLED`` off (the test
+    configuration) every call writes and commits immediately, as before.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._rows = defaultdict(list)
+        self._increments = Counter()
+        self._pending = 0
+        self._oldest: Optional[float] = None
+        self._seen: "OrderedDict[Hashable, None]" = OrderedDict()
+        self._app = None
+        self._worker: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self._flush_listeners = defaultdict(list)
+        atexit.register(self.flush)
+
+    def on_flush(self, table, listener) -> None:
+        """Call ``listener(connection, rows)`` in the same transaction each time rows of ``table`` are flushed.
+
+        A listener may return a callable, which is called once that transaction
+        has committed. Rows written while the buffer is disabled go through the
+        ORM, so they are not reported here; use mapper events for those.
+        """
+        self._flush_listeners[table].append(listener)
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(current_app.config.get("EVENT_BUFFER_ENABLED", False))
+
+    @staticmethod
+    def _max_events() -> int:
+        return int(current_app.config.get("EVENT_BUFFER_MAX_EVENTS", DEFAULT_MAX_EVENTS))
+
+    @staticmethod
+    def _max_delay() -> float:
+        return float(current_app.config.get("EVENT_BUFFER_MAX_DELAY", DEFAULT_MAX_DELAY))
+
+    def has_seen(self, key: Hashable) -> bool:
+        if not self.enabled():
+            return False
+        with self._lock:
+            if key in self._seen:
+                self._seen.move_to_end(key)
+                return True
+        return False
+
+    def mark_seen(self, key: Hashable) -> None:
+        if not self.enabled():
+            return
+        with self._lock:
+            self._mark_seen_locked(key)
+
+    def _mark_seen_locked(self, key: Hashable) -> None:
+        self._seen[key] = None
+        self._seen.move_to_end(key)
+        while len(self._seen) > SEEN_KEYS_LIMIT:
+            self._seen.popitem(last=False)
+
+    def record(self, model, dedup_key: Optional[Hashable] = None, **values):
+        """Queue one ``model`` row. Returns the persisted instance when unbuffered."""
+        from app import db
+
+        if not self.enabled():
+            instance = model(**values)
+            db.session.add(instance)
+            db.session.commit()
+            return instance
+
+        with self._lock:
+            if dedup_key is not None:
+                self._mark_seen_locked(dedup_key)
+            self._rows[model.__table__].append(values)
+            self._note_pending_locked()
+            should_flush = self._pending >= self._max_events()
+        if should_flush:
+            self.flush()
+        return None
+
+    def increment(self, model, column: str, pk: int, amount: int = 1) -> None:
+        """Add ``amount`` to ``model.column`` for the row with primary key ``pk``."""
+        from app import db
+
+        if not self.enabled():
+            db.session.query(model).filter(model.id == pk).update(
+                {column: getattr(model, column) + amount}, synchronize_session=False
+            )
+            db.session.commit()
+            return
+
+        with self._lock:
+            self._increments[(model.__table__, column, pk)] += amount
+            self._note_pending_locked()
+            should_flush = self._pending >= self._max_events()
+        if should_flush:
+            self.flush()
+
+    def _note_pending_locked(self) -> None:
+        self._pending += 1
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+            # the worker may be sleeping on an older deadline: have it time this batch instead
+            self._wake.set()
+        if self._app is None:
+            self._app = current_app._get_current_object()
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name="event-buffer", daemon=True)
+            self._worker.start()
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._pending
+
+    def flush(self) -> int:
+        """Write every pending row and counter update; returns how many events were flushed."""
+        from app import db
+
+        with self._lock:
+            rows, self._rows = self._rows, defaultdict(list)
+            increments, self._increments = self._increments, Counter()
+            flushed, self._pending = self._pending, 0
+            self._oldest = None
+            app = self._app
+        self._wake.set()
+        if not flushed or app is None:
+            return 0
+
+        committed = []
+        try:
+            with app.app_context():
+                with db.engine.begin() as connection:
+                    for table, table_rows in rows.items():
+                        connection.execute(table.insert(), table_rows)
+                        for listener in self._flush_listeners.get(table, ()):
+                            callback = listener(connection, table_rows)
+                            if callback is not None:
+                                committed.append(callback)
+                    for (table, column, pk), amount in increments.items():
+                        connection.execute(
+                            table.update().where(table.c.id == pk).values({column: table.c[column] + amount})
+                        )
+        except Exception:
+            # Analytics rows are best effort: log and drop rather than retry forever
+            logger.exception("Could not flush %d buffered events", flushed)
+            return 0
+        for callback in committed:
+            callback()
+        return flushed
+
+    def _run(self) -> None:
+        while True:
+            app = self._app
+            with app.app_context():
+                max_delay = self._max_delay()
+            with self._lock:
+                oldest = self._oldest
+            timeout = max_delay if oldest is None else max(0.0, oldest + max_delay - time.monotonic())
+            self._wake.wait(timeout)
+            self._wake.clear()
+            with self._lock:
+                due = self._oldest is not None and time.monotonic() - self._oldest >= max_delay
+            if due:
+                self.flush()
+
+
+event_buffer = EventBuffer()
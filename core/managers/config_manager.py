@@ -33,6 +33,20 @@ class Config:
     TIMEZONE = "Europe/Madrid"
     TEMPLATES_AUTO_RELOAD = True
     UPLOAD_FOLDER = "uploads"
+    EVENT_BUFFER_ENABLED = os.getenv("EVENT_BUFFER_ENABLED", "True") == "True"
+    EVENT_BUFFER_MAX_EVENTS = int(os.getenv("EVENT_BUFFER_MAX_EVENTS", 500))
+    EVENT_BUFFER_MAX_DELAY = float(os.getenv("EVENT_BUFFER_MAX_DELAY", 2.0))
+    TRENDING_REFRESH_SECONDS = float(os.getenv("TRENDING_REFRESH_SECONDS", 60))
+    # 0 sizes the validation/checksum pool from the CPU count; CSV parsing is GIL-bound, so it runs in
+    # processes unless INGEST_USE_PROCESSES=False (checksums always use threads)
+    INGEST_MAX_WORKERS = int(os.getenv("INGEST_MAX_WORKERS", 0))
+    INGEST_USE_PROCESSES = os.getenv("INGEST_USE_PROCESSES", "True") == "True"
+    # queued publication (Prefer: respond-async): "rq" needs REDIS_URL and a `rosemary publish:worker`,
+    # "thread" runs jobs in the web process, "inline" runs them before the request returns
+    REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    PUBLISH_QUEUE = os.getenv("PUBLISH_QUEUE", "rq" if os.getenv("REDIS_URL") else "thread")
+    PUBLISH_STORAGE_ATTEMPTS = int(os.getenv("PUBLISH_STORAGE_ATTEMPTS", 3))
+    PUBLISH_RETRY_DELAY = float(os.getenv("PUBLISH_RETRY_DELAY", 1.0))
 
 
 class DevelopmentConfig(Config):
@@ -52,6 +66,10 @@ class TestingConfig(Config):
     TWO_FACTOR_ENABLED = False
     SECRET_KEY = "test-secret-key-1234"
     SECURITY_PASSWORD_SALT = "test-password-salt-5678"
+    EVENT_BUFFER_ENABLED = False
+    TRENDING_REFRESH_SECONDS = 0
+    PUBLISH_QUEUE = "inline"
+    PUBLISH_RETRY_DELAY = 0
 
 
 class ProductionConfig(Config):
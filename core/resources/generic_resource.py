@@ -1,10 +1,16 @@
-from datetime import datetime
+import hashlib
+from datetime import datetime, timezone
 
-from flask import request
+from flask import Response, request
 from flask_restful import Resource
+from sqlalchemy import func
+from werkzeug.http import http_date, parse_date
 
 from app import db
 
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
 
 def convert_value(value):
     if isinstance(value, datetime):
@@ -12,21 +18,140 @@ def convert_value(value):
     return value
 
 
+def _bounded_int(raw, default, minimum, maximum, name):
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+    if value < minimum:
+        raise ValueError(f"{name} must be >= {minimum}")
+    return min(value, maximum) if maximum else value
+
+
+def _coerce(column, raw, name):
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return raw
+    if python_type is bool:
+        if raw.lower() not in ("true", "false", "1", "0"):
+            raise ValueError(f"{name} must be true or false")
+        return raw.lower() in ("true", "1")
+    try:
+        return python_type(raw)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be of type {python_type.__name__}")
+
+
 class GenericResource(Resource):
-    def __init__(self, model, serializer):
+    """CRUD resource over ``model``.
+
+    Collections are paged (``page``/``per_page`` or ``cursor``), can be
+    projected with ``fields=`` and filtered on ``filterable_fields``, and carry
+    ETag/Last-Modified so unchanged collections answer 304 without serializing.
+    """
+
+    def __init__(self, model, serializer, filterable_fields=None, query_options=None):
         self.model = model
         self.model_name = model.__name__
         self.serializer = serializer
+        self.filterable_fields = filterable_fields or {}
+        self.query_options = query_options
 
     def get(self, id=None):
         if id:
-            item = self.model.query.get(id)
+            item = self._query().filter(self.model.id == id).first()
             if not item:
                 return {"message": f"{self.model_name} not found"}, 404
-            return self.serializer.serialize(item), 200
+            return self._json(self.serializer.encode(item))
+
+        try:
+            fields = self._parse_fields()
+            query = self._apply_filters(self.model.query)
+            per_page = _bounded_int(request.args.get("per_page"), DEFAULT_PER_PAGE, 1, MAX_PER_PAGE, "per_page")
+            page = _bounded_int(request.args.get("page"), 1, 1, None, "page")
+            cursor = _bounded_int(request.args.get("cursor"), None, 0, None, "cursor")
+        except ValueError as e:
+            return {"message": str(e)}, 400
+
+        validators, total = self._validators(query)
+        if self._not_modified(validators):
+            return "", 304, validators
+
+        ordered = self._query(query).order_by(self.model.id)
+        if cursor is not None:
+            items = ordered.filter(self.model.id > cursor).limit(per_page + 1).all()
+            body = {"per_page": per_page, "total": total}
         else:
-            items = self.model.query.all()
-            return {"items": [self.serializer.serialize(i) for i in items]}, 200
+            items = ordered.offset((page - 1) * per_page).limit(per_page + 1).all()
+            body = {"page": page, "per_page": per_page, "total": total}
+
+        has_more = len(items) > per_page
+        items = items[:per_page]
+        body["next_cursor"] = str(items[-1].id) if has_more and items else None
+        body["items"] = items
+        return self._json(self.serializer.encode(body, fields=fields), validators)
+
+    @staticmethod
+    def _json(payload: bytes, headers=None):
+        return Response(payload, status=200, mimetype="application/json", headers=headers)
+
+    def _query(self, query=None):
+        query = query if query is not None else self.model.query
+        if self.query_options:
+            query = query.options(*self.query_options())
+        return query
+
+    def _parse_fields(self):
+        """``?fields=a,b`` projection, validated against the serializer's field map."""
+        raw = request.args.get("fields")
+        if not raw:
+            return None
+        fields = list(dict.fromkeys(field.strip() for field in raw.split(",") if field.strip()))
+        unknown = [field for field in fields if field not in self.serializer.serialization_fields]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        return fields
+
+    def _apply_filters(self, query):
+        """Equality filters on the whitelisted (indexed) columns, e.g. ``?user_id=3``."""
+        for name, column in self.filterable_fields.items():
+            raw = request.args.get(name)
+            if raw is None:
+                continue
+            query = query.filter(column == _coerce(column, raw, name))
+        return query
+
+    def _validators(self, query):
+        """ETag/Last-Modified headers and row count for the filtered collection, from one aggregate query.
+
+        Inserts raise the max id, deletes change the count; in-place edits of
+        existing rows are not reflected.
+        """
+        columns = [func.count(self.model.id), func.max(self.model.id)]
+        created_at = getattr(self.model, "created_at", None)
+        if created_at is not None:
+            columns.append(func.max(created_at))
+        row = query.with_entities(*columns).order_by(None).one()
+        count, max_id = row[0], row[1]
+        last_modified = row[2] if created_at is not None else None
+
+        digest = hashlib.sha1(f"{self.model_name}:{count}:{max_id}:{last_modified}".encode())
+        digest.update(request.query_string)
+        headers = {"ETag": f'W/"{digest.hexdigest()}"'}
+        if isinstance(last_modified, datetime):
+            headers["Last-Modified"] = http_date(last_modified.replace(tzinfo=timezone.utc))
+        return headers, count
+
+    def _not_modified(self, validators):
+        if request.if_none_match:
+            return request.if_none_match.contains_weak(validators["ETag"][3:-1])
+        last_modified = validators.get("Last-Modified")
+        if request.if_modified_since and last_modified:
+            return parse_date(last_modified) <= request.if_modified_since
+        return False
 
     def post(self):
         data = request.get_json()
@@ -63,9 +188,9 @@ class GenericResource(Resource):
         return {"message": f"{self.model_name} deleted successfully"}, 204
 
 
-def create_resource(model, serialization_fields=None):
+def create_resource(model, serialization_fields=None, filterable_fields=None, query_options=None):
     class Resource(GenericResource):
         def __init__(self):
-            super().__init__(model, serialization_fields)
+            super().__init__(model, serialization_fields, filterable_fields, query_options)
 
     return Resource
@@ -1,4 +1,21 @@
+import inspect
+import json
+import threading
+from collections import OrderedDict
 from datetime import datetime
+from typing import Any, Callable, Dict, Tuple
+
+from sqlalchemy import Date, DateTime
+from sqlalchemy import inspect as sa_inspect
+
+_MISSING = object()
+# projected functions kept per serializer; the projections come from request arguments
+MAX_COMPILED_PROJECTIONS = 128
+
+try:
+    import msgspec
+except Exception:  # pragma: no cover - optional msgspec dependency
+    msgspec = None
 
 
 def convert_value(value):
@@ -8,24 +25,118 @@ def convert_value(value):
 
 
 class Serializer:
+    """Turns model instances into dicts (``serialize``) or JSON bytes (``encode``).
+
+    ``serialization_fields`` maps output keys to attribute or method names.
+    The first time an instance class (and ``fields`` projection) is seen, the
+    field map is compiled into a Python function that reads every field
+    directly (``instance.attr`` / ``instance.method()``), converting only
+    columns that can hold datetimes. With msgspec installed, ``encode`` uses a
+    second compiled function that fills a generated ``msgspec.Struct`` instead
+    of a dict and writes JSON straight from it.
+
+    A projection is reduced to the serialization fields it selects, in the
+    field map's order, so duplicates and reorderings share one compiled
+    function; the least recently used projections are dropped past
+    ``MAX_COMPILED_PROJECTIONS``.
+    """
+
     def __init__(self, serialization_fields, related_serializers=None):
         self.serialization_fields = serialization_fields
         self.related_serializers = related_serializers or {}
+        self._compiled: "OrderedDict[Tuple[type, Tuple[str, ...], bool], Callable[[Any], Any]]" = OrderedDict()
+        self._compiled_lock = threading.Lock()
+        # unprojected functions per class, the hot path
+        self._to_dict: Dict[type, Callable[[Any], Any]] = {}
+        self._to_struct: Dict[type, Callable[[Any], Any]] = {}
+
+    def serialize(self, instance, fields=None):
+        function = self._to_dict.get(instance.__class__) if fields is None else None
+        if function is None:
+            function = self._compiled_for(instance.__class__, fields, False)
+        return function(instance)
+
+    def to_struct(self, instance, fields=None):
+        function = self._to_struct.get(instance.__class__) if fields is None else None
+        if function is None:
+            function = self._compiled_for(instance.__class__, fields, msgspec is not None)
+        return function(instance)
+
+    def encode(self, payload, fields=None) -> bytes:
+        """JSON bytes for an instance, a list of instances, or a dict with an ``items`` list of them."""
+        if msgspec is None:
+            return json.dumps(self._plain(payload, fields, self.serialize)).encode()
+        return msgspec.json.encode(self._plain(payload, fields, self.to_struct))
+
+    def _plain(self, payload, fields, convert):
+        if isinstance(payload, dict):
+            return {**payload, "items": [convert(item, fields) for item in payload.get("items", [])]}
+        if isinstance(payload, (list, tuple)):
+            return [convert(item, fields) for item in payload]
+        return convert(payload, fields)
 
-    def serialize(self, instance):
-        serialized_data = {}
-        for key, attr_name in self.serialization_fields.items():
-            if key in self.related_serializers:
-                related_data = getattr(instance, attr_name)()
-                if isinstance(related_data, list):
-                    serialized_data[key] = [
-                        self.related_serializers[key].serialize(sub_instance) for sub_instance in related_data
-                    ]
-                else:
-                    serialized_data[key] = self.related_serializers[key].serialize(related_data)
+    def _compiled_for(self, cls, fields, for_struct):
+        if fields is None:
+            function = self._compile(cls, None, for_struct)
+            (self._to_struct if for_struct else self._to_dict)[cls] = function
+            return function
+
+        selected = set(fields)
+        key = (cls, tuple(key for key in self.serialization_fields if key in selected), for_struct)
+        with self._compiled_lock:
+            function = self._compiled.get(key)
+            if function is not None:
+                self._compiled.move_to_end(key)
+                return function
+        function = self._compile(cls, key[1], for_struct)
+        with self._compiled_lock:
+            self._compiled[key] = function
+            while len(self._compiled) > MAX_COMPILED_PROJECTIONS:
+                self._compiled.popitem(last=False)
+        return function
+
+    def _compile(self, cls, projection, for_struct):
+        keys = [key for key in self.serialization_fields if projection is None or key in projection]
+        namespace = {"_convert": convert_value, "_getattr": getattr, "_many": _many}
+        expressions = []
+        for position, key in enumerate(keys):
+            attr_name = self.serialization_fields[key]
+            related = self.related_serializers.get(key)
+            static = inspect.getattr_static(cls, attr_name, _MISSING)
+            if static is _MISSING or not attr_name.isidentifier():
+                read = f"_getattr(instance, {attr_name!r}, None)"
             else:
-                attr = getattr(instance, attr_name, None)
-                if callable(attr):
-                    attr = attr()
-                serialized_data[key] = convert_value(attr)
-        return serialized_data
+                read = f"instance.{attr_name}"
+
+            if related is not None:
+                namespace[f"_related{position}"] = related.to_struct if for_struct else related.serialize
+                expressions.append(f"_many(_related{position}, {read}())")
+            elif inspect.isfunction(static) or isinstance(static, (staticmethod, classmethod)):
+                expressions.append(f"{read}()" if for_struct else f"_convert({read}())")
+            elif for_struct or _is_plain_column(cls, attr_name):
+                # msgspec encodes datetimes itself
+                expressions.append(read)
+            else:
+                expressions.append(f"_convert({read})")
+
+        if for_struct:
+            namespace["_Struct"] = msgspec.defstruct(f"{cls.__name__}Struct", [(key, Any) for key in keys])
+            body = "_Struct(" + ", ".join(expressions) + ")"
+        else:
+            body = "{" + ", ".join(f"{key!r}: {expression}" for key, expression in zip(keys, expressions)) + "}"
+        source = f"def serialize(instance):\n    return {body}\n"
+        exec(compile(source, f"<serializer {cls.__name__}>", "exec"), namespace)
+        return namespace["serialize"]
+
+
+def _many(convert, value):
+    if isinstance(value, list):
+        return [convert(item) for item in value]
+    return convert(value)
+
+
+def _is_plain_column(cls, attr_name):
+    """True for mapped columns that can never hold a datetime, so their value needs no conversion."""
+    mapper = sa_inspect(cls, raiseerr=False)
+    column = mapper.columns.get(attr_name) if mapper is not None else None
+    return column is not None and not isinstance(column.type, (DateTime, Date))
@@ -1,3 +1,18 @@
+from .archive_cache import ArchiveCache, archive_cache
+from .async_storage import LocalAsyncStorage, S3AsyncStorage, get_async_storage
+from .file_cache import LocalFileCache, file_cache
 from .storage_service import StorageService, storage_service
+from .zip_stream import stream_zip
 
-__all__ = ["StorageService", "storage_service"]
+__all__ = [
+    "ArchiveCache",
+    "LocalAsyncStorage",
+    "LocalFileCache",
+    "S3AsyncStorage",
+    "StorageService",
+    "archive_cache",
+    "file_cache",
+    "get_async_storage",
+    "storage_service",
+    "stream_zip",
+]
@@ -0,0 +1,148 @@
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 5 * 1024**3
+
+
+class ArchiveCache:
+    """Size-bounded, content-addressed store of prebuilt dataset archives.
+
+    Archives live in the regular storage backend (local uploads folder or S3)
+    under ``archives/<key>.zip``. The key is derived from the sorted file
+    checksums, so an archive never goes stale: changed content means a new key.
+    An in-process LRU index keeps the total size under ``max_bytes``.
+    """
+
+    def __init__(self, storage=None, max_bytes: Optional[int] = None, prefix: str = "archives") -> None:
+        self._storage = storage
+        self._max_bytes = max_bytes if max_bytes is not None else self._max_bytes_from_env()
+        self._prefix = prefix
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._index_loaded = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _max_bytes_from_env() -> int:
+        try:
+            return int(os.getenv("ARCHIVE_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        except ValueError:
+            return DEFAULT_MAX_BYTES
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            from core.storage import storage_service
+
+            self._storage = storage_service
+        return self._storage
+
+    @staticmethod
+    def key_for(root: str, files: Iterable[Tuple[str, str]]) -> str:
+        """Build the cache key from ``(name, checksum)`` pairs.
+
+        Names and the archive root are part of the digest because they are
+        written into the archive alongside the payloads.
+        """
+        digest = hashlib.sha256(root.encode("utf-8"))
+        for checksum, name in sorted((checksum, name) for name, checksum in files):
+            digest.update(b"\0" + checksum.encode("utf-8") + b"\0" + name.encode("utf-8"))
+        return digest.hexdigest()
+
+    def relative_path(self, key: str) -> str:
+        return f"{self._prefix}/{key}.zip"
+
+    def _load_index(self) -> None:
+        if self._index_loaded:
+            return
+        for stored_key in self.storage.list_files(self._prefix):
+            if not stored_key.endswith(".zip"):
+                continue
+            key = os.path.basename(stored_key)[: -len(".zip")]
+            self._index[key] = self.storage.get_size(stored_key) or 0
+        self._index_loaded = True
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Return the stored path for ``key`` and mark it as recently used."""
+        with self._lock:
+            self._load_index()
+            if key not in self._index:
+                return None
+            self._index.move_to_end(key)
+        relative_path = self.relative_path(key)
+        if not self.storage.exists(relative_path):
+            with self._lock:
+                self._index.pop(key, None)
+            return None
+        return relative_path
+
+    def store_while_streaming(self, key: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Yield ``chunks`` unchanged while persisting them as the archive for ``key``.
+
+        The entry is only published once the stream has been fully consumed;
+        an aborted download leaves nothing behind.
+        """
+        relative_path = self.relative_path(key)
+        partial_path = self.storage.get_local_path(f"{relative_path}.{uuid.uuid4().hex}.part")
+        os.makedirs(os.path.dirname(partial_path), exist_ok=True)
+        size = 0
+        completed = False
+        try:
+            with open(partial_path, "wb") as partial:
+                for chunk in chunks:
+                    partial.write(chunk)
+                    size += len(chunk)
+                    yield chunk
+            completed = True
+        finally:
+            if completed:
+                try:
+                    self.storage.save_local_file(partial_path, relative_path)
+                    self._register(key, size)
+                except Exception:
+                    logger.exception("Could not store archive %s in cache", key)
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+    def _register(self, key: str, size: int) -> None:
+        with self._lock:
+            self._load_index()
+            self._index[key] = size
+            self._index.move_to_end(key)
+            evicted = self._evict_locked()
+        for victim in evicted:
+            self._delete(victim)
+
+    def _evict_locked(self):
+        evicted = []
+        total = sum(self._index.values())
+        while total > self._max_bytes and self._index:
+            victim, victim_size = self._index.popitem(last=False)
+            total -= victim_size
+            evicted.append(victim)
+        return evicted
+
+    def _delete(self, key: str) -> None:
+        try:
+            self.storage.delete_file(self.relative_path(key))
+        except Exception:
+            logger.exception("Could not delete cached archive %s", key)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._index.pop(key, None)
+        self._delete(key)
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            self._load_index()
+            return sum(self._index.values())
+
+
+archive_cache = ArchiveCache()
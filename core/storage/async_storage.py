@@ -0,0 +1,320 @@
+"""Storage calls that do not block the worker, for gunicorn's gevent ("async") workers.
+
+``StorageService`` is synchronous: boto3 keeps a thread busy for every transfer
+and file access holds up the gevent hub. The backends here give the same files
+the same way (compressed files come back decompressed, keys follow
+``S3_PREFIX``), but every call only waits cooperatively:
+
+- ``LocalAsyncStorage`` runs filesystem work on the hub's thread pool.
+- ``S3AsyncStorage`` talks to S3 over geventhttpclient, a gevent HTTP client,
+  with requests signed by botocore.
+
+``get_async_storage()`` picks the backend matching ``storage_service``.
+Outside a gevent worker the calls still work; they simply block like
+regular ones, which is why callers check ``cooperative()`` first.
+"""
+
+import os
+import threading
+import xml.etree.ElementTree as ElementTree
+from typing import Callable, Iterator, List, Optional
+from urllib.parse import quote
+
+from core.storage import seekable_zstd
+from core.storage.storage_service import ORIGINAL_SIZE_METADATA, ZSTD_ENCODING, StoredFile
+
+try:
+    import gevent
+    from gevent import monkey
+except Exception:  # pragma: no cover - optional gevent dependency
+    gevent = None
+    monkey = None
+
+try:
+    from geventhttpclient import HTTPClient
+except Exception:  # pragma: no cover - optional geventhttpclient dependency
+    HTTPClient = None
+
+try:
+    from botocore.auth import S3SigV4Auth
+    from botocore.awsrequest import AWSRequest
+    from botocore.credentials import Credentials
+except Exception:  # pragma: no cover - optional boto3 dependency
+    S3SigV4Auth = object
+    AWSRequest = None
+    Credentials = None
+
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_CONCURRENCY = 32
+DEFAULT_TIMEOUT = 60.0
+_S3_XMLNS = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+
+
+def cooperative() -> bool:
+    """Whether sockets are patched by gevent, i.e. the app runs on a gevent worker."""
+    return monkey is not None and monkey.is_module_patched("socket")
+
+
+def _in_thread(function: Callable, *args):
+    """Run blocking ``function(*args)`` on gevent's thread pool, letting other greenlets run meanwhile."""
+    if gevent is None:
+        return function(*args)
+    return gevent.get_hub().threadpool.apply(function, args)
+
+
+class _ThreadedReader:
+    """A file object whose reads happen on the thread pool."""
+
+    def __init__(self, handler) -> None:
+        self._handler = handler
+
+    def read(self, size: int = -1) -> bytes:
+        return _in_thread(self._handler.read, size)
+
+    def readable(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        self._handler.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class LocalAsyncStorage:
+    """The local ``StorageService`` backend with each blocking step moved to the thread pool."""
+
+    def __init__(self, storage) -> None:
+        self.storage = storage
+
+    def stat(self, relative_path: str) -> Optional[StoredFile]:
+        return _in_thread(self.storage.stored_info, relative_path)
+
+    def open(self, relative_path: str, decompress: bool = True):
+        """A readable stream of the file: its original content, or the stored bytes with ``decompress=False``."""
+        opener = self.storage.open_binary if decompress else self.storage.open_raw
+        return _ThreadedReader(_in_thread(opener, relative_path))
+
+    def read_range(
+        self, relative_path: str, start: int, stop: int, info: Optional[StoredFile] = None
+    ) -> Iterator[bytes]:
+        """Yield the original bytes in ``[start, stop)``, one chunk per thread pool call."""
+        chunks = self.storage.iter_range(relative_path, start, stop, info=info)
+        try:
+            while True:
+                chunk = _in_thread(next, chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            chunks.close()
+
+    def save(self, src_path: str, relative_dest: str, remove_source: bool = True) -> str:
+        return _in_thread(self.storage.save_local_file, src_path, relative_dest, remove_source)
+
+    def list(self, relative_dir: str) -> List[str]:
+        return _in_thread(self.storage.list_files, relative_dir)
+
+
+class _UnsignedPayloadAuth(S3SigV4Auth):
+    # bodies are streamed from disk, so they are not hashed into the signature; TLS covers their integrity
+    def _should_sha256_sign_payload(self, request) -> bool:
+        return False
+
+
+class _ResponseStream:
+    """File-like view of a geventhttpclient response body; closing hands the connection back."""
+
+    def __init__(self, response) -> None:
+        self._response = response
+
+    def read(self, size: int = -1) -> bytes:
+        return bytes(self._response.read(None if size is None or size < 0 else size))
+
+    def readable(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        self._response.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class S3AsyncStorage:
+    """The S3 ``StorageService`` backend over geventhttpclient.
+
+    Uses the bucket, region, credentials and key layout of ``storage``.
+    Each greenlet waits on its own pooled connection, at most
+    ``S3_ASYNC_CONCURRENCY`` of them, instead of holding a thread.
+    """
+
+    def __init__(self, storage, http_client=None) -> None:
+        self.storage = storage
+        self.host = f"{storage._bucket}.s3.{storage._region}.amazonaws.com"
+        self._credentials = Credentials(storage._aws_key, storage._aws_secret)
+        self._http = http_client
+        self._http_lock = threading.Lock()
+
+    @property
+    def http(self):
+        with self._http_lock:
+            if self._http is None:
+                self._http = HTTPClient(
+                    self.host,
+                    port=443,
+                    ssl=True,
+                    concurrency=_concurrency_from_env(),
+                    connection_timeout=DEFAULT_TIMEOUT,
+                    network_timeout=DEFAULT_TIMEOUT,
+                )
+            return self._http
+
+    def _request(self, method: str, key: str = "", query: str = "", headers: Optional[dict] = None, body=b""):
+        path = "/" + quote(key, safe="/~")
+        url = f"https://{self.host}{path}" + (f"?{query}" if query else "")
+        signed = AWSRequest(method=method, url=url, headers=dict(headers or {}))
+        _UnsignedPayloadAuth(self._credentials, "s3", self.storage._region).add_auth(signed)
+        response = self.http.request(
+            method, path + (f"?{query}" if query else ""), body=body, headers=dict(signed.headers.items())
+        )
+        if response.status_code >= 300:
+            status = response.status_code
+            response.read()
+            response.release()
+            if status == 404:
+                raise FileNotFoundError(key)
+            raise OSError(f"S3 {method} {key or query} failed with HTTP {status}")
+        return response
+
+    def _get(self, relative_path: str, start: Optional[int] = None, stop: Optional[int] = None) -> _ResponseStream:
+        headers = {"Range": f"bytes={start}-{stop - 1}"} if start is not None else {}
+        return _ResponseStream(self._request("GET", self.storage._s3_key(relative_path), headers=headers))
+
+    def _read_span(self, relative_path: str, start: int, stop: int) -> bytes:
+        with self._get(relative_path, start, stop) as source:
+            return seekable_zstd.read_exactly(source, stop - start)
+
+    def _seek_table(self, relative_path: str, stored_size: int) -> List[seekable_zstd.Frame]:
+        return seekable_zstd.read_seek_table(
+            lambda start, stop: self._read_span(relative_path, start, stop), stored_size
+        )
+
+    def stat(self, relative_path: str) -> Optional[StoredFile]:
+        try:
+            response = self._request("HEAD", self.storage._s3_key(relative_path))
+        except FileNotFoundError:
+            return None
+        response.release()
+        stored_size = int(response.get("Content-Length") or 0)
+        if response.get("Content-Encoding") != ZSTD_ENCODING:
+            return StoredFile(stored_size, stored_size, False)
+        original = response.get(f"x-amz-meta-{ORIGINAL_SIZE_METADATA}")
+        if original is None or not original.isdigit():
+            original = seekable_zstd.original_size(self._seek_table(relative_path, stored_size))
+        return StoredFile(int(original), stored_size, True)
+
+    def open(self, relative_path: str, decompress: bool = True):
+        """A readable stream of the file: its original content, or the stored bytes with ``decompress=False``."""
+        response = self._request("GET", self.storage._s3_key(relative_path))
+        stream = _ResponseStream(response)
+        if decompress and response.get("Content-Encoding") == ZSTD_ENCODING:
+            return seekable_zstd.open_decompressed(stream)
+        return stream
+
+    def read_range(
+        self, relative_path: str, start: int, stop: int, info: Optional[StoredFile] = None
+    ) -> Iterator[bytes]:
+        """Yield the original bytes in ``[start, stop)`` from ranged GETs, like ``StorageService.iter_range``."""
+        if stop <= start:
+            return
+        info = info or self.stat(relative_path)
+        if info is None:
+            raise FileNotFoundError(relative_path)
+        if info.compressed:
+            frames = self._seek_table(relative_path, info.stored_size)
+            yield from seekable_zstd.iter_range(
+                lambda begin, end: self._get(relative_path, begin, end), frames, start, stop
+            )
+            return
+        with self._get(relative_path, start, stop) as source:
+            yield from iter(lambda: source.read(CHUNK_SIZE), b"")
+
+    def save(self, src_path: str, relative_dest: str, remove_source: bool = True) -> str:
+        headers = {}
+        upload_path = src_path
+        if self.storage._should_compress(relative_dest):
+            with open(src_path, "rb") as source:
+                upload_path, original = _in_thread(self.storage._compress_to_tempfile, source)
+            headers = {"Content-Encoding": ZSTD_ENCODING, f"x-amz-meta-{ORIGINAL_SIZE_METADATA}": str(original)}
+        try:
+            headers["Content-Length"] = str(os.path.getsize(upload_path))
+            with open(upload_path, "rb") as body:
+                response = self._request("PUT", self.storage._s3_key(relative_dest), headers=headers, body=body)
+            response.read()
+            response.release()
+        finally:
+            if upload_path != src_path:
+                os.remove(upload_path)
+        if remove_source:
+            os.remove(src_path)
+        return relative_dest
+
+    def list(self, relative_dir: str) -> List[str]:
+        """Keys under ``relative_dir`` relative to the storage root, following ListObjectsV2 pages."""
+        prefix = self.storage._s3_dir_prefix(self.storage._normalize_key(relative_dir))
+        remote_prefix = self.storage._remote_prefix
+        results: List[str] = []
+        token = None
+        while True:
+            params = {"list-type": "2", "prefix": prefix}
+            if token:
+                params["continuation-token"] = token
+            query = "&".join(f"{name}={quote(value, safe='-_.~')}" for name, value in sorted(params.items()))
+            response = self._request("GET", query=query)
+            try:
+                page = ElementTree.fromstring(bytes(response.read()))
+            finally:
+                response.release()
+            for content in page.iter(f"{_S3_XMLNS}Contents"):
+                key = content.findtext(f"{_S3_XMLNS}Key")
+                results.append(key[len(remote_prefix) + 1 :] if remote_prefix else key)
+            if page.findtext(f"{_S3_XMLNS}IsTruncated") != "true":
+                return results
+            token = page.findtext(f"{_S3_XMLNS}NextContinuationToken")
+
+
+def _concurrency_from_env() -> int:
+    try:
+        value = int(os.getenv("S3_ASYNC_CONCURRENCY", DEFAULT_CONCURRENCY))
+    except ValueError:
+        return DEFAULT_CONCURRENCY
+    return value if value > 0 else DEFAULT_CONCURRENCY
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_async_storage(storage=None):
+    """The cooperative backend for ``storage`` (default ``storage_service``), created once per service."""
+    if storage is None:
+        from core.storage import storage_service
+
+        storage = storage_service
+    with _backends_lock:
+        backend = _backends.get(id(storage))
+        if (
+            backend is None
+            or backend.storage is not storage
+            or isinstance(backend, S3AsyncStorage) != storage.uses_s3()
+        ):
+            backend = S3AsyncStorage(storage) if storage.uses_s3() else LocalAsyncStorage(storage)
+            _backends[id(storage)] = backend
+        return backend
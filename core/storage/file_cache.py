@@ -0,0 +1,215 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 2 * 1024**3
+READ_SIZE = 1024 * 1024
+# <sha256 of the relative path><original extension>; anything else in the folder is a sidecar
+_ENTRY_NAME = re.compile(r"^[0-9a-f]{64}(\.[A-Za-z0-9]+)?$")
+
+
+class LocalFileCache:
+    """Size-bounded local copies of S3-backed files, evicted least recently used first.
+
+    ``path_for`` returns a local path for a stored file. The file is downloaded on the
+    first request and served from disk afterwards. Every entry remembers the SHA-256
+    of its content. A request whose expected checksum differs, for example because
+    the stored file was replaced, counts as a miss and fetches the file again.
+    With local storage the uploads folder already is the source of truth, so
+    its path is returned as is and nothing is cached, unless the file is
+    stored compressed: then the cache holds its decompressed copy.
+
+    An evicted file may still be open elsewhere; POSIX keeps it readable until closed.
+    """
+
+    def __init__(self, storage=None, max_bytes: Optional[int] = None, directory: Optional[str] = None) -> None:
+        self._storage = storage
+        self._max_bytes = max_bytes if max_bytes is not None else self._max_bytes_from_env()
+        self._directory = directory
+        # entry name -> (size, checksum or None when found on disk and not verified yet)
+        self._index: "OrderedDict[str, Tuple[int, Optional[str]]]" = OrderedDict()
+        self._index_loaded = False
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _max_bytes_from_env() -> int:
+        try:
+            return int(os.getenv("FILE_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        except ValueError:
+            return DEFAULT_MAX_BYTES
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            from core.storage import storage_service
+
+            self._storage = storage_service
+        return self._storage
+
+    @property
+    def directory(self) -> str:
+        if self._directory is None:
+            return os.getenv("FILE_CACHE_DIR") or self.storage.get_local_path(os.path.join(".cache", "files"))
+        return self._directory
+
+    @staticmethod
+    def entry_name(relative_path: str) -> str:
+        normalized = relative_path.replace("\\", "/").strip("/")
+        extension = os.path.splitext(normalized)[1]
+        if not re.fullmatch(r"\.[A-Za-z0-9]+", extension):
+            extension = ""
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest() + extension
+
+    def _load_index(self) -> None:
+        if self._index_loaded:
+            return
+        if os.path.isdir(self.directory):
+            entries = []
+            for name in os.listdir(self.directory):
+                if not _ENTRY_NAME.match(name):
+                    continue
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_atime, name, stat.st_size))
+            for _, name, size in sorted(entries):
+                self._index[name] = (size, None)
+        self._index_loaded = True
+
+    def path_for(self, relative_path: str, checksum: str) -> str:
+        """A local path holding the stored file whose SHA-256 is ``checksum``."""
+        if not self.storage.uses_s3() and not self.storage.is_compressed(relative_path):
+            return self.storage.get_local_path(relative_path)
+
+        name = self.entry_name(relative_path)
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            self._load_index()
+            entry = self._index.get(name)
+        if entry is not None and self._matches(name, path, entry, checksum):
+            with self._lock:
+                if name in self._index:
+                    self._index.move_to_end(name)
+                self.hits += 1
+            return path
+
+        with self._lock:
+            self.misses += 1
+        size = self._fill(relative_path, path, checksum)
+        self._register(name, size, checksum)
+        return path
+
+    def _matches(self, name: str, path: str, entry: Tuple[int, Optional[str]], checksum: str) -> bool:
+        size, known = entry
+        if known is None:
+            # left by an earlier process: hash it once and remember the result
+            try:
+                known, size = _sha256_and_size(path)
+            except OSError:
+                return False
+            with self._lock:
+                if name in self._index:
+                    self._index[name] = (size, known)
+        return known == checksum and os.path.exists(path)
+
+    def _fill(self, relative_path: str, path: str, checksum: str) -> int:
+        os.makedirs(self.directory, exist_ok=True)
+        partial_path = f"{path}.{uuid.uuid4().hex}.part"
+        try:
+            self.storage.download_to(relative_path, partial_path)
+            actual, size = _sha256_and_size(partial_path)
+            if actual != checksum:
+                raise ValueError(f"{relative_path} does not match its recorded checksum")
+            # readers of the previous version keep their handle; new ones see the new file
+            os.replace(partial_path, path)
+            _discard_sidecars(path)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+        return size
+
+    def _register(self, name: str, size: int, checksum: str) -> None:
+        with self._lock:
+            self._index[name] = (size, checksum)
+            self._index.move_to_end(name)
+            evicted = []
+            total = sum(entry[0] for entry in self._index.values())
+            # the newest entry stays even when it alone is over the budget
+            while total > self._max_bytes and len(self._index) > 1:
+                victim, (victim_size, _) = self._index.popitem(last=False)
+                total -= victim_size
+                evicted.append(victim)
+            self.evictions += len(evicted)
+        for victim in evicted:
+            self._delete(victim)
+
+    def _delete(self, name: str) -> None:
+        path = os.path.join(self.directory, name)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            logger.exception("Could not delete cached file %s", name)
+        _discard_sidecars(path)
+
+    def invalidate(self, relative_path: str) -> None:
+        name = self.entry_name(relative_path)
+        with self._lock:
+            self._index.pop(name, None)
+        self._delete(name)
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            self._load_index()
+            return sum(entry[0] for entry in self._index.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._load_index()
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / requests, 4) if requests else None,
+                "evictions": self.evictions,
+                "entries": len(self._index),
+                "bytes": sum(entry[0] for entry in self._index.values()),
+                "max_bytes": self._max_bytes,
+            }
+
+
+def _sha256_and_size(path: str) -> Tuple[str, int]:
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as handler:
+        for block in iter(lambda: handler.read(READ_SIZE), b""):
+            digest.update(block)
+            size += len(block)
+    return digest.hexdigest(), size
+
+
+def _discard_sidecars(path: str) -> None:
+    # files derived from an entry (e.g. the viewer's row index) are named "<entry>.<suffix>"
+    directory, name = os.path.split(path)
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return
+    for other in names:
+        if other.startswith(name + ".") and not other.endswith(".part"):
+            try:
+                os.remove(os.path.join(directory, other))
+            except FileNotFoundError:
+                pass
+
+
+file_cache = LocalFileCache()
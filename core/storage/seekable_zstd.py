@@ -0,0 +1,147 @@
+"""Seekable zstd: independent frames followed by a seek table, as in zstd's contrib/seekable_format.
+
+The payload is cut into ``frame_size`` chunks compressed as separate frames.
+A skippable frame at the end lists every frame's compressed and decompressed
+size, so a byte range of the original can be served by decoding only the
+frames that cover it. Any zstd decoder still reads the whole file, because
+skippable frames are ignored.
+"""
+
+import struct
+from typing import BinaryIO, Callable, Iterator, List, NamedTuple, Tuple
+
+try:
+    import zstandard
+except Exception:  # pragma: no cover - optional zstandard dependency
+    zstandard = None
+
+FRAME_MAGIC = b"\x28\xb5\x2f\xfd"
+SKIPPABLE_MAGIC = 0x184D2A5E
+SEEKABLE_MAGIC = 0x8F92EAB1
+FOOTER_SIZE = 9
+DEFAULT_LEVEL = 3
+DEFAULT_FRAME_SIZE = 1024 * 1024
+# bytes read from the end of a file to find its seek table: 8 KiB of entries per 1k frames
+TAIL_READ = 64 * 1024
+
+_ENTRY = struct.Struct("<II")
+_FOOTER = struct.Struct("<IBI")
+_SKIPPABLE_HEADER = struct.Struct("<II")
+
+
+class Frame(NamedTuple):
+    compressed_offset: int
+    compressed_size: int
+    offset: int
+    size: int
+
+
+def available() -> bool:
+    return zstandard is not None
+
+
+def is_compressed(head: bytes) -> bool:
+    return head[:4] == FRAME_MAGIC
+
+
+def compress_stream(
+    source: BinaryIO, dest: BinaryIO, level: int = DEFAULT_LEVEL, frame_size: int = DEFAULT_FRAME_SIZE
+) -> Tuple[int, int]:
+    """Compress ``source`` into ``dest`` frame by frame; returns ``(original_size, stored_size)``."""
+    compressor = zstandard.ZstdCompressor(level=level)
+    entries = []
+    original = 0
+    while True:
+        chunk = source.read(frame_size)
+        if not chunk and entries:
+            break
+        frame = compressor.compress(chunk)
+        dest.write(frame)
+        entries.append((len(frame), len(chunk)))
+        original += len(chunk)
+        if not chunk:
+            break  # an empty payload still gets one (empty) frame
+
+    table = b"".join(_ENTRY.pack(*entry) for entry in entries) + _FOOTER.pack(len(entries), 0, SEEKABLE_MAGIC)
+    dest.write(_SKIPPABLE_HEADER.pack(SKIPPABLE_MAGIC, len(table)) + table)
+    stored = sum(size for size, _ in entries) + _SKIPPABLE_HEADER.size + len(table)
+    return original, stored
+
+
+def read_seek_table(read_at: Callable[[int, int], bytes], stored_size: int) -> List[Frame]:
+    """Parse the seek table of a stored file of ``stored_size`` bytes, read through ``read_at(start, stop)``.
+
+    One read of the file's tail is usually enough; a second one is only needed
+    for tables longer than ``TAIL_READ`` (thousands of frames).
+    """
+    tail_start = max(stored_size - TAIL_READ, 0)
+    tail = read_at(tail_start, stored_size)
+    count, descriptor, magic = _FOOTER.unpack(tail[-FOOTER_SIZE:])
+    if magic != SEEKABLE_MAGIC:
+        raise ValueError("Not a seekable zstd file")
+    entry_size = _ENTRY.size + (4 if descriptor & 0x80 else 0)
+    table_start = stored_size - FOOTER_SIZE - count * entry_size
+    if table_start >= tail_start:
+        raw = tail[table_start - tail_start : -FOOTER_SIZE]
+    else:
+        raw = read_at(table_start, stored_size - FOOTER_SIZE)
+
+    frames = []
+    compressed_offset = offset = 0
+    for index in range(count):
+        compressed_size, size = _ENTRY.unpack_from(raw, index * entry_size)
+        frames.append(Frame(compressed_offset, compressed_size, offset, size))
+        compressed_offset += compressed_size
+        offset += size
+    return frames
+
+
+def original_size(frames: List[Frame]) -> int:
+    return frames[-1].offset + frames[-1].size if frames else 0
+
+
+def iter_range(
+    open_span: Callable[[int, int], BinaryIO], frames: List[Frame], start: int, stop: int
+) -> Iterator[bytes]:
+    """Yield the original bytes in ``[start, stop)``, decoding only the frames that overlap it.
+
+    ``open_span(begin, end)`` must return a stream of the stored bytes in
+    ``[begin, end)``; it is called once, for the frames in the range.
+    """
+    wanted = [frame for frame in frames if frame.size and frame.offset < stop and frame.offset + frame.size > start]
+    if not wanted:
+        return
+    decompressor = zstandard.ZstdDecompressor()
+    source = open_span(wanted[0].compressed_offset, wanted[-1].compressed_offset + wanted[-1].compressed_size)
+    try:
+        for frame in wanted:
+            data = decompressor.decompress(read_exactly(source, frame.compressed_size), max_output_size=frame.size)
+            yield data[max(start - frame.offset, 0) : stop - frame.offset]
+    finally:
+        source.close()
+
+
+def read_exactly(source: BinaryIO, size: int) -> bytes:
+    parts = []
+    while size > 0:
+        part = source.read(size)
+        if not part:
+            raise ValueError("Stored zstd file is truncated")
+        parts.append(part)
+        size -= len(part)
+    return b"".join(parts)
+
+
+def open_decompressed(stored: BinaryIO, closefd: bool = True):
+    """A readable file object with the original bytes of the zstd stream ``stored``."""
+    return zstandard.ZstdDecompressor().stream_reader(stored, read_across_frames=True, closefd=closefd)
+
+
+def decompress_stream(stored: BinaryIO, dest: BinaryIO, chunk_size: int = DEFAULT_FRAME_SIZE) -> int:
+    """Write the original bytes of ``stored`` to ``dest``; returns how many."""
+    written = 0
+    with open_decompressed(stored, closefd=False) as reader:
+        for chunk in iter(lambda: reader.read(chunk_size), b""):
+            dest.write(chunk)
+            written += len(chunk)
+    return written
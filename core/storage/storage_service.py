@@ -2,20 +2,52 @@ import logging
 import os
 import shutil
 import tempfile
-from contextlib import contextmanager
-from typing import Generator, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from typing import BinaryIO, Callable, Generator, Iterable, List, NamedTuple, Optional, Sequence, Tuple
 
 from core.configuration.configuration import uploads_folder_name
+from core.storage import seekable_zstd
 
 try:
     import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config as BotoConfig
     from botocore.exceptions import ClientError
 except Exception:  # pragma: no cover - optional boto3 dependency
     boto3 = None
+    TransferConfig = None
+    BotoConfig = None
     ClientError = Exception
 
 logger = logging.getLogger(__name__)
 
+MB = 1024**2
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_MULTIPART_THRESHOLD = 8 * MB
+DEFAULT_MULTIPART_CHUNKSIZE = 8 * MB
+DEFAULT_MAX_CONCURRENCY = 4
+# DeleteObjects accepts at most this many keys per call
+DELETE_BATCH = 1000
+BLOB_DIR = "blobs"
+# HTTP content coding sent with compressed files; also set on their S3 objects
+ZSTD_ENCODING = "zstd"
+ORIGINAL_SIZE_METADATA = "original-size"
+
+
+def _int_from_env(name: str, default: int) -> int:
+    try:
+        value = int(os.getenv(name, default))
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+class StoredFile(NamedTuple):
+    size: int  # of the original content
+    stored_size: int  # what the backend holds, smaller when compressed
+    compressed: bool
+
 
 class StorageService:
     """Utility service that transparently stores files locally or in AWS S3.
@@ -23,6 +55,10 @@ class StorageService:
     The service keeps backward compatibility with the previous local-only
     layout while enabling production deployments to push the payload to S3
     transparently.
+
+    With ``STORAGE_COMPRESSION=zstd`` CSV payloads (and the deduplicated blobs
+    holding them) are stored as seekable zstd; every reader hands back the
+    original bytes, so callers do not need to know how a file was stored.
     """
 
     def __init__(self) -> None:
@@ -36,15 +72,35 @@ class StorageService:
         self._aws_secret = os.getenv("AWS_SECRET_ACCESS_KEY")
         self._remote_prefix = self._resolve_remote_prefix()
 
+        # store dataset files once per content under blobs/ instead of once per dataset
+        self._dedup = os.getenv("STORAGE_DEDUP", "").strip().lower() in ("1", "true", "yes", "on")
+        # compressed-at-rest CSVs; only affects new writes, files are recognised by their first bytes
+        self._compression = os.getenv("STORAGE_COMPRESSION", "").strip().lower() == ZSTD_ENCODING
+        if self._compression and not seekable_zstd.available():
+            logger.warning("zstandard is not installed; storing files uncompressed")
+            self._compression = False
+        self._zstd_level = _int_from_env("STORAGE_ZSTD_LEVEL", seekable_zstd.DEFAULT_LEVEL)
+        self._zstd_frame_size = _int_from_env("STORAGE_ZSTD_FRAME_SIZE", seekable_zstd.DEFAULT_FRAME_SIZE)
+        # files transferred side by side by the batch methods, and parts per file within each transfer
+        self._max_workers = _int_from_env("STORAGE_MAX_WORKERS", DEFAULT_MAX_WORKERS)
+        self._max_concurrency = _int_from_env("S3_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)
+
         has_remote_config = all([self._bucket, self._region, self._aws_key, self._aws_secret])
         self._use_s3 = bool(has_remote_config and boto3 is not None)
 
         if self._use_s3:
+            self._transfer_config = TransferConfig(
+                multipart_threshold=_int_from_env("S3_MULTIPART_THRESHOLD", DEFAULT_MULTIPART_THRESHOLD),
+                multipart_chunksize=_int_from_env("S3_MULTIPART_CHUNKSIZE", DEFAULT_MULTIPART_CHUNKSIZE),
+                max_concurrency=self._max_concurrency,
+            )
             self._s3_client = boto3.client(
                 "s3",
                 aws_access_key_id=self._aws_key,
                 aws_secret_access_key=self._aws_secret,
                 region_name=self._region,
+                # enough pooled connections for every part of every file a batch moves at once
+                config=BotoConfig(max_pool_connections=self._max_workers * self._max_concurrency),
             )
             logger.info(
                 "StorageService configured to use S3 bucket '%s' (prefix='%s')",
@@ -52,6 +108,7 @@ class StorageService:
                 self._remote_prefix,
             )
         else:
+            self._transfer_config = None
             self._s3_client = None
             if has_remote_config and boto3 is None:
                 logger.warning("boto3 is not installed; falling back to local storage")
@@ -98,6 +155,51 @@ class StorageService:
     def uses_s3(self) -> bool:
         return self._use_s3
 
+    def uses_dedup(self) -> bool:
+        return self._dedup
+
+    def uses_compression(self) -> bool:
+        return self._compression
+
+    def _should_compress(self, relative_path: str) -> bool:
+        key = self._normalize_key(relative_path)
+        return self._compression and (key.lower().endswith(".csv") or key.startswith(f"{BLOB_DIR}/"))
+
+    def _compress_to_tempfile(self, source: BinaryIO) -> Tuple[str, int]:
+        """Write ``source`` as seekable zstd to a temp file; returns its path and the original size."""
+        self._refresh_local_context_if_needed()
+        directory = self._local_root if os.path.isdir(self._local_root) else None
+        handle, temp_path = tempfile.mkstemp(suffix=".zst.part", dir=directory)
+        try:
+            with os.fdopen(handle, "wb") as dest:
+                original, _ = seekable_zstd.compress_stream(source, dest, self._zstd_level, self._zstd_frame_size)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return temp_path, original
+
+    def _store_compressed(self, source: BinaryIO, relative_dest: str) -> None:
+        temp_path, original = self._compress_to_tempfile(source)
+        try:
+            if self._use_s3:
+                self._s3_client.upload_file(
+                    temp_path,
+                    self._bucket,
+                    self._s3_key(relative_dest),
+                    ExtraArgs={
+                        "ContentEncoding": ZSTD_ENCODING,
+                        "Metadata": {ORIGINAL_SIZE_METADATA: str(original)},
+                    },
+                    Config=self._transfer_config,
+                )
+            else:
+                dest_abs = self._local_path(relative_dest)
+                os.makedirs(os.path.dirname(dest_abs), exist_ok=True)
+                os.replace(temp_path, dest_abs)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
     @staticmethod
     def dataset_subdir(user_id: int, dataset_id: int) -> str:
         return os.path.join(f"user_{user_id}", f"dataset_{dataset_id}")
@@ -106,15 +208,24 @@ class StorageService:
     def dataset_file_path(user_id: int, dataset_id: int, filename: str) -> str:
         return os.path.join(StorageService.dataset_subdir(user_id, dataset_id), filename)
 
+    @staticmethod
+    def blob_path(checksum: str) -> str:
+        return f"{BLOB_DIR}/{checksum[:2]}/{checksum}"
+
     @staticmethod
     def community_icon_path(community_id: int, filename: str) -> str:
         return os.path.join("communities", f"community_{community_id}", filename)
 
     def save_local_file(self, src_path: str, relative_dest: str, remove_source: bool = True) -> str:
         """Store a file from disk into the configured backend."""
-        if self._use_s3:
+        if self._should_compress(relative_dest):
+            with open(src_path, "rb") as source:
+                self._store_compressed(source, relative_dest)
+            if remove_source:
+                os.remove(src_path)
+        elif self._use_s3:
             key = self._s3_key(relative_dest)
-            self._s3_client.upload_file(src_path, self._bucket, key)
+            self._s3_client.upload_file(src_path, self._bucket, key, Config=self._transfer_config)
             if remove_source:
                 os.remove(src_path)
         else:
@@ -128,10 +239,13 @@ class StorageService:
 
     def save_fileobj(self, file_obj, relative_dest: str) -> str:
         """Store an in-memory FileStorage-like object into the backend."""
-        if self._use_s3:
+        if self._should_compress(relative_dest):
+            file_obj.stream.seek(0)
+            self._store_compressed(file_obj.stream, relative_dest)
+        elif self._use_s3:
             key = self._s3_key(relative_dest)
             file_obj.stream.seek(0)
-            self._s3_client.upload_fileobj(file_obj.stream, self._bucket, key)
+            self._s3_client.upload_fileobj(file_obj.stream, self._bucket, key, Config=self._transfer_config)
         else:
             dest_abs = self._local_path(relative_dest)
             os.makedirs(os.path.dirname(dest_abs), exist_ok=True)
@@ -145,17 +259,36 @@ class StorageService:
         return self._local_path(relative_path)
 
     def ensure_local_copy(self, relative_path: str) -> str:
-        """Download remote object if needed and return local path."""
+        """Download remote object if needed and return local path.
+
+        Remote files are written decompressed. A local file is the stored file
+        itself, so it stays compressed if it was stored that way.
+        """
         abs_path = self._local_path(relative_path)
         if self._use_s3 and not os.path.exists(abs_path):
             os.makedirs(os.path.dirname(abs_path), exist_ok=True)
-            self._s3_client.download_file(
-                self._bucket,
-                self._s3_key(relative_path),
-                abs_path,
-            )
+            self.download_to(relative_path, abs_path)
         return abs_path
 
+    def download_to(self, relative_path: str, local_path: str) -> str:
+        """Write a copy of the original content to ``local_path``, leaving the stored file in place."""
+        if self._use_s3:
+            raw_path = f"{local_path}.zst.part"
+            try:
+                self._s3_client.download_file(
+                    self._bucket, self._s3_key(relative_path), raw_path, Config=self._transfer_config
+                )
+                _decompress_or_move(raw_path, local_path)
+            finally:
+                if os.path.exists(raw_path):
+                    os.remove(raw_path)
+        elif self.is_compressed(relative_path):
+            with open(self._local_path(relative_path), "rb") as stored, open(local_path, "wb") as dest:
+                seekable_zstd.decompress_stream(stored, dest)
+        else:
+            shutil.copy2(self._local_path(relative_path), local_path)
+        return local_path
+
     def exists(self, relative_path: str) -> bool:
         if self._use_s3:
             try:
@@ -165,15 +298,66 @@ class StorageService:
                 return False
         return os.path.exists(self._local_path(relative_path))
 
+    def delete_file(self, relative_path: str) -> None:
+        if self._use_s3:
+            self._s3_client.delete_object(Bucket=self._bucket, Key=self._s3_key(relative_path))
+            return
+        try:
+            os.remove(self._local_path(relative_path))
+        except FileNotFoundError:
+            pass
+
+    def stored_info(self, relative_path: str) -> Optional[StoredFile]:
+        """Sizes and encoding of a stored file, or None when it does not exist."""
+        if self._use_s3:
+            try:
+                head = self._s3_client.head_object(Bucket=self._bucket, Key=self._s3_key(relative_path))
+            except ClientError:
+                return None
+            stored_size = head.get("ContentLength")
+            if head.get("ContentEncoding") != ZSTD_ENCODING:
+                return StoredFile(stored_size, stored_size, False)
+            original = (head.get("Metadata") or {}).get(ORIGINAL_SIZE_METADATA)
+            if original is None or not original.isdigit():
+                original = seekable_zstd.original_size(self._seek_table(relative_path, stored_size))
+            return StoredFile(int(original), stored_size, True)
+
+        abs_path = self._local_path(relative_path)
+        try:
+            stored_size = os.path.getsize(abs_path)
+            with open(abs_path, "rb") as handler:
+                compressed = seekable_zstd.is_compressed(handler.read(4))
+        except OSError:
+            return None
+        if not compressed:
+            return StoredFile(stored_size, stored_size, False)
+        return StoredFile(seekable_zstd.original_size(self._seek_table(relative_path, stored_size)), stored_size, True)
+
+    def is_compressed(self, relative_path: str) -> bool:
+        """Whether the file is stored as zstd (its content is still served decompressed)."""
+        if self._use_s3:
+            info = self.stored_info(relative_path)
+            return bool(info and info.compressed)
+        try:
+            with open(self._local_path(relative_path), "rb") as handler:
+                return seekable_zstd.is_compressed(handler.read(4))
+        except OSError:
+            return False
+
+    def get_size(self, relative_path: str) -> Optional[int]:
+        """Return the size of the original content in bytes, or None when it cannot be determined."""
+        info = self.stored_info(relative_path)
+        return info.size if info else None
+
     def read_text(
         self,
         relative_path: str,
         encoding: str = "utf-8",
         errors: str = "replace",
     ) -> str:
-        if self._use_s3:
-            obj = self._s3_client.get_object(Bucket=self._bucket, Key=self._s3_key(relative_path))
-            return obj["Body"].read().decode(encoding, errors)
+        if self._use_s3 or self.is_compressed(relative_path):
+            with closing(self.open_binary(relative_path)) as handler:
+                return handler.read().decode(encoding, errors)
         with open(
             self._local_path(relative_path),
             "r",
@@ -182,18 +366,94 @@ class StorageService:
         ) as handler:
             return handler.read()
 
-    def open_binary(self, relative_path: str):
+    def open_raw(self, relative_path: str):
+        """The stored bytes as they are, compressed or not; see ``stored_info``."""
         if self._use_s3:
             obj = self._s3_client.get_object(Bucket=self._bucket, Key=self._s3_key(relative_path))
             return obj["Body"]
         return open(self._local_path(relative_path), "rb")
 
-    def download_to_tempfile(self, relative_path: str) -> str:
+    def open_binary(self, relative_path: str):
+        """A readable stream of the original content, decompressed on the fly when needed."""
+        if self._use_s3:
+            obj = self._s3_client.get_object(Bucket=self._bucket, Key=self._s3_key(relative_path))
+            if obj.get("ContentEncoding") == ZSTD_ENCODING:
+                return seekable_zstd.open_decompressed(obj["Body"])
+            return obj["Body"]
+        handler = open(self._local_path(relative_path), "rb")
+        compressed = seekable_zstd.is_compressed(handler.read(4))
+        handler.seek(0)
+        return seekable_zstd.open_decompressed(handler) if compressed else handler
+
+    def _open_span(self, relative_path: str, start: int, stop: int):
+        """The stored bytes in ``[start, stop)``; on S3 only that span is requested."""
         if self._use_s3:
-            temp_file = tempfile.NamedTemporaryFile(delete=False)
-            with temp_file as tmp:
-                self._s3_client.download_fileobj(self._bucket, self._s3_key(relative_path), tmp)
-            return temp_file.name
+            obj = self._s3_client.get_object(
+                Bucket=self._bucket,
+                Key=self._s3_key(relative_path),
+                Range=f"bytes={start}-{stop - 1}",
+            )
+            return obj["Body"]
+        source = open(self._local_path(relative_path), "rb")
+        source.seek(start)
+        return source
+
+    def _read_span(self, relative_path: str, start: int, stop: int) -> bytes:
+        with closing(self._open_span(relative_path, start, stop)) as source:
+            return seekable_zstd.read_exactly(source, stop - start)
+
+    def _seek_table(self, relative_path: str, stored_size: int) -> List[seekable_zstd.Frame]:
+        return seekable_zstd.read_seek_table(
+            lambda start, stop: self._read_span(relative_path, start, stop), stored_size
+        )
+
+    def iter_range(
+        self,
+        relative_path: str,
+        start: int,
+        stop: int,
+        chunk_size: int = 1024 * 1024,
+        info: Optional[StoredFile] = None,
+    ) -> Generator[bytes, None, None]:
+        """Yield the bytes in ``[start, stop)`` without materialising the whole object.
+
+        On S3 only the requested span is fetched through a ranged ``GetObject``.
+        For a compressed file the span covers just the zstd frames holding the
+        range, found through its seek table. Pass ``info`` when the caller
+        already has it to save a lookup.
+        """
+        remaining = stop - start
+        if remaining <= 0:
+            return
+        info = info or self.stored_info(relative_path)
+        if info is not None and info.compressed:
+            frames = self._seek_table(relative_path, info.stored_size)
+            yield from seekable_zstd.iter_range(
+                lambda begin, end: self._open_span(relative_path, begin, end), frames, start, stop
+            )
+            return
+
+        source = self._open_span(relative_path, start, stop)
+        try:
+            while remaining > 0:
+                chunk = source.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            source.close()
+
+    def download_to_tempfile(self, relative_path: str) -> str:
+        """A local path with the original content: a temp file on S3 or for compressed files, else the file itself."""
+        if self._use_s3 or self.is_compressed(relative_path):
+            handle, temp_path = tempfile.mkstemp()
+            os.close(handle)
+            try:
+                return self.download_to(relative_path, temp_path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
         return self._local_path(relative_path)
 
     def list_files(self, relative_dir: str) -> List[str]:
@@ -201,9 +461,8 @@ class StorageService:
         results: List[str] = []
         normalized_dir = self._normalize_key(relative_dir)
         if self._use_s3:
-            prefix = self._s3_key(normalized_dir)
             paginator = self._s3_client.get_paginator("list_objects_v2")
-            for page in paginator.paginate(Bucket=self._bucket, Prefix=prefix):
+            for page in paginator.paginate(Bucket=self._bucket, Prefix=self._s3_dir_prefix(normalized_dir)):
                 for content in page.get("Contents", []):
                     key = content["Key"]
                     rel = key[len(self._remote_prefix) + 1 :] if self._remote_prefix else key
@@ -219,31 +478,145 @@ class StorageService:
                     results.append(rel.replace("\\", "/"))
         return results
 
+    def _s3_dir_prefix(self, relative_dir: str) -> str:
+        # the trailing slash keeps "dataset_1" from also matching "dataset_10"
+        prefix = self._s3_key(relative_dir)
+        return f"{prefix}/" if prefix else prefix
+
+    def _run_batch(self, function: Callable, items: Sequence[Tuple]) -> list:
+        """Call ``function(*item)`` for every item, in order of the results.
+
+        On S3 the calls run on a pool of at most ``STORAGE_MAX_WORKERS`` threads;
+        local copies and moves are cheap enough to run inline. Every item is
+        attempted even when some fail, then the first failure is raised, so a
+        caller that retries only repeats what is missing.
+        """
+        workers = min(self._max_workers, len(items)) if self._use_s3 else 1
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="storage") as pool:
+                futures = [pool.submit(function, *item) for item in items]
+        else:
+            futures = None
+
+        results, failures = [], []
+        for position, item in enumerate(items):
+            try:
+                results.append(futures[position].result() if futures else function(*item))
+            except Exception as exc:
+                logger.error("Storage batch: %s failed for %s: %s", function.__name__, item[0], exc)
+                failures.append(exc)
+        if failures:
+            raise failures[0]
+        return results
+
+    def save_many(self, files: Iterable[Tuple[str, str]], remove_source: bool = True) -> List[str]:
+        """Store several ``(src_path, relative_dest)`` files at once; returns the destinations."""
+        return self._run_batch(
+            lambda src_path, relative_dest: self.save_local_file(src_path, relative_dest, remove_source),
+            [tuple(pair) for pair in files],
+        )
+
+    def fetch_many(
+        self,
+        relative_paths: Iterable[str],
+        dest_dir: Optional[str] = None,
+        names: Optional[Sequence[str]] = None,
+    ) -> List[str]:
+        """Make several stored files available on local disk; returns their local paths in order.
+
+        Without ``dest_dir`` this is ``ensure_local_copy`` for each path. With it,
+        each file is written to ``dest_dir`` under its base name, or under the
+        matching entry of ``names`` (blobs are named by checksum): downloaded
+        straight there on S3, copied there locally.
+        """
+        relative_paths = list(relative_paths)
+        if dest_dir is None:
+            return self._run_batch(self.ensure_local_copy, [(path,) for path in relative_paths])
+
+        os.makedirs(dest_dir, exist_ok=True)
+        if names is None:
+            names = [os.path.basename(path) for path in relative_paths]
+
+        def fetch(relative_path: str, name: str) -> str:
+            return self.download_to(relative_path, os.path.join(dest_dir, name))
+
+        return self._run_batch(fetch, list(zip(relative_paths, names)))
+
+    def delete_prefix(self, relative_dir: str) -> int:
+        """Delete every stored file under ``relative_dir``; returns how many were removed.
+
+        On S3 the keys are listed page by page and removed with one
+        ``DeleteObjects`` call per page instead of one request per file.
+        """
+        normalized_dir = self._normalize_key(relative_dir)
+        if not normalized_dir:
+            raise ValueError("Refusing to delete the whole storage root")
+
+        if not self._use_s3:
+            base = self._local_path(normalized_dir)
+            if not os.path.isdir(base):
+                return 0
+            deleted = sum(len(files) for _, _, files in os.walk(base))
+            shutil.rmtree(base)
+            return deleted
+
+        deleted = 0
+        paginator = self._s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self._bucket, Prefix=self._s3_dir_prefix(normalized_dir)):
+            keys = [{"Key": content["Key"]} for content in page.get("Contents", [])]
+            for start in range(0, len(keys), DELETE_BATCH):
+                batch = keys[start : start + DELETE_BATCH]
+                response = self._s3_client.delete_objects(Bucket=self._bucket, Delete={"Objects": batch, "Quiet": True})
+                errors = response.get("Errors") or []
+                if errors:
+                    raise OSError(f"Could not delete {len(errors)} objects, e.g. {errors[0].get('Key')}")
+                deleted += len(batch)
+        return deleted
+
     @contextmanager
     def as_local_path(self, relative_path: str) -> Generator[str, None, None]:
-        if self._use_s3:
-            temp_path = self.download_to_tempfile(relative_path)
+        temp_path = self.download_to_tempfile(relative_path)
+        if temp_path == self._local_path(relative_path):
+            yield temp_path
+            return
+        try:
+            yield temp_path
+        finally:
             try:
-                yield temp_path
-            finally:
-                try:
-                    os.remove(temp_path)
-                except FileNotFoundError:
-                    pass
-        else:
-            yield self._local_path(relative_path)
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
 
-    def generate_presigned_url(self, relative_path: str, expires_in: int = 600) -> Optional[str]:
+    def generate_presigned_url(
+        self,
+        relative_path: str,
+        expires_in: int = 600,
+        download_name: Optional[str] = None,
+    ) -> Optional[str]:
         if not self._use_s3:
             return None
+        params = {
+            "Bucket": self._bucket,
+            "Key": self._s3_key(relative_path),
+        }
+        if download_name:
+            params["ResponseContentDisposition"] = f'attachment; filename="{download_name}"'
         return self._s3_client.generate_presigned_url(
             "get_object",
-            Params={
-                "Bucket": self._bucket,
-                "Key": self._s3_key(relative_path),
-            },
+            Params=params,
             ExpiresIn=expires_in,
         )
 
 
+def _decompress_or_move(raw_path: str, local_path: str) -> None:
+    with open(raw_path, "rb") as raw:
+        compressed = seekable_zstd.is_compressed(raw.read(4))
+        if compressed:
+            raw.seek(0)
+            with open(local_path, "wb") as dest:
+                seekable_zstd.decompress_stream(raw, dest)
+    if not compressed:
+        os.replace(raw_path, local_path)
+
+
 storage_service = StorageService()
@@ -0,0 +1,92 @@
+import os
+import time
+from contextlib import closing
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple
+from zipfile import ZIP64_LIMIT, ZIP_STORED, ZipFile, ZipInfo
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class _ZipStreamBuffer:
+    """Write-only sink that hands the bytes produced by ``ZipFile`` back to the generator.
+
+    It deliberately exposes no ``tell``/``seek`` so ``ZipFile`` switches to its
+    streaming mode (data descriptors after each entry) instead of seeking back
+    to patch local headers.
+    """
+
+    def __init__(self) -> None:
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _zip_info(arcname: str) -> ZipInfo:
+    info = ZipInfo(arcname, date_time=time.localtime(time.time())[:6])
+    info.compress_type = ZIP_STORED
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def _open_entry(relative_path: str, checksum: Optional[str], storage, cache) -> Tuple[Optional[int], BinaryIO]:
+    if cache is not None and checksum:
+        local_path = cache.path_for(relative_path, checksum)
+        return os.path.getsize(local_path), open(local_path, "rb")
+    return storage.get_size(relative_path), storage.open_binary(relative_path)
+
+
+def stream_zip(
+    entries: Iterable[Tuple[str, ...]],
+    storage=None,
+    chunk_size: int = CHUNK_SIZE,
+    cache=None,
+) -> Iterator[bytes]:
+    """Yield a ZIP archive for ``(arcname, relative_path[, checksum])`` entries chunk by chunk.
+
+    Every payload is pulled through ``storage.open_binary`` and written straight
+    into the archive, so memory stays bounded by ``chunk_size`` and nothing is
+    spooled to disk. With a ``LocalFileCache``, entries that carry their
+    checksum are read through the cache instead. Entries whose size is
+    unknown or close to the 4 GiB limit are written with ZIP64 headers.
+    """
+    if storage is None:
+        from core.storage import storage_service
+
+        storage = storage_service
+
+    sink = _ZipStreamBuffer()
+    with ZipFile(sink, mode="w", compression=ZIP_STORED, allowZip64=True) as zipf:
+        for arcname, relative_path, *rest in entries:
+            info = _zip_info(arcname)
+            size, source = _open_entry(relative_path, rest[0] if rest else None, storage, cache)
+            force_zip64 = size is None or size * 1.05 > ZIP64_LIMIT
+            if size is not None:
+                info.file_size = size
+
+            with closing(source):
+                with zipf.open(info, mode="w", force_zip64=force_zip64) as dest:
+                    while True:
+                        chunk = source.read(chunk_size)
+                        if not chunk:
+                            break
+                        dest.write(chunk)
+                        data = sink.drain()
+                        if data:
+                            yield data
+            data = sink.drain()
+            if data:
+                yield data
+
+    data = sink.drain()
+    if data:
+        yield data
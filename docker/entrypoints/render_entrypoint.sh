@@ -53,4 +53,5 @@ fi
 
 # Start the application using Gunicorn, binding it to port 80
 # Set the logging level to info and the timeout to 3600 seconds
-exec gunicorn --bind 0.0.0.0:80 app:app --log-level info --timeout 3600
+# GUNICORN_WORKER_CLASS=gevent serves downloads from greenlets (see core/storage/async_storage.py)
+exec gunicorn --bind 0.0.0.0:80 app:app --log-level info --timeout 3600 --worker-class "${GUNICORN_WORKER_CLASS:-sync}"
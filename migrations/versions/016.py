@@ -0,0 +1,70 @@
+"""Add materialized view/download counters
+
+Revision ID: 016
+Revises: 015
+Create Date: 2026-10-18 10:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '016'
+down_revision = '015'
+branch_labels = None
+depends_on = None
+
+_SOURCES = [
+    ('dataset', 'dataset_id', 'views', 'ds_view_record', 'view_date'),
+    ('dataset', 'dataset_id', 'downloads', 'ds_download_record', 'download_date'),
+    ('hubfile', 'file_id', 'views', 'file_view_record', 'view_date'),
+    ('hubfile', 'file_id', 'downloads', 'file_download_record', 'download_date'),
+]
+
+
+def upgrade():
+    op.create_table(
+        'activity_counter',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('scope', sa.String(length=16), nullable=False),
+        sa.Column('subject_id', sa.Integer(), nullable=False),
+        sa.Column('metric', sa.String(length=16), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.UniqueConstraint('scope', 'subject_id', 'metric', name='uq_activity_counter'),
+    )
+
+    op.create_table(
+        'activity_daily_counter',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('scope', sa.String(length=16), nullable=False),
+        sa.Column('subject_id', sa.Integer(), nullable=False),
+        sa.Column('metric', sa.String(length=16), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.UniqueConstraint('scope', 'subject_id', 'metric', 'day', name='uq_activity_daily_counter'),
+    )
+    with op.batch_alter_table('activity_daily_counter', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_activity_daily_counter_day'), ['day'], unique=False)
+
+    for scope, subject, metric, table, date_column in _SOURCES:
+        op.execute(
+            f"INSERT INTO activity_daily_counter (scope, subject_id, metric, day, total) "
+            f"SELECT '{scope}', {subject}, '{metric}', DATE({date_column}), COUNT(*) FROM {table} "
+            f"WHERE {subject} IS NOT NULL GROUP BY {subject}, DATE({date_column})"
+        )
+        op.execute(
+            f"INSERT INTO activity_daily_counter (scope, subject_id, metric, day, total) "
+            f"SELECT '{scope}', 0, '{metric}', DATE({date_column}), COUNT(*) FROM {table} "
+            f"WHERE {subject} IS NOT NULL GROUP BY DATE({date_column})"
+        )
+        op.execute(
+            f"INSERT INTO activity_counter (scope, subject_id, metric, total) "
+            f"SELECT scope, subject_id, metric, SUM(total) FROM activity_daily_counter "
+            f"WHERE scope = '{scope}' AND metric = '{metric}' GROUP BY scope, subject_id, metric"
+        )
+
+
+def downgrade():
+    op.drop_table('activity_daily_counter')
+    op.drop_table('activity_counter')
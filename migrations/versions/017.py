@@ -0,0 +1,161 @@
+"""Add the search_term inverted index
+
+Revision ID: 017
+Revises: 016
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+import re
+from collections import Counter, defaultdict
+
+from alembic import op
+import sqlalchemy as sa
+import unidecode
+
+
+# revision identifiers, used by Alembic.
+revision = '017'
+down_revision = '016'
+branch_labels = None
+depends_on = None
+
+# Tokenizer and weights of app/modules/explore/search_index.py as of this revision,
+# frozen here so the backfill does not depend on the application code.
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+MAX_TERM_LENGTH = 64
+BATCH = 500
+WEIGHTS = {
+    "title": 5,
+    "tags": 3,
+    "author": 3,
+    "filename": 3,
+    "file_title": 2,
+    "description": 1,
+    "affiliation": 1,
+    "orcid": 1,
+    "file_description": 1,
+    "publication_doi": 1,
+}
+
+data_set = sa.table('data_set', sa.column('id', sa.Integer), sa.column('ds_meta_data_id', sa.Integer))
+ds_meta_data = sa.table(
+    'ds_meta_data',
+    sa.column('id', sa.Integer),
+    sa.column('title', sa.String),
+    sa.column('description', sa.Text),
+    sa.column('tags', sa.String),
+)
+author = sa.table(
+    'author',
+    sa.column('ds_meta_data_id', sa.Integer),
+    sa.column('name', sa.String),
+    sa.column('affiliation', sa.String),
+    sa.column('orcid', sa.String),
+)
+feature_model = sa.table(
+    'feature_model', sa.column('data_set_id', sa.Integer), sa.column('fm_meta_data_id', sa.Integer)
+)
+fm_meta_data = sa.table(
+    'fm_meta_data',
+    sa.column('id', sa.Integer),
+    sa.column('csv_filename', sa.String),
+    sa.column('title', sa.String),
+    sa.column('description', sa.Text),
+    sa.column('publication_doi', sa.String),
+    sa.column('tags', sa.String),
+)
+search_term = sa.table(
+    'search_term',
+    sa.column('dataset_id', sa.Integer),
+    sa.column('term', sa.String),
+    sa.column('weight', sa.Integer),
+)
+
+
+def _tokenize(text):
+    if not text:
+        return []
+    normalized = unidecode.unidecode(str(text)).lower()
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall(normalized)]
+
+
+def _backfill(bind):
+    """Index the datasets that already exist, so search keeps finding them right after the upgrade."""
+    dataset_ids = [row[0] for row in bind.execute(sa.select(data_set.c.id).order_by(data_set.c.id))]
+    for start in range(0, len(dataset_ids), BATCH):
+        ids = dataset_ids[start : start + BATCH]
+        documents = defaultdict(Counter)
+
+        def add(dataset_id, field, text):
+            for token in _tokenize(text):
+                documents[dataset_id][token] += WEIGHTS[field]
+
+        metadata_rows = bind.execute(
+            sa.select(data_set.c.id, ds_meta_data.c.title, ds_meta_data.c.description, ds_meta_data.c.tags)
+            .join(ds_meta_data, data_set.c.ds_meta_data_id == ds_meta_data.c.id)
+            .where(data_set.c.id.in_(ids))
+        )
+        for dataset_id, title, description, tags in metadata_rows:
+            add(dataset_id, "title", title)
+            add(dataset_id, "description", description)
+            add(dataset_id, "tags", tags)
+
+        author_rows = bind.execute(
+            sa.select(data_set.c.id, author.c.name, author.c.affiliation, author.c.orcid)
+            .join(author, author.c.ds_meta_data_id == data_set.c.ds_meta_data_id)
+            .where(data_set.c.id.in_(ids))
+        )
+        for dataset_id, name, affiliation, orcid in author_rows:
+            add(dataset_id, "author", name)
+            add(dataset_id, "affiliation", affiliation)
+            add(dataset_id, "orcid", orcid)
+
+        file_rows = bind.execute(
+            sa.select(
+                feature_model.c.data_set_id,
+                fm_meta_data.c.csv_filename,
+                fm_meta_data.c.title,
+                fm_meta_data.c.description,
+                fm_meta_data.c.publication_doi,
+                fm_meta_data.c.tags,
+            )
+            .join(fm_meta_data, feature_model.c.fm_meta_data_id == fm_meta_data.c.id)
+            .where(feature_model.c.data_set_id.in_(ids))
+        )
+        for dataset_id, filename, title, description, publication_doi, tags in file_rows:
+            add(dataset_id, "filename", filename)
+            add(dataset_id, "file_title", title)
+            add(dataset_id, "file_description", description)
+            add(dataset_id, "publication_doi", publication_doi)
+            add(dataset_id, "tags", tags)
+
+        rows = [
+            {"dataset_id": dataset_id, "term": term, "weight": weight}
+            for dataset_id, terms in documents.items()
+            for term, weight in terms.items()
+        ]
+        if rows:
+            bind.execute(search_term.insert(), rows)
+
+
+def upgrade():
+    op.create_table(
+        'search_term',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('dataset_id', sa.Integer(), nullable=False),
+        sa.Column('term', sa.String(length=64), nullable=False),
+        sa.Column('weight', sa.Integer(), nullable=False),
+    )
+    with op.batch_alter_table('search_term', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_search_term_dataset_id'), ['dataset_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_search_term_term'), ['term'], unique=False)
+
+    _backfill(op.get_bind())
+
+
+def downgrade():
+    with op.batch_alter_table('search_term', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_search_term_term'))
+        batch_op.drop_index(batch_op.f('ix_search_term_dataset_id'))
+
+    op.drop_table('search_term')
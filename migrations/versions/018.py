@@ -0,0 +1,36 @@
+"""Store CSV column profiles on ds_metrics and fm_metrics
+
+Revision ID: 018
+Revises: 017
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '018'
+down_revision = '017'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ds_metrics', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('row_count', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('column_profile', sa.Text(), nullable=True))
+
+    with op.batch_alter_table('fm_metrics', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('row_count', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('column_profile', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('fm_metrics', schema=None) as batch_op:
+        batch_op.drop_column('column_profile')
+        batch_op.drop_column('row_count')
+
+    with op.batch_alter_table('ds_metrics', schema=None) as batch_op:
+        batch_op.drop_column('column_profile')
+        batch_op.drop_column('row_count')
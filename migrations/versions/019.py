@@ -0,0 +1,42 @@
+"""Add the publish_job table for queued dataset publication
+
+Revision ID: 019
+Revises: 018
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '019'
+down_revision = '018'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'publish_job',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('user.id'), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('message', sa.Text(), nullable=True),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('folder', sa.String(length=255), nullable=False),
+        sa.Column('editing_dataset_id', sa.Integer(), nullable=True),
+        sa.Column('dataset_id', sa.Integer(), nullable=True),
+        sa.Column('storage_attempts', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+    )
+    with op.batch_alter_table('publish_job', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_publish_job_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('publish_job', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_publish_job_user_id'))
+
+    op.drop_table('publish_job')
@@ -0,0 +1,17 @@
+import click
+from flask.cli import with_appcontext
+
+from app import create_app
+from app.modules.dataset.counters import rebuild_counters
+
+
+@click.command(
+    "counters:rebuild",
+    help="Recompute the view/download counters (totals and daily buckets) from the raw record tables.",
+)
+@with_appcontext
+def counters_rebuild():
+    app = create_app()
+    with app.app_context():
+        folded = rebuild_counters()
+        click.echo(click.style(f"Counters rebuilt from {folded} view/download records.", fg="green"))
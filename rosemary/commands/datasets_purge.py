@@ -3,6 +3,8 @@ from flask.cli import with_appcontext
 
 from app import create_app, db
 from app.modules.dataset.models import (
+    ActivityCounter,
+    ActivityDailyCounter,
     Author,
     DataSet,
     DOIMapping,
@@ -10,9 +12,11 @@ from app.modules.dataset.models import (
     DSMetaData,
     DSMetrics,
     DSViewRecord,
+    PublishJob,
 )
 from app.modules.datasetfile.models import DatasetFile, DatasetFileMetaData, DatasetFileMetrics
-from app.modules.hubfile.models import Hubfile, HubfileDownloadRecord, HubfileViewRecord
+from app.modules.explore.models import SearchTerm
+from app.modules.hubfile.models import Blob, Hubfile, HubfileDownloadRecord, HubfileViewRecord
 from rosemary.commands.clear_uploads import clear_uploads
 
 
@@ -50,6 +54,7 @@ def datasets_purge(yes):
 
         # Now remove dependent tables in FK-safe order using bulk deletes
         files_deleted = db.session.query(Hubfile).delete(synchronize_session=False)
+        db.session.query(Blob).delete(synchronize_session=False)
         fms_deleted = db.session.query(DatasetFile).delete(synchronize_session=False)
         authors_deleted = db.session.query(Author).delete(synchronize_session=False)
         fmmd_deleted = db.session.query(DatasetFileMetaData).delete(synchronize_session=False)
@@ -57,6 +62,10 @@ def datasets_purge(yes):
         datasets_deleted = db.session.query(DataSet).delete(synchronize_session=False)
         dsmd_deleted = db.session.query(DSMetaData).delete(synchronize_session=False)
         dsm_deleted = db.session.query(DSMetrics).delete(synchronize_session=False)
+        db.session.query(ActivityDailyCounter).delete(synchronize_session=False)
+        db.session.query(ActivityCounter).delete(synchronize_session=False)
+        db.session.query(SearchTerm).delete(synchronize_session=False)
+        db.session.query(PublishJob).delete(synchronize_session=False)
 
         db.session.commit()
 
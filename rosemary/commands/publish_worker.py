@@ -0,0 +1,19 @@
+import click
+from flask.cli import with_appcontext
+
+from app import create_app
+from app.modules.dataset.publishing import rq_queue
+
+
+@click.command("publish:worker", help="Run an rq worker that processes queued dataset publications.")
+@click.option("--burst", is_flag=True, help="Exit once the queue is empty.")
+@with_appcontext
+def publish_worker(burst):
+    from rq import SimpleWorker
+
+    app = create_app()
+    with app.app_context():
+        queue = rq_queue()
+        click.echo(click.style(f"Processing the '{queue.name}' queue on {app.config['REDIS_URL']}", fg="green"))
+        # no forking: every job runs inside this app context and reuses its database pool
+        SimpleWorker([queue], connection=queue.connection).work(burst=burst)
@@ -0,0 +1,17 @@
+import click
+from flask.cli import with_appcontext
+
+from app import create_app
+from app.modules.explore.search_index import search_index
+
+
+@click.command(
+    "search:reindex",
+    help="Rebuild the explore search index from every dataset, its authors and its file metadata.",
+)
+@with_appcontext
+def search_reindex():
+    app = create_app()
+    with app.app_context():
+        indexed = search_index.rebuild()
+        click.echo(click.style(f"Search index rebuilt for {indexed} datasets.", fg="green"))